@@ -0,0 +1,23 @@
+import importlib
+import os
+import sys
+
+#リポジトリのルート（各課題のモジュールはルートからの相対パスでデータを探す）
+ROOT = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+
+
+#課題のフォルダ folder にあるモジュール name を読み込む
+#（database.py などは課題ごとに同じ名前のものがあるので、ほかのフォルダから読み込んだ同じ名前のものは外しておく）
+def import_from(folder, name):
+    path = os.path.join(ROOT, folder)
+    local_names = {os.path.splitext(file)[0] for file in os.listdir(path) if file.endswith(".py")}
+    for module_name in local_names:
+        module = sys.modules.get(module_name)
+        file = getattr(module, "__file__", None)
+        if file is not None and os.path.dirname(os.path.abspath(file)) != path:
+            del sys.modules[module_name]
+    #子プロセスでも読み込めるよう、フォルダは sys.path の先頭に残す
+    if path in sys.path:
+        sys.path.remove(path)
+    sys.path.insert(0, path)
+    return importlib.import_module(name)
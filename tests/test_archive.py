@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from conftest import import_from
+
+archive = import_from("最終課題", "archive")
+schema = import_from("最終課題", "schema")
+
+#2024年1月・2月の取得結果（日本時間の各月10日0時から1時間ごと）
+JANUARY = int(archive.JST.localize(datetime(2024, 1, 10)).timestamp())
+FEBRUARY = int(archive.JST.localize(datetime(2024, 2, 10)).timestamp())
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "transport_weather.db")
+    with sqlite3.connect(path) as conn:
+        schema.ensure_schema(conn)
+        conn.execute("INSERT INTO sources (key, kind, name) VALUES ('line', 0, '路線')")
+        conn.executemany("INSERT INTO observations (source_id, ts, status) VALUES (1, ?, ?)",
+                         [(start + hour * 3600, hour % 2) for start in (JANUARY, FEBRUARY) for hour in range(24)])
+    return path
+
+
+#読み込みに使った接続をすべて記録する
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+    connect = sqlite3.connect
+
+    def recording_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(archive.sqlite3, "connect", recording_connect)
+    return opened
+
+
+def assert_closed(conn):
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+#月ごとのファイルに移した月も手元のDBの月も読め、読み終えた接続は閉じられる
+def test_iter_range_reads_partitions_and_closes(db_path, tmp_path, connections):
+    archive_dir = str(tmp_path / "archive")
+    now = archive.JST.localize(datetime(2024, 5, 20))
+    assert archive.archive_old_months(db_path, archive_dir, retention_days=90, now=now) == ["2024-01"]
+    rows = list(archive.iter_range(JANUARY, FEBRUARY + 86400, db_path, archive_dir))
+    assert [row[1] for row in rows] == sorted(start + hour * 3600 for start in (JANUARY, FEBRUARY) for hour in range(24))
+    assert len(list(archive.iter_rollups(JANUARY, FEBRUARY, archive.ROLLUP_HOUR, db_path))) == 24
+    assert len(connections) == 3
+    for conn in connections:
+        assert_closed(conn)
+
+
+#途中で読むのをやめても、ジェネレータを閉じれば接続も閉じられる
+def test_iter_range_closes_when_abandoned(db_path, connections):
+    rows = archive.iter_range(JANUARY, FEBRUARY, db_path)
+    next(rows)
+    rows.close()
+    assert_closed(connections[0])
+
+
+#ファイルを作れないときも保守のスレッドは止まらない
+def test_maintenance_survives_os_error(db_path, tmp_path, capsys):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    stop = threading.Event()
+    thread = archive.start_maintenance(db_path, str(blocker / "archive"), interval=0.01, stop=stop)
+    time.sleep(0.2)
+    assert thread.is_alive()
+    stop.set()
+    thread.join(1)
+    assert "古いデータの移動に失敗しました" in capsys.readouterr().out
+
+
+#月ごとのファイルに移した月も export.py で書き出せる
+def test_export_reads_archived_months(db_path, tmp_path):
+    export = import_from("最終課題", "export")
+    archive_dir = str(tmp_path / "archive")
+    now = archive.JST.localize(datetime(2024, 5, 20))
+    archive.archive_old_months(db_path, archive_dir, retention_days=90, now=now)
+    with sqlite3.connect(db_path) as conn:
+        january = str(tmp_path / "january.csv")
+        assert export.export_dataset(conn, "observations", "csv", january, start="2024-01-10", end="2024-01-10",
+                                     archive_dir=archive_dir) == 24
+        everything = str(tmp_path / "everything.csv")
+        assert export.export_dataset(conn, "observations", "csv", everything, archive_dir=archive_dir) == 48
+        assert conn.execute("PRAGMA database_list").fetchall()[-1][1] == "main"
+
+
+#移した月に後から行が届いても、まとめはその月のすべての行から作り直される
+def test_rearchive_keeps_complete_rollups(db_path, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    now = archive.JST.localize(datetime(2024, 5, 20))
+    archive.archive_old_months(db_path, archive_dir, retention_days=90, now=now)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO observations (source_id, ts, status) VALUES (1, ?, 1)", (JANUARY + 1800,))
+    assert archive.archive_old_months(db_path, archive_dir, retention_days=90, now=now) == ["2024-01"]
+    days = list(archive.iter_rollups(JANUARY, JANUARY + 86400, archive.ROLLUP_DAY, db_path))
+    assert [(samples, delayed) for _, _, samples, delayed, _, _ in days] == [(25, 13)]
+    hours = list(archive.iter_rollups(JANUARY, JANUARY + 3600, archive.ROLLUP_HOUR, db_path))
+    assert [(samples, delayed) for _, _, samples, delayed, _, _ in hours] == [(2, 1)]
+
+
+#終わった状態の変化と枠の記録も移す（続いている状態と取得元ごとの最後の枠は手元に残す）
+def test_archive_moves_transitions_and_runs(db_path, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO state_transitions (source_id, started_at, ended_at, status) VALUES (1, ?, ?, ?)",
+                         [(JANUARY, JANUARY + 3600, 0), (JANUARY + 3600, None, 1)])
+        conn.executemany("INSERT INTO collection_runs (source_id, slot_ts, outcome, ts) VALUES (1, ?, 0, ?)",
+                         [(JANUARY + hour * 3600, JANUARY + hour * 3600) for hour in range(3)])
+    now = archive.JST.localize(datetime(2024, 5, 20))
+    assert archive.archive_old_months(db_path, archive_dir, retention_days=90, now=now) == ["2024-01"]
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT started_at FROM state_transitions").fetchall() == [(JANUARY + 3600,)]
+        assert conn.execute("SELECT slot_ts FROM collection_runs").fetchall() == [(JANUARY + 2 * 3600,)]
+        assert conn.execute("SELECT count(*) FROM observations WHERE ts < ?", (FEBRUARY,)).fetchone()[0] == 0
+    with sqlite3.connect(archive.partition_path(archive.month_start(now.replace(month=1)), archive_dir)) as part:
+        assert part.execute("SELECT started_at FROM state_transitions").fetchall() == [(JANUARY,)]
+        assert part.execute("SELECT count(*) FROM collection_runs").fetchone()[0] == 2
+
+    #移した状態の変化・枠の記録も export.py で書き出せる
+    export = import_from("最終課題", "export")
+    with sqlite3.connect(db_path) as conn:
+        out_path = str(tmp_path / "out.csv")
+        assert export.export_dataset(conn, "transitions", "csv", out_path, archive_dir=archive_dir) == 2
+        assert export.export_dataset(conn, "runs", "csv", out_path, start="2024-01-10", end="2024-01-10",
+                                     archive_dir=archive_dir) == 3
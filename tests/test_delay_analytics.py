@@ -0,0 +1,167 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import ROOT, import_from
+
+analytics = import_from("最終課題", "analytics")
+database = import_from("最終課題", "database")
+poller = import_from("最終課題", "poller")
+schema = import_from("最終課題", "schema")
+sources = import_from("最終課題", "sources")
+storage = import_from("最終課題", "storage")
+
+FIXTURES = os.path.join(ROOT, "最終課題", "fixtures", "synthetic")
+
+
+class FakeResponse:
+    def __init__(self, html):
+        self.status_code = 200
+        self.headers = {}
+        self.encoding = "utf-8"
+        self.html = html
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for start in range(0, len(self.html), chunk_size):
+            yield self.html[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+#URL → 返すページ（pages の中身を書き換えると次の取得から変わる）
+class FakeSession:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, **kwargs):
+        return FakeResponse(self.pages[url])
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def collector_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "transport_weather.db")
+    monkeypatch.setattr(database, "DB_NAME", db_path)
+    database.create_table()
+    writer = storage.StorageWriter(db_path, flush_interval=0)
+    monkeypatch.setattr(database, "_writer", writer)
+    yield db_path, writer
+    writer.close()
+
+
+#poll_due の取得時刻を、呼び出しごとに times の先頭から順に返す
+class FakeClock:
+    times = []
+
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.fromtimestamp(cls.times.pop(0), tz)
+
+
+#database.py の既定の収集（変化の監視）で、時刻 times に路線のページ pages を取得してDBに記録する
+def collect(collector_db, monkeypatch, times, pages):
+    _, writer = collector_db
+    monkeypatch.setattr(poller, "datetime", FakeClock)
+    FakeClock.times = list(times)
+    line = sources.Source("tama_monorail", "line", "多摩都市モノレール", "https://line.test/")
+    place = sources.Source("hino", "location", "日野市", "https://place.test/")
+    database.register_sources([line, place])
+    session = FakeSession({place.url: read_fixture("tenki_forecast.html")})
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        adaptive = poller.AdaptivePoller([line, place], session, executor, database.record_transition)
+        for step, page in enumerate(pages):
+            session.pages[line.url] = read_fixture(page)
+            adaptive.poll_due(step * poller.MAX_INTERVAL)
+            writer.flush()
+
+
+#database.py の既定の収集（変化の監視）で記録したDBから、遅延の集計ができる
+def test_default_collector_feeds_analytics(collector_db, monkeypatch):
+    start = 1_700_000_000
+    collect(collector_db, monkeypatch, [start + step * 3600 for step in range(4)],
+            ["line_normal.html", "line_trouble.html", "line_trouble.html", "line_normal.html"])
+
+    result = analytics.DelayAnalytics(collector_db[0])
+    assert result.update(now=start + 5 * 3600) > 0
+    assert result.row_count == 4
+    by_weather = result.probability_by("weather")
+    assert by_weather["observations"].sum() == 4
+    assert by_weather["delays"].sum() == 2
+    assert len(result.run_length_stats()) == 1
+
+
+#遅延中は短い間隔で取得しても、集計は1時間に1件なので遅延を多く数えない
+def test_irregular_polls_are_counted_hourly(collector_db, monkeypatch):
+    day = int(datetime(2024, 1, 10, tzinfo=timezone(timedelta(hours=9))).timestamp())
+    #0時に通常、10時から11時まで遅延（2分ごとに取得）、その後は通常
+    times = [day] + [day + 10 * 3600 + minute * 60 for minute in range(0, 60, 2)] + [day + 11 * 3600, day + 20 * 3600]
+    pages = ["line_normal.html"] + ["line_trouble.html"] * 30 + ["line_normal.html"] * 2
+    collect(collector_db, monkeypatch, times, pages)
+
+    result = analytics.DelayAnalytics(collector_db[0])
+    result.update(now=day + 24 * 3600)
+    assert result.row_count == 24
+    by_hour = result.probability_by("hour")
+    assert by_hour["observations"].tolist() == [1] * 24
+    assert by_hour["delays"].tolist() == [int(hour == 10) for hour in range(24)]
+    assert result.probability_by("weather")["probability"].dropna().tolist() == [1 / 24]
+    assert result.lag_correlations()["pairs"].tolist() == [24 - lag for lag in range(analytics.MAX_LAG + 1)]
+    stats = result.run_length_stats()
+    assert stats["max_observations"].tolist() == [1]
+    assert stats["max_hours"].tolist() == [1]
+
+    #同じ期間を何回に分けて読んでも同じ結果になる
+    incremental = analytics.DelayAnalytics(collector_db[0])
+    for hour in (5, 10, 11, 17, 24):
+        incremental.update(now=day + hour * 3600)
+    assert incremental.row_count == 24
+    assert incremental.probability_by("hour").equals(by_hour)
+    assert incremental.lag_correlations().equals(result.lag_correlations())
+    assert incremental.run_length_stats().equals(stats)
+
+
+def insert(conn, rows):
+    conn.executemany("INSERT INTO observations (source_id, ts, status) VALUES (1, ?, ?)", rows)
+    conn.commit()
+
+
+#前回読んだ時刻より前に追加された行(欠測の補完など)も集計に含まれる
+def test_update_includes_late_rows(tmp_path):
+    db_path = str(tmp_path / "transport_weather.db")
+    with sqlite3.connect(db_path) as conn:
+        schema.ensure_schema(conn)
+        conn.execute("INSERT INTO sources (key, kind, name) VALUES ('line', 0, '路線')")
+        insert(conn, [(3600 * hour, hour % 2) for hour in range(0, 10, 2)])
+        incremental = analytics.DelayAnalytics(db_path)
+        incremental.update()
+        insert(conn, [(3600 * hour, hour % 3 == 0) for hour in range(1, 12, 2)])
+        incremental.update()
+    full = analytics.DelayAnalytics(db_path)
+    full.update()
+    assert incremental.row_count == full.row_count == 11
+    for condition in analytics.CONDITIONS:
+        assert incremental.probability_by(condition).equals(full.probability_by(condition))
+    assert incremental.run_length_stats().equals(full.run_length_stats())
+    assert incremental.lag_correlations().equals(full.lag_correlations())
+
+
+#集計は以前の形式のDBを書き換えない
+def test_update_does_not_migrate(tmp_path):
+    db_path = str(tmp_path / "old.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE transport_weather (id INTEGER PRIMARY KEY, date TEXT, fetch_time TEXT, weather TEXT, delay_status TEXT)")
+    with pytest.raises(RuntimeError):
+        analytics.DelayAnalytics(db_path).update()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
@@ -0,0 +1,132 @@
+import json
+import os
+from datetime import datetime
+
+from conftest import import_from
+
+forecast_cache = import_from("個人課題2", "forecast_cache")
+
+#2024-12-14 10:30 発表の予報を、10:55 に取得した想定（次の発表は 11:00）
+REPORTED = "2024-12-14T10:30:00+09:00"
+NOW = datetime.fromisoformat("2024-12-14T10:55:00+09:00").timestamp()
+NEXT_REPORT = datetime.fromisoformat("2024-12-14T11:00:00+09:00").timestamp()
+
+
+def forecast(report_datetime):
+    return [{"reportDatetime": report_datetime, "timeSeries": []}]
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def json(self):
+        return self.data
+
+
+#返す応答を順に渡し、受け取ったリクエストを記録する
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, dict(headers or {})))
+        return self.responses.pop(0)
+
+
+def set_time(monkeypatch, now):
+    monkeypatch.setattr(forecast_cache.time, "time", lambda: now)
+
+
+#期限内はネットワークにアクセスせずに返す
+def test_hits_and_misses(monkeypatch):
+    set_time(monkeypatch, NOW)
+    session = FakeSession([FakeResponse(200, forecast(REPORTED))])
+    cache = forecast_cache.ForecastCache(session=session)
+    assert cache.get("130000") == forecast(REPORTED)
+    assert cache.get("130000") == forecast(REPORTED)
+    assert len(session.requests) == 1
+    assert session.requests[0][0] == forecast_cache.FORECAST_URL.format("130000")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+#有効期限は TTL と次の発表時刻の早い方
+def test_ttl_is_capped_by_next_report(monkeypatch):
+    set_time(monkeypatch, NOW)
+    session = FakeSession([FakeResponse(200, forecast(REPORTED)), FakeResponse(200, forecast("2024-12-14T11:00:00+09:00"))])
+    cache = forecast_cache.ForecastCache(ttl=3600, session=session)
+    cache.get("130000")
+    assert cache.entries["130000"]["expires_at"] == NEXT_REPORT
+    set_time(monkeypatch, NEXT_REPORT - 1)
+    cache.get("130000")
+    assert len(session.requests) == 1
+    set_time(monkeypatch, NEXT_REPORT + 1)
+    assert cache.get("130000") == forecast("2024-12-14T11:00:00+09:00")
+    assert len(session.requests) == 2
+
+
+#期限切れの後は ETag / Last-Modified で再検証し、304 なら手元の予報を使い続ける
+def test_revalidates_with_conditional_request(monkeypatch):
+    set_time(monkeypatch, NOW)
+    headers = {"ETag": '"abc"', "Last-Modified": "Sat, 14 Dec 2024 01:30:00 GMT"}
+    session = FakeSession([FakeResponse(200, forecast(REPORTED), headers), FakeResponse(304)])
+    cache = forecast_cache.ForecastCache(ttl=60, min_ttl=60, session=session)
+    cache.get("130000")
+    assert session.requests[0][1] == {}
+    set_time(monkeypatch, NOW + 120)
+    assert cache.get("130000") == forecast(REPORTED)
+    assert session.requests[1][1] == {"If-None-Match": '"abc"', "If-Modified-Since": "Sat, 14 Dec 2024 01:30:00 GMT"}
+    assert cache.stats()["revalidated"] == 1
+    assert cache.entries["130000"]["expires_at"] == NOW + 180
+
+
+#件数の上限を超えたら最も古く使われたものから削除する
+def test_evicts_least_recently_used(monkeypatch):
+    set_time(monkeypatch, NOW)
+    cache = forecast_cache.ForecastCache(max_entries=2, session=FakeSession([]))
+    cache.put("130000", forecast(REPORTED))
+    cache.put("140000", forecast(REPORTED))
+    cache.get("130000")
+    cache.put("270000", forecast(REPORTED))
+    assert list(cache.entries) == ["130000", "270000"]
+
+
+#put() はメモリだけを更新し、save() で1回だけ書き出す
+def test_put_marks_dirty_and_save_writes_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "forecast_cache.json")
+    cache = forecast_cache.ForecastCache(path, session=object())
+    for area_id in ("130000", "140000", "270000"):
+        cache.put(area_id, forecast("2024-12-14T11:00:00+09:00"))
+    assert not os.path.exists(path)
+    assert cache.dirty
+
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr(forecast_cache.os, "replace", lambda src, dst: (replaced.append(dst), replace(src, dst)))
+    cache.save()
+    cache.save()
+    assert replaced == [path]
+    assert not cache.dirty
+    with open(path, encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["130000", "140000", "270000"]
+    assert sorted(forecast_cache.ForecastCache(path, session=object()).entries) == ["130000", "140000", "270000"]
+
+
+#書き出しに失敗したら、次の save() で書き出し直す
+def test_failed_save_stays_dirty(tmp_path):
+    path = str(tmp_path / "missing" / "forecast_cache.json")
+    cache = forecast_cache.ForecastCache(path, session=object())
+    cache.put("130000", forecast("2024-12-14T11:00:00+09:00"))
+    cache.save()
+    assert cache.dirty
+    os.mkdir(tmp_path / "missing")
+    cache.save()
+    assert not cache.dirty and os.path.exists(path)
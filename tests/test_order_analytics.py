@@ -0,0 +1,68 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import ROOT, import_from
+
+order_analytics = import_from("週次課題用フォルダ/week4", "order_analytics")
+
+DATA_DIR = os.path.join(ROOT, order_analytics.DATA_DIR)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for name in ("Items.csv", "Orders.csv", "Users.csv"):
+        shutil.copy(os.path.join(DATA_DIR, name), tmp_path / name)
+    return tmp_path
+
+
+def make_analytics(data_dir, cls=None, **kwargs):
+    cls = cls or order_analytics.OrderAnalytics
+    return cls(str(data_dir / "Items.csv"), str(data_dir / "Orders.csv"), str(data_dir / "Users.csv"), **kwargs)
+
+
+#ファイルの境目が違えば、つなげた中身が同じでもハッシュは変わる
+def test_file_hash_separates_files(tmp_path):
+    (tmp_path / "a1").write_bytes(b"ab")
+    (tmp_path / "b1").write_bytes(b"c")
+    (tmp_path / "a2").write_bytes(b"a")
+    (tmp_path / "b2").write_bytes(b"bc")
+    first = order_analytics.file_hash([str(tmp_path / "a1"), str(tmp_path / "b1")])
+    second = order_analytics.file_hash([str(tmp_path / "a2"), str(tmp_path / "b2")])
+    assert first != second
+
+
+#CSVが変わったら作り直し、古い表のファイルは残さない
+def test_cache_is_rebuilt_and_stale_files_removed(data_dir):
+    pytest.importorskip("pyarrow")
+    cache_dir = data_dir / "cache"
+    first = make_analytics(data_dir, cache_dir=str(cache_dir))
+    totals = first.order_totals()
+    assert os.listdir(cache_dir) == [os.path.basename(first.cache_path())]
+
+    with open(data_dir / "Orders.csv", "a", encoding="utf-8") as f:
+        f.write("\n9999,1,101,2\n")
+    second = make_analytics(data_dir, cache_dir=str(cache_dir))
+    assert second.order_totals()[9999] == 2 * 1611
+    assert second.order_totals().drop(9999).equals(totals)
+    assert os.listdir(cache_dir) == [os.path.basename(second.cache_path())]
+
+
+#分割して読みながらの集計は、結合した表の集計と同じ結果になる（分割の境目で注文が分かれても）
+@pytest.mark.parametrize("chunk_size, compact_rows", [(7, 5), (1000, 1)])
+def test_streaming_matches_in_memory(data_dir, chunk_size, compact_rows):
+    memory = make_analytics(data_dir, cache_dir=None)
+    stream = make_analytics(data_dir, order_analytics.StreamingOrderAnalytics,
+                            chunk_size=chunk_size, compact_rows=compact_rows)
+    assert not isinstance(stream, order_analytics.OrderAnalytics)
+    assert stream.order_totals().equals(memory.order_totals())
+    assert stream.user_stats().equals(memory.user_stats())
+    assert stream.top_orders(3).equals(memory.top_orders(3))
+    assert stream.top_users(3, with_names=True).equals(memory.top_users(3, with_names=True))
+
+
+#集計の方法を持たない OrderReports は作れない
+def test_order_reports_is_abstract():
+    with pytest.raises(TypeError):
+        order_analytics.OrderReports()
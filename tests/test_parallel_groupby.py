@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from conftest import import_from
+
+parallel_groupby = import_from("週次課題用フォルダ/week4", "parallel_groupby")
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    rows = 200_000
+    data = pd.DataFrame({
+        "key": rng.integers(0, 5_000, rows),
+        "value": rng.normal(size=rows) * 1e6,
+        "count": rng.integers(0, 100, rows),
+    })
+    data.loc[rng.integers(0, rows, 500), "value"] = np.nan
+    return data
+
+
+#キーの型ごとの表（欠損のキーや -0.0 を含む）
+def with_key(frame, kind):
+    if kind == "int":
+        return frame
+    if kind == "float":
+        keys = frame["key"].astype(float)
+        keys[:100] = np.nan
+        keys[100:200] = -0.0
+        return frame.assign(key=keys)
+    return frame.assign(key=frame["key"].astype(str))
+
+
+#並列に計算しても pandas と同じ値（誤差もなく）になる
+@pytest.mark.parametrize("kind", ["int", "float", "str"])
+@pytest.mark.parametrize("agg", ["sum", "mean", "min", "count"])
+def test_matches_pandas_exactly(frame, kind, agg):
+    data = with_key(frame, kind)
+    expected = data.groupby("key")[["value", "count"]].agg(agg)
+    for workers in (2, 3):
+        result = parallel_groupby.parallel_groupby(data, "key", agg, workers=workers, min_rows=0)
+        assert_frame_equal(result, expected, check_exact=True)
+
+
+#キーがすべて欠損なら pandas と同じく空になる
+def test_all_missing_keys():
+    data = pd.DataFrame({"key": [np.nan] * 4, "value": [1.0, 2.0, 3.0, 4.0]})
+    result = parallel_groupby.parallel_groupby(data, "key", "sum", workers=2, min_rows=0)
+    assert_frame_equal(result, data.groupby("key")[["value"]].sum())
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import ROOT, import_from
+
+recommender = import_from("週次課題用フォルダ/week4", "recommender")
+item_index = import_from("週次課題用フォルダ/week4", "item_index")
+
+
+@pytest.fixture(scope="module")
+def items():
+    return pd.read_csv(os.path.join(ROOT, recommender.ITEMS_PATH))
+
+
+#価格・ページ数・カテゴリが重なる小さな表（同順位の扱いを確かめる）
+@pytest.fixture(scope="module")
+def tied_items():
+    rng = np.random.default_rng(1)
+    rows = 300
+    return pd.DataFrame({
+        "item_id": rng.permutation(rows) + 1,
+        "big_category": rng.choice(["a", "b", "c"], rows),
+        "small_category": rng.choice(["x", "y", "z", "w"], rows),
+        "item_price": rng.integers(0, 10, rows) * 100,
+        "pages": rng.integers(0, 5, rows) * 10,
+    })
+
+
+#2422016_12.py と同じ並べ替え（同じ順位なら行の順）
+def expected_top_k(data, item_id, k):
+    target = data[data["item_id"] == item_id].iloc[0]
+    ranked = data.assign(
+        rule1_rank=(data["small_category"] == target["small_category"]).astype(int)
+        + (data["big_category"] == target["big_category"]),
+        price_diff=(data["item_price"] - target["item_price"]).abs(),
+        page_diff=(data["pages"] - target["pages"]).abs(),
+    ).sort_values(["rule1_rank", "price_diff", "page_diff"], ascending=[False, True, True], kind="stable")
+    return ranked[ranked["item_id"] != item_id]["item_id"].tolist()[:k]
+
+
+@pytest.mark.parametrize("data_name", ["items", "tied_items"])
+def test_recommenders_match_pandas_sort(request, data_name):
+    data = request.getfixturevalue(data_name)
+    model = recommender.Recommender(data)
+    index = item_index.ItemIndex.from_frame(data)
+    all_top = model.top_k_all(3)
+    for position, item_id in enumerate(data["item_id"].tolist()[:200]):
+        expected = expected_top_k(data, item_id, 3)
+        assert model.top_k(item_id, 3).tolist() == expected
+        assert all_top[position].tolist() == expected
+        assert index.top_k(item_id, 3) == expected
+
+
+#追加・削除した後も、作り直した索引と同じ推薦になる
+def test_item_index_updates(tied_items):
+    index = item_index.ItemIndex.from_frame(tied_items)
+    removed = tied_items["item_id"].tolist()[:20]
+    for item_id in removed:
+        index.remove(item_id)
+    added = pd.DataFrame({"item_id": [1001, 1002], "big_category": ["a", "b"], "small_category": ["x", "y"],
+                          "item_price": [300, 300], "pages": [20, 20]})
+    for row in added.itertuples(index=False):
+        index.add(row.item_id, row.small_category, row.big_category, row.item_price, row.pages)
+    rebuilt = pd.concat([tied_items[~tied_items["item_id"].isin(removed)], added], ignore_index=True)
+    for item_id in rebuilt["item_id"].tolist()[:100] + [1001, 1002]:
+        assert index.top_k(item_id, 3) == expected_top_k(rebuilt, item_id, 3)
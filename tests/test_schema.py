@@ -0,0 +1,43 @@
+import sqlite3
+
+from conftest import import_from
+
+schema = import_from("最終課題", "schema")
+
+#以前の形式(版1)の transport_weather テーブル
+V1_TABLE = """
+    CREATE TABLE transport_weather (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT,
+        fetch_time TEXT,
+        weather TEXT,
+        delay_status TEXT
+    )
+"""
+
+#通常運転・遅延・取得の失敗（路線と天気の両方）を含む行
+V1_ROWS = [
+    ("2025-01-19", "05:00:00", "曇時々晴", "多摩都市モノレールは通常運転です"),
+    ("2025-01-19", "06:01:35", "曇一時雨", "多摩都市モノレールは遅延しています"),
+    ("2025-01-19", "07:05:07", "天気情報の取得に失敗しました: timeout", "多摩都市モノレールは遅延しています"),
+    ("2025-01-19", "08:00:00", "晴", "運行状況取得エラー: 503 Server Error"),
+    ("2025-01-20", "00:00:00", "現在の天気情報が見つかりませんでした", "多摩都市モノレールは通常運転です"),
+    ("2025-01-20", "23:00:00", "曇一時雨", "多摩都市モノレールは通常運転です"),
+]
+
+
+#移行した後も、ビューから以前と同じ行が読める
+def test_migrate_v1_view_matches_legacy_rows(tmp_path):
+    path = str(tmp_path / "transport_weather.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(V1_TABLE)
+        conn.executemany("INSERT INTO transport_weather (date, fetch_time, weather, delay_status) VALUES (?, ?, ?, ?)",
+                         V1_ROWS)
+        expected = conn.execute("SELECT * FROM transport_weather ORDER BY id").fetchall()
+    with sqlite3.connect(path) as conn:
+        assert schema.ensure_schema(conn)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == schema.SCHEMA_VERSION
+        assert schema.table_exists(conn, "transport_weather", "view")
+        assert conn.execute("SELECT * FROM transport_weather ORDER BY id").fetchall() == expected
+        #2回目は何もしない
+        assert not schema.ensure_schema(conn)
@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import import_from
+
+sources = import_from("最終課題", "sources")
+
+
+class SlowResponse:
+    status_code = 200
+    headers = {}
+    encoding = "utf-8"
+
+    def __init__(self, html):
+        self.html = html
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        yield self.html
+
+    def close(self):
+        pass
+
+
+#URL → 応答までの秒数
+class SlowSession:
+    def __init__(self, delays):
+        self.delays = delays
+
+    def get(self, url, **kwargs):
+        time.sleep(self.delays[url])
+        return SlowResponse("<html><body><p>平常</p></body></html>")
+
+
+def make_sources(count):
+    return [sources.Source(f"line{number}", "line", f"路線{number}", f"https://line{number}.test/") for number in range(count)]
+
+
+#スレッドの空きを待っている時間はタイムアウトに数えない
+def test_queued_requests_do_not_time_out():
+    lines = make_sources(4)
+    session = SlowSession({line.url: 0.2 for line in lines})
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = sources.fetch_all(lines, session, executor, timeout=0.5)
+    assert [result.error for result in results] == [None] * 4
+    assert [result.value for result in results] == [sources.LINE_NORMAL] * 4
+
+
+#始まってから timeout 秒を過ぎた取得元だけがタイムアウトになる
+def test_slow_request_times_out():
+    lines = make_sources(2)
+    session = SlowSession({lines[0].url: 1.0, lines[1].url: 0.05})
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        start = time.monotonic()
+        results = sources.fetch_all(lines, session, executor, timeout=0.3)
+        assert time.monotonic() - start < 0.9
+    assert results[0].error is not None
+    assert results[1].error is None
@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+
+import pytest
+
+from conftest import import_from
+
+storage = import_from("最終課題", "storage")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "storage.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE rows (value INTEGER)")
+    return path
+
+
+def count_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT count(*) FROM rows").fetchone()[0]
+
+
+def test_flush_waits_for_writes(db_path):
+    writer = storage.StorageWriter(db_path)
+    writer.executemany("INSERT INTO rows VALUES (?)", [(value,) for value in range(100)])
+    writer.execute("INSERT INTO rows VALUES (?)", (100,))
+    assert writer.flush(timeout=5)
+    assert count_rows(db_path) == 101
+    writer.close()
+
+
+#閉じた後の依頼は受け付けない
+def test_closed_writer_raises(db_path):
+    writer = storage.StorageWriter(db_path)
+    writer.close()
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.execute("INSERT INTO rows VALUES (1)")
+    with pytest.raises(RuntimeError):
+        writer.flush()
+
+
+#書き込みスレッドが止まっていたら、flush は待ち続けずに知らせる
+def test_flush_raises_when_thread_died(db_path, monkeypatch):
+    monkeypatch.setattr(storage, "ALIVE_CHECK_INTERVAL", 0.05)
+    writer = storage.StorageWriter(db_path)
+    monkeypatch.setattr(writer, "_write", lambda conn, items: (_ for _ in ()).throw(MemoryError("boom")))
+    writer.execute("INSERT INTO rows VALUES (1)")
+    with pytest.raises(RuntimeError, match="boom"):
+        writer.flush(timeout=5)
+    with pytest.raises(RuntimeError):
+        writer.execute("INSERT INTO rows VALUES (2)")
+    writer.close()
+
+
+#close() と同時に依頼しても、受け付けた行はすべて書き込まれる
+def test_concurrent_close_keeps_accepted_rows(db_path):
+    writer = storage.StorageWriter(db_path)
+    accepted = []
+
+    def put_rows():
+        for value in range(1000):
+            try:
+                writer.execute("INSERT INTO rows VALUES (?)", (value,))
+            except RuntimeError:
+                return
+            accepted.append(value)
+
+    threads = [threading.Thread(target=put_rows) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    writer.close()
+    for thread in threads:
+        thread.join()
+    assert count_rows(db_path) == len(accepted)
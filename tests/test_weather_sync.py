@@ -0,0 +1,100 @@
+import sqlite3
+
+import pytest
+
+from conftest import import_from
+
+database = import_from("個人課題3", "database")
+
+HEADER = "id,地域名,日付,天気\n"
+
+
+#database.py は 個人課題3/ からの相対パスで読み書きするので、一時フォルダに同じ形を作る
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    (tmp_path / "個人課題3").mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "個人課題3"
+
+
+def write_rows(csv_path, start, end, mode="a"):
+    with open(csv_path, mode, encoding="utf-8", newline="") as f:
+        if mode == "w":
+            f.write(HEADER)
+        for row_id in range(start, end):
+            f.write(f"{row_id},地域{row_id},2024-12-14,晴\n")
+
+
+def read_db(workdir):
+    with sqlite3.connect(workdir / "weather.db") as conn:
+        return conn.execute("SELECT id, area_name FROM weather ORDER BY id").fetchall()
+
+
+#追記した分だけを前回の位置から取り込み、書き途中の行は次回に回す
+def test_sync_resumes_from_offset(workdir, capsys):
+    csv_path = workdir / "weather.csv"
+    write_rows(csv_path, 1, 6, mode="w")
+    assert database.sync_db_with_csv()
+    assert [row_id for row_id, _ in read_db(workdir)] == [1, 2, 3, 4, 5]
+
+    #取り込み済みの行を直接書き換えておく（続きから取り込むなら上書きされない）
+    with sqlite3.connect(workdir / "weather.db") as conn:
+        conn.execute("UPDATE weather SET area_name = '変更済み' WHERE id = 1")
+    offset = database.load_sync_state(str(workdir / "weather.csv.sync"))["offset"]
+    write_rows(csv_path, 6, 9)
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("9,地域9,2024-12")
+    capsys.readouterr()
+    assert database.sync_db_with_csv()
+    assert f"{offset}バイト目から" in capsys.readouterr().out
+    rows = read_db(workdir)
+    assert [row_id for row_id, _ in rows] == list(range(1, 9))
+    assert rows[0][1] == "変更済み"
+
+    #書き途中だった行が完成したら取り込む
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("-14,晴\n")
+    assert database.sync_db_with_csv()
+    assert [row_id for row_id, _ in read_db(workdir)] == list(range(1, 10))
+    assert not database.sync_db_with_csv()
+
+
+#取り込み済みの部分が書き換えられたら作り直す
+def test_sync_rebuilds_when_imported_part_changes(workdir, capsys):
+    csv_path = workdir / "weather.csv"
+    write_rows(csv_path, 1, 6, mode="w")
+    database.sync_db_with_csv()
+    text = csv_path.read_text(encoding="utf-8").replace("地域1,", "地域X,")
+    csv_path.write_text(text, encoding="utf-8")
+    capsys.readouterr()
+    assert database.sync_db_with_csv()
+    assert "リセットします" in capsys.readouterr().out
+    assert read_db(workdir)[0] == (1, "地域X")
+
+
+#最後に取り込んだ行がデータベースになければ作り直す
+def test_sync_rebuilds_when_last_row_missing(workdir):
+    csv_path = workdir / "weather.csv"
+    write_rows(csv_path, 1, 6, mode="w")
+    database.sync_db_with_csv()
+    with sqlite3.connect(workdir / "weather.db") as conn:
+        conn.execute("DELETE FROM weather WHERE id = 5")
+    assert database.sync_db_with_csv()
+    assert [row_id for row_id, _ in read_db(workdir)] == [1, 2, 3, 4, 5]
+
+
+#ファイルの途中を同じ長さで書き換えても見つけて作り直す
+def test_sync_rebuilds_when_middle_rewritten_in_place(workdir):
+    csv_path = workdir / "weather.csv"
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        f.write(HEADER)
+        for row_id in range(1, 20001):
+            f.write(f"{row_id},東京都,2024-12-14,晴\n")
+    database.sync_db_with_csv()
+    size = csv_path.stat().st_size
+    text = csv_path.read_text(encoding="utf-8").replace("10000,東京都,", "10000,大阪府,")
+    csv_path.write_text(text, encoding="utf-8")
+    assert csv_path.stat().st_size == size
+    assert database.sync_db_with_csv()
+    with sqlite3.connect(workdir / "weather.db") as conn:
+        assert conn.execute("SELECT area_name FROM weather WHERE id = 10000").fetchone()[0] == "大阪府"
@@ -0,0 +1,126 @@
+import json
+import os
+import pickle
+import threading
+import time
+
+import requests
+
+AREA_URL = "http://www.jma.go.jp/bosai/common/const/area.json"
+
+# area.json の階層(上位から順に)
+AREA_LEVELS = ("centers", "offices", "class10s", "class15s", "class20s")
+
+# インデックスに残す項目(enName などアプリで使わない項目は捨てる)
+KEPT_FIELDS = ("name", "parent", "children", "officeName", "kana")
+
+# インデックスの形式を変えたときに古いピクルを読まないようにするための番号
+INDEX_VERSION = 2
+
+
+# area.json の内容を必要な項目だけの辞書に変換する関数
+def compact_area_data(raw):
+    """area.json をアプリで使う項目だけに絞った辞書に変換する。"""
+    compact = {}
+    for level in AREA_LEVELS:
+        compact[level] = {
+            area_id: {key: info[key] for key in KEPT_FIELDS if key in info}
+            for area_id, info in raw.get(level, {}).items()
+        }
+    return compact
+
+
+# ファイルを一時ファイル経由で書き込む関数
+def _write_atomic(path, data, mode):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# 変換済みインデックスをピクルとして保存する関数
+def save_index(index_path, area_data, source_path, source_mtime):
+    try:
+        payload = pickle.dumps(
+            {"version": INDEX_VERSION, "source": source_path, "source_mtime": source_mtime, "areas": area_data},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        _write_atomic(index_path, payload, "wb")
+    except OSError as e:
+        print(f"地域インデックスの保存に失敗しました: {e}")
+
+
+# ピクルからインデックスを読み込む関数(元のファイルが違うか、元のファイルより古ければ None)
+def load_index(index_path, source_path, source_mtime):
+    try:
+        with open(index_path, "rb") as f:
+            saved = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if (saved.get("version") != INDEX_VERSION or saved.get("source") != source_path
+            or saved.get("source_mtime") != source_mtime):
+        return None
+    return saved["areas"]
+
+
+# area.json を読み込んでインデックスを作り直す関数
+def build_index(json_path, index_path):
+    with open(json_path, "r", encoding="utf-8") as f:
+        area_data = compact_area_data(json.load(f))
+    save_index(index_path, area_data, json_path, os.path.getmtime(json_path))
+    return area_data
+
+
+# ネットワークから area.json を取得してキャッシュファイルを更新する関数
+def refresh_area_file(cache_path, index_path, timeout=10):
+    """気象庁から最新の area.json を取得し、キャッシュファイルとインデックスを更新する。
+
+    同梱の area.json は書き換えない(リポジトリで管理しているファイルのため)。
+    """
+    response = requests.get(AREA_URL, timeout=timeout)
+    response.raise_for_status()
+    raw = response.json()
+    if "offices" not in raw:
+        raise ValueError("area.json に offices が含まれていません")
+    _write_atomic(cache_path, response.content, "wb")
+    return build_index(cache_path, index_path)
+
+
+# 古くなった地域データをバックグラウンドで更新する関数
+def start_background_refresh(cache_path, index_path, on_refresh=None):
+    def worker():
+        try:
+            area_data = refresh_area_file(cache_path, index_path)
+        except Exception as e:
+            print(f"地域リストの更新に失敗しました(ローカルのデータを使います): {e}")
+            return
+        if on_refresh is not None:
+            on_refresh(area_data)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
+
+
+# 地域データを読み込む関数(ローカル優先)
+def load_area_data(json_path, index_path, cache_path, max_age=7 * 24 * 3600, on_refresh=None):
+    """地域データを全階層分返す。
+
+    取得済みのキャッシュ(cache_path)があればそれを、なければ同梱の area.json を元にする。
+    元のファイルから作った変換済みのピクルがあればそれを読む。
+    ネットワークにアクセスするのは、元のファイルが max_age 秒より古い場合の
+    バックグラウンド更新と、どちらのファイルも存在しない場合だけ。
+    取得した内容はキャッシュに書き、同梱の area.json は読むだけにする。
+    """
+    source_path = cache_path if os.path.exists(cache_path) else json_path
+    if not os.path.exists(source_path):
+        return refresh_area_file(cache_path, index_path)
+
+    source_mtime = os.path.getmtime(source_path)
+    area_data = load_index(index_path, source_path, source_mtime)
+    if area_data is None:
+        area_data = build_index(source_path, index_path)
+
+    if time.time() - source_mtime > max_age:
+        start_background_refresh(cache_path, index_path, on_refresh)
+    return area_data
@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LatestRequestRunner:
+    """バックグラウンドで処理を実行し、最新の依頼の結果だけを反映する。
+
+    新しい依頼が来たら、まだ始まっていない古い依頼は取り消し、
+    すでに実行中の古い依頼は結果を捨てる。
+    """
+
+    def __init__(self, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.pending = None
+
+    # 処理を依頼する
+    def submit(self, work, on_done, on_error=None):
+        """work() をバックグラウンドで実行し、最新の依頼であれば on_done(結果) を呼ぶ。
+
+        on_done / on_error は lock を保持したまま呼ぶので、その間 cancel() や次の submit() は待たされる。
+        ファイルへの書き込みなど時間のかかる処理は work() の中で行い、on_done では画面の反映だけを行う。
+        """
+        with self.lock:
+            self.generation += 1
+            token = self.generation
+            if self.pending is not None:
+                self.pending.cancel()
+            future = self.executor.submit(work)
+            self.pending = future
+
+        def finish(done_future):
+            if done_future.cancelled():
+                return
+            error = done_future.exception()
+            # 反映中に次の依頼が割り込まないよう lock を保持したまま呼ぶ
+            with self.lock:
+                if token != self.generation:
+                    return
+                if error is None:
+                    on_done(done_future.result())
+                elif on_error is not None:
+                    on_error(error)
+
+        future.add_done_callback(finish)
+        return token
+
+    # 依頼が最新のものかどうかを返す
+    def is_current(self, token):
+        return token == self.generation
+
+    # 実行中の依頼をすべて無効にする
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+            if self.pending is not None:
+                self.pending.cancel()
+            self.pending = None
+
+    # スレッドを終了する
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
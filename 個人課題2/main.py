@@ -1,13 +1,26 @@
 import flet as ft
-import requests
+from forecast_cache import ForecastCache
+from area_loader import load_area_data
+from area_index import AreaIndex
+from latest_request import LatestRequestRunner
+from forecast_parser import find_series, parse_forecast
+
+# 同梱の地域データ(area.json)と変換済みインデックスの保存先
+AREA_JSON_PATH = "個人課題2/area.json"
+AREA_INDEX_PATH = "個人課題2/area_index.pickle"
+# ネットワークから取得した最新の地域データの保存先(同梱の area.json は書き換えない)
+AREA_CACHE_PATH = "個人課題2/area_cache.json"
 
 # 地域リストを取得する関数
 def get_area_list():
     """地域リストを取得する関数。"""
+    return get_area_index().data["offices"]
+
+# 全階層の地域インデックスを取得する関数
+def get_area_index():
+    """area.json の全階層から地域インデックスを作成する。"""
     try:
-        response = requests.get("http://www.jma.go.jp/bosai/common/const/area.json")
-        response.raise_for_status()
-        return response.json()["offices"]
+        return AreaIndex(load_area_data(AREA_JSON_PATH, AREA_INDEX_PATH, AREA_CACHE_PATH))
     except Exception as e:
         raise Exception(f"地域リストの取得に失敗しました: {e}")
 
@@ -22,15 +35,19 @@ def group_by_region(area_data):
         regions[region].append((area_id, area_info["name"]))  # 地域IDと名前を追加
     return regions
 
+# 天気予報のキャッシュ(メモリ + ディスク)
+forecast_cache = ForecastCache("個人課題2/forecast_cache.json")
+
 # 天気データを取得する関数
 def get_weather_data(area_id):
     """天気データを取得する関数。"""
     try:
-        response = requests.get(f"https://www.jma.go.jp/bosai/forecast/data/forecast/{area_id}.json")
-        response.raise_for_status()
-        return response.json()
+        weather_data = forecast_cache.get(area_id)
     except Exception as e:
         raise Exception(f"天気情報の取得に失敗しました: {e}")
+    # 取得した内容はここで1回だけディスクに書き出す
+    forecast_cache.save()
+    return weather_data
 
 # 天気の内容に基づくアイコンのマッピング
 def get_weather_icon(weather):
@@ -50,12 +67,16 @@ def get_weather_icon(weather):
 def parse_weather(weather_data):
     """天気データを解析して日付、予報、アイコンを返す。"""
     try:
-        time_series = weather_data[0]["timeSeries"][0]
-        weather_forecast = time_series["areas"][0]["weathers"]
-        dates = time_series["timeDefines"]
+        series = find_series(parse_forecast(weather_data), "weathers", report=0)
+        weather_forecast = series["fields"]["weathers"][0]
+        dates = series["timeDefines"]
         # アイコンを追加してリストにする
-        return [(date, weather, get_weather_icon(weather)) for date, weather in zip(dates, weather_forecast)]
-    except (IndexError, KeyError) as e:
+        return [
+            (date, weather, get_weather_icon(weather))
+            for date, weather in zip(dates, weather_forecast)
+            if weather is not None
+        ]
+    except (IndexError, KeyError, TypeError, AttributeError) as e:
         return []
 
 # メインアプリケーション
@@ -65,13 +86,13 @@ def main(page: ft.Page):
 
     # 地域データを取得
     try:
-        area_data = get_area_list()
+        area_index = get_area_index()
     except Exception as e:
         page.add(ft.Text(f"地域データの取得に失敗しました: {e}", color="red"))
         return
 
     # 地方ごとにデータを整理
-    grouped_areas = group_by_region(area_data)
+    grouped_areas = group_by_region(area_index.data["offices"])
 
     # 地方リスト
     region_names = list(grouped_areas.keys())
@@ -79,24 +100,34 @@ def main(page: ft.Page):
     # 天気情報を表示するコンテナ
     weather_container = ft.Column(scroll="adaptive")
 
+    # 天気データの取得はバックグラウンドで行い、最後にクリックした地域の結果だけを表示する
+    weather_runner = LatestRequestRunner()
+
     # 天気予報を表示する関数
     def show_weather(area_id):
         """選択した地域の天気予報を表示する。"""
+        # 画面を書き換える前に、実行中の取得の結果を無効にする
+        # (先に書き換えると、その間に終わった前の地域の結果が読み込み中の表示を上書きする)
+        weather_runner.cancel()
         weather_container.controls.clear()
         if not area_id:
             weather_container.controls.append(ft.Text("地域を選択してください。"))
             page.update()
             return
-        try:
-            # 天気データを取得
-            weather_data = get_weather_data(area_id)
-            forecast = parse_weather(weather_data)
-            # 地域名
-            area_name = next(
-                (name for areas in grouped_areas.values() for id_, name in areas if id_ == area_id),
-                "不明"
-            )
-            # 天気情報を表示
+        # 地域名
+        area_name = area_index.name(area_id, "offices", "不明")
+        # 取得が終わるまで読み込み中を表示
+        weather_container.controls.append(ft.Text(f"{area_name}の天気予報", style="headlineLarge", weight="bold"))
+        weather_container.controls.append(ft.ProgressRing())
+        page.update()
+
+        def load_forecast():
+            """天気データを取得して解析する(バックグラウンドで実行)。"""
+            return parse_weather(get_weather_data(area_id))
+
+        def render_forecast(forecast):
+            """天気情報を表示する。"""
+            weather_container.controls.clear()
             weather_container.controls.append(ft.Text(f"{area_name}の天気予報", style="headlineLarge", weight="bold"))
             if not forecast:
                 weather_container.controls.append(ft.Text("天気情報が見つかりません。", color="red"))
@@ -108,9 +139,15 @@ def main(page: ft.Page):
                         leading=ft.Icon(icon),  # 天気アイコンを追加
                     )
                 )
-        except Exception as e:
+            page.update()
+
+        def render_error(e):
+            """取得に失敗したことを表示する。"""
+            weather_container.controls.clear()
             weather_container.controls.append(ft.Text(f"天気情報の取得に失敗しました: {e}", color="red"))
-        page.update()
+            page.update()
+
+        weather_runner.submit(load_forecast, render_forecast, render_error)
 
     # 地方を選択したときに表示される地域リストを作成する関数
     def show_region_areas(selected_index):
@@ -1,14 +1,26 @@
 import flet as ft
-import requests
-import csv
+from forecast_cache import ForecastCache
+from area_loader import load_area_data
+from area_index import AreaIndex
+from latest_request import LatestRequestRunner
+from forecast_parser import find_series, parse_forecast
+from weather_log import WeatherLogWriter
 from datetime import datetime
 
+#同梱の地域データ(area.json)と変換済みインデックスの保存先
+AREA_JSON_PATH = "個人課題3/area.json"
+AREA_INDEX_PATH = "個人課題3/area_index.pickle"
+#ネットワークから取得した最新の地域データの保存先(同梱の area.json は書き換えない)
+AREA_CACHE_PATH = "個人課題3/area_cache.json"
+
 #地域リストを取得
 def get_area_list():
+    return get_area_index().data["offices"]
+
+#全階層の地域インデックスを取得
+def get_area_index():
     try:
-        response = requests.get("http://www.jma.go.jp/bosai/common/const/area.json")
-        response.raise_for_status()
-        return response.json()["offices"]
+        return AreaIndex(load_area_data(AREA_JSON_PATH, AREA_INDEX_PATH, AREA_CACHE_PATH))
     except Exception as e:
         raise Exception(f"地域リストの取得に失敗しました: {e}")
 
@@ -27,24 +39,30 @@ REGION_MAPPING = {
     "沖縄地方": ["471000", "472000", "473000", "474000"],
 }
 
+#地域ID→地方名の逆引き
+REGION_BY_AREA = {area_id: region for region, ids in REGION_MAPPING.items() for area_id in ids}
+
 #地方分けに従ってデータを整理
 def group_by_region_fixed(area_data):
     regions = {region: [] for region in REGION_MAPPING.keys()}
     for area_id, area_info in area_data.items():
-        for region, ids in REGION_MAPPING.items():
-            if area_id in ids:
-                regions[region].append((area_id, area_info["name"]))
-                break
+        region = REGION_BY_AREA.get(area_id)
+        if region is not None:
+            regions[region].append((area_id, area_info["name"]))
     return regions
 
+#天気予報のキャッシュ(メモリ + ディスク)
+forecast_cache = ForecastCache("個人課題3/forecast_cache.json")
+
 #天気データを取得
 def get_weather_data(area_id):
     try:
-        response = requests.get(f"https://www.jma.go.jp/bosai/forecast/data/forecast/{area_id}.json")
-        response.raise_for_status()
-        return response.json()
+        weather_data = forecast_cache.get(area_id)
     except Exception as e:
         raise Exception(f"天気情報の取得に失敗しました: {e}")
+    #取得した内容はここで1回だけディスクに書き出す
+    forecast_cache.save()
+    return weather_data
 
 #天気の内容に基づくアイコンと天気情報の簡潔な表現
 def get_weather_icon(weather):
@@ -62,20 +80,25 @@ def get_weather_icon(weather):
 #天気データを解析
 def parse_weather(weather_data):
     try:
-        time_series = weather_data[0]["timeSeries"][0]
-        weather_forecast = time_series["areas"][0]["weathers"]
-        dates = time_series["timeDefines"]
+        series = find_series(parse_forecast(weather_data), "weathers", report=0)
+        weather_forecast = series["fields"]["weathers"][0]
+        dates = series["timeDefines"]
         #アイコンを追加してリストにする
-        return [(date, weather, get_weather_icon(weather)) for date, weather in zip(dates, weather_forecast)]
-    except (IndexError, KeyError) as e:
+        return [
+            (date, weather, get_weather_icon(weather))
+            for date, weather in zip(dates, weather_forecast)
+            if weather is not None
+        ]
+    except (IndexError, KeyError, TypeError, AttributeError) as e:
         return []
 
+#天気データの記録用CSV（通し番号はメモリに保持して追記する）
+weather_log = WeatherLogWriter("個人課題3/weather.csv")
+
 #CSVファイルをリセット
 def reset_csv():
     try:
-        with open("個人課題3/weather.csv", mode="w", encoding="utf-8", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(["id", "地域名", "日付", "天気"])  # ヘッダーを再作成
+        weather_log.reset()  # ヘッダーを再作成
         print("weather.csv の内容をリセットしました。")
     except Exception as e:
         print(f"CSVファイルのリセットに失敗しました: {e}")
@@ -83,24 +106,12 @@ def reset_csv():
 #天気データをCSVファイルに追記
 def save_weather_to_csv(area_name, forecast):
     try:
-        csv_path = "個人課題3/weather.csv"
-        #通し番号を計算
-        try:
-            with open(csv_path, mode="r", encoding="utf-8") as rfile:
-                reader = csv.reader(rfile)
-                rows = list(reader)
-                serial_number = int(rows[-1][0]) + 1 if len(rows) > 1 else 1
-        except (FileNotFoundError, IndexError, ValueError):
-            serial_number = 1
-
-        with open(csv_path, mode="a", encoding="utf-8", newline="") as file:
-            writer = csv.writer(file)
-            today = datetime.now().strftime("%Y-%m-%d")
-
-            #天気データを記載（今日のデータのみ）
-            if forecast:
-                _, today_weather, (_, weather_desc) = forecast[0]
-                writer.writerow([serial_number, area_name, today, weather_desc])
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        #天気データを記載（今日のデータのみ）
+        if forecast:
+            _, today_weather, (_, weather_desc) = forecast[0]
+            weather_log.append([area_name, today, weather_desc])
         print("天気情報をweather.csvに追記しました。")
     except Exception as e:
         print(f"CSVファイルへの保存に失敗しました: {e}")
@@ -121,13 +132,13 @@ def main(page: ft.Page):
 
     #地域データを取得
     try:
-        area_data = get_area_list()
+        area_index = get_area_index()
     except Exception as e:
         page.add(ft.Text(f"地域データの取得に失敗しました: {e}", color="red"))
         return
 
     #地方ごとにデータを整理
-    grouped_areas = group_by_region_fixed(area_data)
+    grouped_areas = group_by_region_fixed(area_index.data["offices"])
 
     #地方リスト
     region_names = list(grouped_areas.keys())
@@ -135,23 +146,36 @@ def main(page: ft.Page):
     #天気情報を表示するコンテナ
     weather_container = ft.Column(scroll="adaptive")
 
+    #天気データの取得はバックグラウンドで行い、最後にクリックした地域の結果だけを表示する
+    weather_runner = LatestRequestRunner()
+
     #天気予報を表示する関数
     def show_weather(area_id):
+        #画面を書き換える前に、実行中の取得の結果を無効にする
+        #(先に書き換えると、その間に終わった前の地域の結果が読み込み中の表示を上書きする)
+        weather_runner.cancel()
         weather_container.controls.clear()
         if not area_id:
             weather_container.controls.append(ft.Text("地域を選択してください。"))
             page.update()
             return
-        try:
-            #天気データを取得
-            weather_data = get_weather_data(area_id)
-            forecast = parse_weather(weather_data)
-            #地域名
-            area_name = next(
-                (name for areas in grouped_areas.values() for id_, name in areas if id_ == area_id),
-                "不明"
-            )
-            #天気情報を表示
+        #地域名
+        area_name = area_index.name(area_id, "offices", "不明")
+        #取得が終わるまで読み込み中を表示
+        weather_container.controls.append(ft.Text(f"{area_name}の天気予報", style="headlineLarge", weight="bold"))
+        weather_container.controls.append(ft.ProgressRing())
+        page.update()
+
+        #天気データを取得して解析し、CSVに追記(バックグラウンド)
+        #(CSVへの追記はファイルのロックと fsync で待つことがあるので、表示の反映中には行わない)
+        def load_forecast():
+            forecast = parse_weather(get_weather_data(area_id))
+            save_weather_to_csv(area_name, forecast)
+            return forecast
+
+        #天気情報を表示
+        def render_forecast(forecast):
+            weather_container.controls.clear()
             weather_container.controls.append(ft.Text(f"{area_name}の天気予報", style="headlineLarge", weight="bold"))
             if not forecast:
                 weather_container.controls.append(ft.Text("天気情報が見つかりません。", color="red"))
@@ -163,11 +187,15 @@ def main(page: ft.Page):
                         leading=ft.Icon(icon),
                     )
                 )
-            #CSVに追記
-            save_weather_to_csv(area_name, forecast)
-        except Exception as e:
+            page.update()
+
+        #エラーを表示
+        def render_error(e):
+            weather_container.controls.clear()
             weather_container.controls.append(ft.Text(f"天気情報の取得に失敗しました: {e}", color="red"))
-        page.update()
+            page.update()
+
+        weather_runner.submit(load_forecast, render_forecast, render_error)
 
     #地方を選択したときに表示される地域リストを作成する関数
     def show_region_areas(selected_index):
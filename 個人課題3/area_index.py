@@ -0,0 +1,143 @@
+import difflib
+from bisect import bisect_left
+
+# area.json の階層(上位から順に)。親は1つ上の階層、子は1つ下の階層にある
+AREA_LEVELS = ("centers", "offices", "class10s", "class15s", "class20s")
+
+
+class AreaRecord:
+    """地域1件分の情報。"""
+
+    __slots__ = ("area_id", "name", "level", "parent", "children", "kana")
+
+    def __init__(self, area_id, name, level, parent=None, children=(), kana=None):
+        self.area_id = area_id
+        self.name = name
+        self.level = level
+        self.parent = parent
+        self.children = tuple(children)
+        self.kana = kana
+
+    def __repr__(self):
+        return f"AreaRecord({self.level}:{self.area_id} {self.name})"
+
+
+class AreaIndex:
+    """area.json の全階層を引くためのインデックス。
+
+    一度だけ作成し、ID→名前・ID→親・地方→子・名前→ID をすべて辞書で引く。
+    同じIDが複数の階層に現れる(例: offices と class10s の 011000)ため、
+    階層を指定しない検索では上位の階層を優先する。
+    """
+
+    def __init__(self, area_data):
+        self.data = area_data
+        self.levels = {}
+        self.by_id = {}
+        self.by_name = {}
+        for level in AREA_LEVELS:
+            records = {}
+            for area_id, info in area_data.get(level, {}).items():
+                record = AreaRecord(
+                    area_id,
+                    info["name"],
+                    level,
+                    info.get("parent"),
+                    info.get("children", ()),
+                    info.get("kana"),
+                )
+                records[area_id] = record
+                self.by_id.setdefault(area_id, record)
+                self.by_name.setdefault(record.name, []).append(record)
+            self.levels[level] = records
+        # 前方一致検索用に名前(とよみがな)を並べておく
+        keys = [(record.name, record) for records in self.levels.values() for record in records.values()]
+        keys += [(record.kana, record) for record in self.levels["class20s"].values() if record.kana]
+        keys.sort(key=lambda item: item[0])
+        self._sorted_keys = [key for key, _ in keys]
+        self._sorted_records = [record for _, record in keys]
+
+    def __len__(self):
+        return sum(len(records) for records in self.levels.values())
+
+    def __contains__(self, area_id):
+        return area_id in self.by_id
+
+    # IDから地域を取得する
+    def get(self, area_id, level=None):
+        if level is None:
+            return self.by_id.get(area_id)
+        return self.levels.get(level, {}).get(area_id)
+
+    # IDから名前を取得する
+    def name(self, area_id, level=None, default=None):
+        record = self.get(area_id, level)
+        return record.name if record is not None else default
+
+    # 親の地域を取得する
+    def parent(self, area_id, level=None):
+        record = self.get(area_id, level)
+        if record is None or record.parent is None:
+            return None
+        position = AREA_LEVELS.index(record.level)
+        if position == 0:
+            return None
+        return self.levels[AREA_LEVELS[position - 1]].get(record.parent)
+
+    # 子の地域一覧を取得する
+    def children(self, area_id, level=None):
+        record = self.get(area_id, level)
+        if record is None:
+            return []
+        position = AREA_LEVELS.index(record.level)
+        if position + 1 >= len(AREA_LEVELS):
+            return []
+        child_level = self.levels[AREA_LEVELS[position + 1]]
+        return [child_level[child_id] for child_id in record.children if child_id in child_level]
+
+    # 上位の地域を順に取得する(親, 親の親, ...)
+    def ancestors(self, area_id, level=None):
+        result = []
+        record = self.parent(area_id, level)
+        while record is not None:
+            result.append(record)
+            record = self.parent(record.area_id, record.level)
+        return result
+
+    # 名前が完全に一致する地域を取得する
+    def lookup(self, name, level=None):
+        records = self.by_name.get(name, [])
+        if level is not None:
+            records = [record for record in records if record.level == level]
+        return records
+
+    # 名前(またはよみがな)が前方一致する地域を取得する
+    def search_prefix(self, prefix, level=None, limit=20):
+        result = []
+        seen = set()
+        start = bisect_left(self._sorted_keys, prefix)
+        for position in range(start, len(self._sorted_keys)):
+            if not self._sorted_keys[position].startswith(prefix):
+                break
+            record = self._sorted_records[position]
+            if level is not None and record.level != level:
+                continue
+            if id(record) in seen:
+                continue
+            seen.add(id(record))
+            result.append(record)
+            if len(result) >= limit:
+                break
+        return result
+
+    # 名前があいまいに一致する地域を取得する
+    def search_fuzzy(self, query, level=None, limit=5, cutoff=0.5):
+        if level is None:
+            names = self.by_name.keys()
+        else:
+            names = {record.name for record in self.levels.get(level, {}).values()}
+        matches = difflib.get_close_matches(query, names, n=limit, cutoff=cutoff)
+        result = []
+        for name in matches:
+            result.extend(self.lookup(name, level))
+        return result[:limit]
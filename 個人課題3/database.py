@@ -2,6 +2,13 @@ import sqlite3
 import csv
 import os
 import hashlib
+import json
+import time
+from itertools import islice
+from weather_query import ensure_indexes, iter_all
+
+#取り込み済みの部分のハッシュを計算するときに一度に読むバイト数
+SYNC_READ_BYTES = 1024 * 1024
 
 #ファイルのハッシュを計算する関数
 def calculate_file_hash(file_path):
@@ -14,6 +21,32 @@ def calculate_file_hash(file_path):
     except FileNotFoundError:
         return None
 
+#ファイルの start バイト目から end バイト目までを hasher に加える
+#（先頭から取り込み済みの位置までのハッシュを、取り込むたびに続きから更新するのに使う）
+def update_imported_hash(hasher, file_path, start, end):
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(remaining, SYNC_READ_BYTES))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher
+
+#前回最後に取り込んだ行がデータベースにあるかを確かめる（データベースだけが消された・差し替えられた場合）
+def has_imported_row(db_path, last_id):
+    if last_id is None:
+        return True
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT 1 FROM weather WHERE id = ?", (last_id,)).fetchone() is not None
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+
 #データベースとテーブルの作成
 def create_db():
     db_path = "個人課題3/weather.db"
@@ -30,77 +63,165 @@ def create_db():
         )
     """)
     conn.commit()
+    #検索用のインデックスを作成
+    ensure_indexes(conn)
     conn.close()
     print(f"データベース {db_path} を作成または既存のものを使用します。")
 
-#CSVが変更されていた場合にデータベースを再作成
-def reset_db_if_csv_changed():
+#前回の同期状態（取り込み済みのバイト位置・最後のid・取り込み済み部分全体のハッシュ）を読み込む
+def load_sync_state(state_path):
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return {"offset": int(state["offset"]), "last_id": state.get("last_id"), "imported_hash": state["imported_hash"]}
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        return None
+
+#同期状態を保存する
+def save_sync_state(state_path, state):
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+#CSVの内容をデータベースに同期（追記分だけを取り込み、書き換えがあれば作り直す）
+def sync_db_with_csv():
     db_path = "個人課題3/weather.db"
     csv_path = "個人課題3/weather.csv"
-    hash_file = "個人課題3/weather.csv.hash"
+    state_path = "個人課題3/weather.csv.sync"
 
-    #現在のCSVファイルのハッシュを計算
-    current_hash = calculate_file_hash(csv_path)
-
-    if current_hash is None:
+    if not os.path.exists(csv_path):
         print(f"CSVファイルが見つかりません: {csv_path}")
         return False
 
-    #以前のハッシュを読み取る
-    previous_hash = None
-    if os.path.exists(hash_file):
-        with open(hash_file, "r") as f:
-            previous_hash = f.read().strip()
+    size = os.path.getsize(csv_path)
+    state = load_sync_state(state_path)
 
-    #ハッシュが異なる場合、データベースを削除して再作成
-    if current_hash != previous_hash:
-        print("CSVファイルの内容が変更されました。データベースをリセットします。")
+    #取り込み済みの部分が変わっておらず、データベースに最後に取り込んだ行があれば、その続きから取り込む
+    #（取り込み済みの部分は途中の書き換えも見つけられるよう全体を読む。取り込み直すよりずっと速い）
+    hasher = hashlib.md5()
+    resume = (
+        state is not None
+        and os.path.exists(db_path)
+        and size >= state["offset"]
+        and update_imported_hash(hasher, csv_path, 0, state["offset"]).hexdigest() == state["imported_hash"]
+        and has_imported_row(db_path, state["last_id"])
+    )
+
+    if resume:
+        if size == state["offset"]:
+            print("CSVファイルの内容に変更はありません。")
+            return False
+        print(f"CSVファイルに追記された部分を取り込みます（{state['offset']}バイト目から）。")
+        start_offset = state["offset"]
+        last_id = state["last_id"]
+    else:
+        #取り込み済みの部分が書き換えられた場合や、データベースが前回の同期と合わない場合は作り直す
+        print("CSVファイルの内容が変更されたか、データベースが前回の同期と一致しません。データベースをリセットします。")
         if os.path.exists(db_path):
             os.remove(db_path)
             print(f"既存のデータベース {db_path} を削除しました。")
         create_db()
-        #現在のハッシュを保存
-        with open(hash_file, "w") as f:
-            f.write(current_hash)
-        return True
+        start_offset = 0
+        last_id = None
+        hasher = hashlib.md5()
 
-    print("CSVファイルの内容に変更はありません。")
-    return False
+    result = import_csv_to_db(start_offset=start_offset)
+    if result is None:
+        return False
+    end_offset, imported_last_id = result
+    save_sync_state(state_path, {
+        "offset": end_offset,
+        "last_id": imported_last_id if imported_last_id is not None else last_id,
+        #今回取り込んだ部分だけを読み足して、取り込み済みの部分全体のハッシュにする
+        "imported_hash": update_imported_hash(hasher, csv_path, start_offset, end_offset).hexdigest(),
+    })
+    return True
+
+#一括インポートで使うSQL(同じidの行があれば上書き)
+UPSERT_SQL = """
+    INSERT INTO weather (id, area_name, date, weather_desc)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        area_name = excluded.area_name,
+        date = excluded.date,
+        weather_desc = excluded.weather_desc
+"""
+
+#CSVの行をchunk_size行ずつに区切って返す
+def read_chunks(reader, chunk_size):
+    while True:
+        chunk = list(islice(reader, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+#CSVの行をデータベースに挿入する値に変換（変換できない行はNone）
+def to_record(row):
+    try:
+        return (int(row[0]), row[1], row[2], row[3])
+    except (IndexError, ValueError):
+        return None
+
+#ファイルのstart_offsetバイト目から、改行で終わっている行だけを読み込む
+#（読み込んだバイト数をprogress["offset"]に反映する）
+def read_complete_lines(file, start_offset, progress):
+    file.seek(start_offset)
+    for line in file:
+        if not line.endswith(b"\n"):
+            #書き込み途中の行は次回に取り込む
+            return
+        progress["offset"] += len(line)
+        yield line.decode("utf-8")
 
 #CSVからデータをSQLiteデータベースに格納
-def import_csv_to_db():
+def import_csv_to_db(chunk_size=5000, start_offset=0):
+    """start_offsetバイト目以降の行を取り込み、(取り込み済みのバイト位置, 最後のid) を返す。"""
     db_path = "個人課題3/weather.db"
     csv_path = "個人課題3/weather.csv"
 
     #CSVファイルの存在を確認
     if not os.path.exists(csv_path):
         print(f"CSVファイルが見つかりません: {csv_path}")
-        return
+        return None
 
-    #データベースに接続
+    #データベースに接続（WALモードにして書き込み時の同期を減らす）
     conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-
-    #CSVを開いてデータをインポート
-    with open(csv_path, "r", encoding="utf-8") as file:
-        reader = csv.reader(file)
-        header = next(reader)
-
-        for row in reader:
-            try:
-                #各行をデータベースに挿入
-                c.execute("""
-                    INSERT INTO weather (id, area_name, date, weather_desc)
-                    VALUES (?, ?, ?, ?)
-                """, (int(row[0]), row[1], row[2], row[3]))
-            except sqlite3.IntegrityError as e:
-                print(f"重複データのためスキップ: {row}")
-            except Exception as e:
-                print(f"エラーが発生しました: {e} 行: {row}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    imported = 0
+    skipped = 0
+    last_id = None
+    progress = {"offset": start_offset}
+    start = time.perf_counter()
+
+    #CSVを開いてchunk_size行ずつまとめてインポート（全体で1トランザクション）
+    with open(csv_path, "rb") as file:
+        reader = csv.reader(read_complete_lines(file, start_offset, progress))
+        if start_offset == 0:
+            next(reader, None)  #ヘッダーを読み飛ばす
+
+        with conn:
+            for chunk in read_chunks(reader, chunk_size):
+                records = []
+                for row in chunk:
+                    record = to_record(row)
+                    if record is None:
+                        skipped += 1
+                        print(f"不正な行のためスキップ: {row}")
+                    else:
+                        records.append(record)
+                conn.executemany(UPSERT_SQL, records)
+                imported += len(records)
+                if records:
+                    last_id = records[-1][0]
 
-    conn.commit()
     conn.close()
-    print("CSVからデータベースへの格納が完了しました。")
+    elapsed = time.perf_counter() - start
+    rate = imported / elapsed if elapsed > 0 else 0
+    print(f"CSVからデータベースへの格納が完了しました: {imported}行 ({rate:,.0f}行/秒, スキップ{skipped}行)")
+    return progress["offset"], last_id
 
 #データベースの内容を表示
 def show_db_contents():
@@ -113,24 +234,20 @@ def show_db_contents():
 
     #データベース接続
     conn = sqlite3.connect(db_path)
-    c = conn.cursor()
 
-    #データベース内の全データを取得
-    c.execute("SELECT * FROM weather")
-    rows = c.fetchall()
+    #データベース内のデータを少しずつ読み込みながら表示
+    has_rows = False
+    for row in iter_all(conn):
+        if not has_rows:
+            print("データベースの内容:")
+            has_rows = True
+        print(tuple(row))
     conn.close()
 
-    #データを表示
-    if rows:
-        print("データベースの内容:")
-        for row in rows:
-            print(row)
-    else:
+    if not has_rows:
         print("データベースにデータがありません。")
 
 #メイン関数
 if __name__ == "__main__":
-    csv_changed = reset_db_if_csv_changed()
-    if csv_changed:
-        import_csv_to_db()
+    sync_db_with_csv()
     show_db_contents()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+
+from export_writer import FETCH_SIZE, FORMATS, export_query
+from weather_query import DB_PATH, connect
+
+#weather テーブルの列 → 型
+COLUMNS = {"id": "int", "area_name": "str", "date": "str", "weather_desc": "str"}
+
+
+#条件を指定して weather テーブルを書き出す（書き出した行数を返す）
+def export_weather(conn, fmt="csv", out_path="-", columns=None, start=None, end=None, area_name=None, fetch_size=FETCH_SIZE):
+    columns = columns or list(COLUMNS)
+    unknown = [name for name in columns if name not in COLUMNS]
+    if unknown:
+        raise ValueError(f"存在しない列です: {', '.join(unknown)} (使える列: {', '.join(COLUMNS)})")
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append("date >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("date <= ?")
+        params.append(end)
+    if area_name is not None:
+        conditions.append("area_name = ?")
+        params.append(area_name)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"SELECT {', '.join(columns)} FROM weather {where} ORDER BY id"
+    return export_query(conn, sql, params, columns, COLUMNS, fmt, out_path, fetch_size)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="weather.db の内容を少しずつ読み込みながら書き出す")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="csv", help="出力形式")
+    parser.add_argument("-o", "--output", default="-", help="出力先（省略時は標準出力、.gz で終わると圧縮）")
+    parser.add_argument("--from", dest="start", help="開始日 YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="終了日 YYYY-MM-DD（この日を含む）")
+    parser.add_argument("--area", help="地域名")
+    parser.add_argument("--columns", help="書き出す列（カンマ区切り）")
+    parser.add_argument("--db", default=DB_PATH, help="DBファイル")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if not os.path.exists(args.db):
+        sys.exit(f"データベースが見つかりません: {args.db}")
+    conn = connect(args.db)
+    try:
+        columns = args.columns.split(",") if args.columns else None
+        count = export_weather(conn, args.format, args.output, columns, args.start, args.end, args.area)
+    finally:
+        conn.close()
+    if args.output != "-":
+        print(f"{count}行を {args.output} に書き出しました")
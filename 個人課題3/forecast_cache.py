@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import requests
+import requests.adapters
+
+FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
+
+# 気象庁の天気予報は毎日5時・11時・17時(日本時間)に発表される
+REPORT_HOURS = (5, 11, 17)
+
+
+# 接続を使い回すセッションを作成する関数
+def create_session(pool_size=10):
+    """keep-alive 接続を pool_size 本まで保持する requests.Session を返す。"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# 発表時刻から次の発表予定時刻(UNIX時間)を求める関数
+def next_report_time(report_datetime):
+    """reportDatetime の次の定時発表時刻を返す。解析できなければ None。"""
+    try:
+        reported = datetime.fromisoformat(report_datetime)
+    except (TypeError, ValueError):
+        return None
+    for hour in REPORT_HOURS:
+        candidate = reported.replace(hour=hour, minute=0, second=0, microsecond=0)
+        if candidate > reported:
+            return candidate.timestamp()
+    tomorrow = reported + timedelta(days=1)
+    return tomorrow.replace(hour=REPORT_HOURS[0], minute=0, second=0, microsecond=0).timestamp()
+
+
+# 天気予報のレスポンスから発表時刻を取り出す関数
+def get_report_datetime(weather_data):
+    """天気予報データの reportDatetime を返す。"""
+    try:
+        return weather_data[0]["reportDatetime"]
+    except (IndexError, KeyError, TypeError):
+        return None
+
+
+class ForecastCache:
+    """天気予報をメモリとディスクに保存するキャッシュ。
+
+    キーは府県予報区(office)のコード。TTL と次回発表時刻の早い方まで
+    ネットワークにアクセスせずに返し、期限切れ後は ETag / Last-Modified を
+    使った条件付きリクエストで再検証する。件数が上限を超えたら
+    最も古く使われたものから削除する(LRU)。
+    """
+
+    def __init__(self, cache_path=None, max_entries=64, ttl=600, min_ttl=60, timeout=10, session=None):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_ttl = min_ttl
+        self.timeout = timeout
+        self.session = session or create_session()
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # ディスクに書き出していない変更があるかどうか
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.load()
+
+    # ディスクからキャッシュを読み込む
+    def load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self.lock:
+            for area_id, entry in saved.items():
+                self.entries[area_id] = entry
+            self._evict()
+
+    # 変更があればキャッシュをディスクに書き出す(一時ファイルに書いてから置き換える)
+    def save(self):
+        if not self.cache_path:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = dict(self.entries)
+            self.dirty = False
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            with self.lock:
+                self.dirty = True
+            print(f"天気予報キャッシュの保存に失敗しました: {e}")
+
+    # 件数の上限を超えた分を古いものから削除する(lock を取得済みで呼ぶ)
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # エントリの有効期限を計算する
+    def _expires_at(self, fetched_at, weather_data):
+        expires = fetched_at + self.ttl
+        next_report = next_report_time(get_report_datetime(weather_data))
+        if next_report is not None:
+            expires = min(expires, next_report)
+        # 発表予定時刻を過ぎても更新されていない場合は短い間隔で再確認する
+        return max(expires, fetched_at + self.min_ttl)
+
+    # キャッシュから天気予報を取得する(期限切れなら再取得する)
+    def get(self, area_id):
+        """天気予報データを返す。有効なキャッシュがあればネットワークにアクセスしない。
+
+        ディスクへの書き出しは行わないので、呼び出し側で最後に save() を呼ぶ。
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(area_id)
+            if entry is not None:
+                self.entries.move_to_end(area_id)
+                if now < entry["expires_at"]:
+                    self.hits += 1
+                    return entry["data"]
+            self.misses += 1
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.session.get(FORECAST_URL.format(area_id), headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and entry is not None:
+            # 内容に変更なし: 有効期限だけ延長する
+            with self.lock:
+                self.revalidated += 1
+                entry["fetched_at"] = now
+                entry["expires_at"] = self._expires_at(now, entry["data"])
+                self.entries[area_id] = entry
+                self.dirty = True
+            return entry["data"]
+
+        response.raise_for_status()
+        weather_data = response.json()
+        if entry is not None:
+            # CDN から古い発表が返ってきた場合は手元の新しい方を使う
+            cached_report = get_report_datetime(entry["data"]) or ""
+            if (get_report_datetime(weather_data) or "") < cached_report:
+                weather_data = entry["data"]
+        self.put(area_id, weather_data, response.headers.get("ETag"), response.headers.get("Last-Modified"), now)
+        return weather_data
+
+    # 天気予報をキャッシュに追加する(ディスクへの書き出しは save() で行う)
+    def put(self, area_id, weather_data, etag=None, last_modified=None, fetched_at=None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self.lock:
+            self.entries[area_id] = {
+                "data": weather_data,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": fetched_at,
+                "expires_at": self._expires_at(fetched_at, weather_data),
+            }
+            self.entries.move_to_end(area_id)
+            self._evict()
+            self.dirty = True
+
+    # ヒット数・ミス数などの統計を返す
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.entries),
+            }
+
+    # キャッシュを空にする
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.revalidated = 0
+            self.dirty = True
+        self.save()
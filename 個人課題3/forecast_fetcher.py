@@ -0,0 +1,78 @@
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from forecast_cache import ForecastCache, create_session
+
+# 再試行する HTTP ステータス(混雑・一時的なサーバーエラー)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+# 一時的なエラーかどうかを判定する関数
+def is_retryable(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRY_STATUS
+    return False
+
+
+# 失敗したら間隔を空けて再試行しながら天気予報を取得する関数
+def fetch_with_retry(cache, area_id, retries=3, backoff=0.5):
+    """一時的なエラーのときは backoff * 2^n 秒(+ゆらぎ)待って再試行する。"""
+    for attempt in range(retries + 1):
+        try:
+            return cache.get(area_id)
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            time.sleep(backoff * (2 ** attempt) + random.uniform(0, backoff))
+
+
+# 複数地域の天気予報をまとめて取得する関数
+def fetch_forecasts(area_ids, concurrency=8, cache=None, retries=3, backoff=0.5):
+    """複数地域の天気予報を並行して取得し、届いた順に (地域ID, データ, エラー) を返す。
+
+    同時に送るリクエストは concurrency 件まで。接続は keep-alive で使い回す。
+    取得に失敗した地域はデータを None、エラーに例外を入れて返す。
+    """
+    if cache is None:
+        cache = ForecastCache(session=create_session(concurrency))
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = {
+            executor.submit(fetch_with_retry, cache, area_id, retries, backoff): area_id
+            for area_id in dict.fromkeys(area_ids)
+        }
+        for future in as_completed(futures):
+            area_id = futures[future]
+            try:
+                yield area_id, future.result(), None
+            except Exception as e:
+                yield area_id, None, e
+    finally:
+        # 途中で打ち切られた場合は未着手のリクエストを取り消す
+        executor.shutdown(wait=True, cancel_futures=True)
+        cache.save()
+
+
+# 全府県予報区の天気予報を取得して所要時間を表示する
+if __name__ == "__main__":
+    from area_loader import load_area_data
+
+    area_json_path = sys.argv[1] if len(sys.argv) > 1 else "個人課題3/area.json"
+    area_index_path = sys.argv[2] if len(sys.argv) > 2 else "個人課題3/area_index.pickle"
+    area_cache_path = sys.argv[3] if len(sys.argv) > 3 else "個人課題3/area_cache.json"
+    offices = load_area_data(area_json_path, area_index_path, area_cache_path)["offices"]
+
+    start = time.perf_counter()
+    failed = 0
+    for area_id, weather_data, error in fetch_forecasts(offices, concurrency=16):
+        if error is not None:
+            failed += 1
+            print(f"{area_id}: 取得に失敗しました: {error}")
+    elapsed = time.perf_counter() - start
+    print(f"{len(offices)}地域の天気予報を{elapsed:.2f}秒で取得しました(失敗: {failed}件)")
@@ -0,0 +1,111 @@
+# 気象庁の天気予報JSON(forecast/{office}.json)を列ごとの配列に変換する
+#
+# 天気予報JSONは [短期予報, 週間予報] の2件からなり、それぞれの timeSeries に
+# 「timeDefines(時刻の一覧)」と「areas(地域ごとの値の配列)」が入っている。
+
+# 値ではない項目(地域情報)
+AREA_KEY = "area"
+
+# 縦持ち形式の列名
+FLAT_COLUMNS = ("office", "report", "series", "area_code", "area_name", "time", "field", "value")
+
+
+# 値の配列を timeDefines の長さにそろえる関数
+def _align(values, length):
+    if len(values) == length:
+        return list(values)
+    if len(values) > length:
+        return list(values[:length])
+    return list(values) + [None] * (length - len(values))
+
+
+# 天気予報JSONを系列ごとの列データに変換する関数
+def parse_forecast(weather_data):
+    """天気予報データの全 timeSeries を系列ごとの列データに変換する。
+
+    返り値は系列のリストで、各系列は次のキーを持つ辞書。
+      report         : 0=短期予報, 1=週間予報
+      series         : report 内での timeSeries の番号
+      reportDatetime : 発表時刻
+      timeDefines    : 時刻の配列
+      areaCodes      : 地域コードの配列
+      areaNames      : 地域名の配列
+      fields         : 項目名 → 地域ごとの値の配列(timeDefines と同じ長さ)
+    """
+    parsed = []
+    for report_index, report in enumerate(weather_data or []):
+        report_datetime = report.get("reportDatetime")
+        for series_index, time_series in enumerate(report.get("timeSeries", [])):
+            time_defines = time_series.get("timeDefines", [])
+            length = len(time_defines)
+            area_codes = []
+            area_names = []
+            fields = {}
+            for area_position, area in enumerate(time_series.get("areas", [])):
+                area_info = area.get(AREA_KEY, {})
+                area_codes.append(area_info.get("code"))
+                area_names.append(area_info.get("name"))
+                for field, values in area.items():
+                    if field == AREA_KEY:
+                        continue
+                    column = fields.get(field)
+                    if column is None:
+                        # 途中の地域から現れた項目は前の地域の分を空で埋める
+                        column = fields[field] = [[None] * length for _ in range(area_position)]
+                    column.append(_align(values, length))
+            # 最後の地域に無かった項目も地域数にそろえる
+            for column in fields.values():
+                while len(column) < len(area_codes):
+                    column.append([None] * length)
+            parsed.append({
+                "report": report_index,
+                "series": series_index,
+                "reportDatetime": report_datetime,
+                "timeDefines": list(time_defines),
+                "areaCodes": area_codes,
+                "areaNames": area_names,
+                "fields": fields,
+            })
+    return parsed
+
+
+# 系列データを縦持ちの列データに変換する関数
+def flatten_forecast(weather_data, office=None):
+    """天気予報データを1値1行の縦持ち形式にし、列名 → 配列の辞書で返す。
+
+    そのまま pandas.DataFrame(...) に渡したり、zip(*columns.values()) で
+    executemany に渡したりできる。
+    """
+    columns = {name: [] for name in FLAT_COLUMNS}
+    office_column = columns["office"]
+    report_column = columns["report"]
+    series_column = columns["series"]
+    code_column = columns["area_code"]
+    name_column = columns["area_name"]
+    time_column = columns["time"]
+    field_column = columns["field"]
+    value_column = columns["value"]
+    for series in parse_forecast(weather_data):
+        time_defines = series["timeDefines"]
+        length = len(time_defines)
+        for field, per_area in series["fields"].items():
+            for area_code, area_name, values in zip(series["areaCodes"], series["areaNames"], per_area):
+                office_column.extend([office] * length)
+                report_column.extend([series["report"]] * length)
+                series_column.extend([series["series"]] * length)
+                code_column.extend([area_code] * length)
+                name_column.extend([area_name] * length)
+                time_column.extend(time_defines)
+                field_column.extend([field] * length)
+                value_column.extend(values)
+    return columns
+
+
+# 指定した項目を持つ最初の系列を探す関数
+def find_series(parsed, field, report=None):
+    for series in parsed:
+        if report is not None and series["report"] != report:
+            continue
+        if field in series["fields"]:
+            return series
+    return None
@@ -0,0 +1,153 @@
+import csv
+import io
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+#weather.csv のヘッダー
+HEADER = ["id", "地域名", "日付", "天気"]
+
+#末尾の行を探すときに一度に読み込むバイト数
+TAIL_BLOCK_SIZE = 4096
+
+
+#ファイル全体を排他ロックする（別プロセスからの同時書き込み対策）
+@contextmanager
+def locked(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        position = file.tell()
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+            file.seek(position)
+
+
+#1行分のバイト列からidを取り出す（ヘッダーなら0、壊れた行ならNone）
+def parse_serial(line):
+    try:
+        row = next(csv.reader([line.decode("utf-8")]))
+    except (StopIteration, UnicodeDecodeError, csv.Error):
+        return None
+    if row == HEADER:
+        return 0
+    try:
+        return int(row[0])
+    except (IndexError, ValueError):
+        return None
+
+
+#ファイルの末尾の行だけを読んで最後のidを返す（データ行がなければ0）
+def read_last_serial(file):
+    position = file.seek(0, os.SEEK_END)
+    tail = b""
+    while position > 0:
+        size = min(TAIL_BLOCK_SIZE, position)
+        position -= size
+        file.seek(position)
+        tail = file.read(size) + tail
+        lines = tail.splitlines()
+        #先頭の行は途中から読んでいる可能性があるので、ファイルの先頭まで読んだとき以外は使わない
+        candidates = lines if position == 0 else lines[1:]
+        for line in reversed(candidates):
+            if not line.strip():
+                continue
+            serial = parse_serial(line)
+            if serial is not None:
+                return serial
+    return 0
+
+
+#ファイルが改行で終わっているかを返す
+def ends_with_newline(file):
+    if file.seek(0, os.SEEK_END) == 0:
+        return True
+    file.seek(-1, os.SEEK_END)
+    return file.read(1) == b"\n"
+
+
+class WeatherLogWriter:
+    """weather.csv に通し番号付きで追記する。
+
+    次の通し番号はメモリに保持し、ファイルを全部読み直すことはしない。
+    他のプロセスが追記した場合（ファイルサイズが前回と違う場合）や
+    再起動後は、ファイルの末尾だけを読んで通し番号を復元する。
+    batch_size を2以上にすると、その件数がたまるまで書き込みをまとめる。
+    """
+
+    def __init__(self, csv_path, batch_size=1):
+        self.csv_path = csv_path
+        self.batch_size = batch_size
+        self.buffer = []
+        self.next_serial = None
+        self.known_size = None
+        self.lock = threading.Lock()
+
+    #1行追記する（batch_size件たまったら書き込む）
+    def append(self, row):
+        with self.lock:
+            self.buffer.append(list(row))
+            if len(self.buffer) < self.batch_size:
+                return []
+            return self._flush()
+
+    #たまっている行を書き込み、割り当てた通し番号を返す
+    def flush(self):
+        with self.lock:
+            return self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return []
+        with open(self.csv_path, "a+b") as file:
+            with locked(file):
+                size = os.fstat(file.fileno()).st_size
+                if size == 0:
+                    file.write(self._encode([HEADER]))
+                    self.next_serial = 1
+                elif self.next_serial is None or size != self.known_size:
+                    self.next_serial = read_last_serial(file) + 1
+                if not ends_with_newline(file):
+                    #書き込み途中で止まった行があれば改行で区切る
+                    file.write(b"\r\n")
+                serials = list(range(self.next_serial, self.next_serial + len(self.buffer)))
+                file.write(self._encode([[serial] + row for serial, row in zip(serials, self.buffer)]))
+                file.flush()
+                os.fsync(file.fileno())
+                self.known_size = os.fstat(file.fileno()).st_size
+        self.next_serial = serials[-1] + 1
+        self.buffer = []
+        return serials
+
+    #ヘッダーだけのファイルに戻す
+    def reset(self):
+        with self.lock:
+            self.buffer = []
+            with open(self.csv_path, "a+b") as file:
+                with locked(file):
+                    file.truncate(0)
+                    file.write(self._encode([HEADER]))
+                    file.flush()
+                    self.known_size = os.fstat(file.fileno()).st_size
+            self.next_serial = 1
+
+    @staticmethod
+    def _encode(rows):
+        text = io.StringIO()
+        csv.writer(text).writerows(rows)
+        return text.getvalue().encode("utf-8")
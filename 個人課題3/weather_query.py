@@ -0,0 +1,129 @@
+import sqlite3
+from collections import namedtuple
+
+DB_PATH = "個人課題3/weather.db"
+
+#weather テーブルの1行
+WeatherRow = namedtuple("WeatherRow", ["id", "area_name", "date", "weather_desc"])
+
+#検索用のインデックス（idはrowidなのでインデックスに含まれ、表を読まずに済む）
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_weather_area_date ON weather (area_name, date, weather_desc)",
+    "CREATE INDEX IF NOT EXISTS idx_weather_date ON weather (date, weather_desc)",
+]
+
+#一度に取り出す行数
+FETCH_SIZE = 500
+
+
+#インデックスを作成する
+def ensure_indexes(conn):
+    for sql in INDEXES:
+        conn.execute(sql)
+    conn.commit()
+
+
+#データベースに接続する（インデックスがなければ作成する）
+def connect(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    ensure_indexes(conn)
+    return conn
+
+
+#クエリの結果を少しずつ取り出して1行ずつ返す（fetchallを使わない）
+def iter_query(conn, sql, params=(), fetch_size=FETCH_SIZE, row_type=None):
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row_type._make(row) if row_type is not None else row
+    finally:
+        cursor.close()
+
+
+#日付範囲の条件を組み立てる
+def _date_range(start, end, conditions, params):
+    if start is not None:
+        conditions.append("date >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("date <= ?")
+        params.append(end)
+
+
+#地域の履歴を日付順に1ページ分取得する
+def area_history(conn, area_name, start=None, end=None, limit=100, after=None):
+    """地域の記録を (日付, id) の順に最大 limit 件返す。
+
+    返り値は (行のリスト, 次のページのカーソル)。次のページがなければカーソルは None。
+    カーソルは前のページの最後の (日付, id) で、OFFSET を使わないため
+    何ページ目でも同じ速さで取得できる。
+    """
+    conditions = ["area_name = ?"]
+    params = [area_name]
+    _date_range(start, end, conditions, params)
+    if after is not None:
+        conditions.append("(date, id) > (?, ?)")
+        params.extend(after)
+    sql = f"""
+        SELECT id, area_name, date, weather_desc FROM weather
+        WHERE {" AND ".join(conditions)}
+        ORDER BY date, id
+        LIMIT ?
+    """
+    params.append(limit)
+    rows = [WeatherRow._make(row) for row in conn.execute(sql, params)]
+    cursor = (rows[-1].date, rows[-1].id) if len(rows) == limit else None
+    return rows, cursor
+
+
+#地域の履歴を全件、少しずつ読み込みながら返す
+def iter_area_history(conn, area_name, start=None, end=None, page_size=FETCH_SIZE):
+    cursor = None
+    while True:
+        rows, cursor = area_history(conn, area_name, start, end, page_size, cursor)
+        yield from rows
+        if cursor is None:
+            return
+
+
+#地域ごとの最新の記録を取得する
+def latest_per_area(conn):
+    #SQLiteでは MAX() と一緒に選んだ列は最大値を持つ行の値になる
+    sql = """
+        SELECT id, area_name, MAX(date), weather_desc FROM weather
+        GROUP BY area_name
+        ORDER BY area_name
+    """
+    return [WeatherRow._make(row) for row in conn.execute(sql)]
+
+
+#期間内の天気ごとの件数を取得する
+def count_by_weather(conn, start=None, end=None):
+    conditions = []
+    params = []
+    _date_range(start, end, conditions, params)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"SELECT weather_desc, COUNT(*) FROM weather {where} GROUP BY weather_desc ORDER BY weather_desc"
+    return dict(conn.execute(sql, params).fetchall())
+
+
+#期間内の日付ごとの件数を取得する（weather_descを指定するとその天気だけ数える）
+def count_by_date(conn, start=None, end=None, weather_desc=None):
+    conditions = []
+    params = []
+    _date_range(start, end, conditions, params)
+    if weather_desc is not None:
+        conditions.append("weather_desc = ?")
+        params.append(weather_desc)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"SELECT date, COUNT(*) FROM weather {where} GROUP BY date ORDER BY date"
+    return dict(conn.execute(sql, params).fetchall())
+
+
+#すべての記録をid順に返す
+def iter_all(conn, fetch_size=FETCH_SIZE):
+    return iter_query(conn, "SELECT id, area_name, date, weather_desc FROM weather ORDER BY id", (), fetch_size, WeatherRow)
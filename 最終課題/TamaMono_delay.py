@@ -1,19 +1,21 @@
 import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from sources import LINE_DELAYED, fetch_all, load_sources
 
-#京王線の運行状況のURL
-TamaMono_URL = 'https://transit.yahoo.co.jp/diainfo/156/0'
+#sources.json に登録された路線の運行状況を取得する
+lines = [source for source in load_sources() if source.kind == "line"]
 
-#Requestsを利用してWebページを取得する
-TamaMono_Requests = requests.get(TamaMono_URL)
+#Requestsを利用して各路線のWebページを並行して取得・解析する
+with ThreadPoolExecutor(max_workers=8) as executor:
+    observations = fetch_all(lines, requests.Session(), executor)
 
-# BeautifulSoupを利用してWebページを解析する
-TamaMono_Soup = BeautifulSoup(TamaMono_Requests.text, 'html.parser')
-
-#.findでtroubleクラスのddタグを探す
-if TamaMono_Soup.find('dd',class_='trouble'):
-    message = '多摩都市モノレールは遅延しています'
-else:
-    message = '多摩都市モノレールは通常運転です'
-
-print(message)
\ No newline at end of file
+#遅延しているか（troubleクラスのddタグがあるか）で表示を変える
+for observation in observations:
+    name = observation.source.name
+    if observation.error is not None:
+        message = f'{name}の運行状況を取得できませんでした: {observation.error}'
+    elif observation.value == LINE_DELAYED:
+        message = f'{name}は遅延しています'
+    else:
+        message = f'{name}は通常運転です'
+    print(message)
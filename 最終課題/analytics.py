@@ -0,0 +1,439 @@
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from schema import KIND_CODES, SCHEMA_VERSION, STATUS_DELAYED, ensure_schema
+
+# SQLite DBファイル名
+DB_NAME = "最終課題/transport_weather.db"
+
+# UNIX時間 → 日本時間にずらす秒数
+JST_OFFSET = 9 * 3600
+
+# 天気の分類（最後は地点の取得に失敗したときなど）
+WEATHER_CATEGORIES = ["晴", "曇", "雨", "雪", "不明"]
+UNKNOWN_WEATHER = len(WEATHER_CATEGORIES) - 1
+
+# 降水とみなす分類
+PRECIPITATION = [WEATHER_CATEGORIES.index("雨"), WEATHER_CATEGORIES.index("雪")]
+
+WEEKDAYS = ["月", "火", "水", "木", "金", "土", "日"]
+
+# 相関を調べる最大の時間差(時間)
+MAX_LAG = 6
+
+# 条件の名前 → 分類の数とラベル
+CONDITIONS = {
+    "weather": WEATHER_CATEGORIES,
+    "hour": [f"{hour}時" for hour in range(24)],
+    "weekday": WEEKDAYS,
+}
+
+# 取得元ごとの時刻と値（路線は状態、地点は天気ID）を、カンマ区切りの1つの文字列にまとめて取り出す
+# （1行ずつ Python のタプルにするより、まとめた文字列を NumPy で読む方がずっと速い）
+# CROSS JOIN で取得元ごとに主キー(source_id, ts)の範囲を読み、並べ替えずにまとめる
+SERIES_SQL = """
+    SELECT s.id, group_concat(o.ts), group_concat(COALESCE(o.status, o.weather_id, 0))
+    FROM sources s CROSS JOIN observations o ON o.source_id = s.id AND o.ts >= :start AND o.ts < :end
+    WHERE s.kind = :kind AND (:source_id IS NULL OR s.id = :source_id)
+    GROUP BY s.id
+"""
+
+# [start, end) に重なる状態の変化（続いている状態は end まで続いたものとする。取得に失敗した期間は除く）
+TRANSITIONS_SQL = """
+    SELECT t.source_id, t.started_at, min(COALESCE(t.ended_at, :end), :end), COALESCE(t.status, t.weather_id, 0)
+    FROM state_transitions t JOIN sources s ON s.id = t.source_id
+    WHERE s.kind = :kind AND t.is_error = 0 AND t.started_at < :end AND COALESCE(t.ended_at, :end) > :start
+      AND (:source_id IS NULL OR t.source_id = :source_id)
+"""
+
+# 路線の最も古い取得結果・状態の変化の時刻
+FIRST_TS_SQL = """
+    SELECT min(ts) FROM (
+        SELECT min(o.ts) AS ts FROM observations o JOIN sources s ON s.id = o.source_id WHERE s.kind = :kind
+        UNION ALL
+        SELECT min(t.started_at) FROM state_transitions t JOIN sources s ON s.id = t.source_id
+        WHERE s.kind = :kind AND t.is_error = 0
+    )
+"""
+
+# 時刻 end より前の取得結果と状態の変化の件数・時刻の合計（前回読んだ範囲に行が追加・削除されたかを調べる）
+# （続いている状態は end で打ち切るので、end より後に終わっても変わらない）
+SEEN_SQL = """
+    SELECT * FROM
+        (SELECT count(*), COALESCE(sum(ts), 0) FROM observations WHERE ts < :end),
+        (SELECT count(*), COALESCE(sum(started_at + min(COALESCE(ended_at, :end), :end) + is_error), 0)
+         FROM state_transitions WHERE started_at < :end)
+"""
+
+
+# 天気の表現(「曇のち雨」など)を分類の番号にする
+def classify_weather(name):
+    if not name:
+        return UNKNOWN_WEATHER
+    # 雪・雨が含まれていれば、晴や曇より優先する
+    for category in ("雪", "雨"):
+        if category in name:
+            return WEATHER_CATEGORIES.index(category)
+    if name[0] in WEATHER_CATEGORIES:
+        return WEATHER_CATEGORIES.index(name[0])
+    return UNKNOWN_WEATHER
+
+
+# 天気ID → 分類の番号 の対応表（天気ID 0 は天気が取れなかった行）
+def load_weather_codes(conn):
+    rows = conn.execute("SELECT id, name FROM weather_categories").fetchall()
+    codes = np.full(max((weather_id for weather_id, _ in rows), default=0) + 1, UNKNOWN_WEATHER, dtype=np.int8)
+    for weather_id, name in rows:
+        codes[weather_id] = classify_weather(name)
+    return codes
+
+
+# 天気を使う地点のID（省略時は最初に登録された地点）
+def find_location(conn, location=None):
+    row = conn.execute(
+        "SELECT id FROM sources WHERE kind = ? AND (? IS NULL OR key = ?) ORDER BY id LIMIT 1",
+        (KIND_CODES["location"], location, location),
+    ).fetchone()
+    return row[0] if row else None
+
+
+# 種類 kind の取得元の、時刻 [start, end) の行を (取得元ID, 時刻, 値) の配列で読み込む
+def load_series(conn, kind, start, end, source_id=None):
+    lines, times, values = [], [], []
+    params = {"kind": kind, "start": start, "end": end, "source_id": source_id}
+    for series_id, ts_text, value_text in conn.execute(SERIES_SQL, params):
+        ts = np.fromstring(ts_text, dtype=np.int64, sep=",")
+        lines.append(np.full(len(ts), series_id, dtype=np.int64))
+        times.append(ts)
+        values.append(np.fromstring(value_text, dtype=np.int64, sep=","))
+    if not times:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    line, ts, value = np.concatenate(lines), np.concatenate(times), np.concatenate(values)
+    # group_concat の順番は決まっていないので、取得元・時刻の順に並べ直す
+    order = np.lexsort((ts, line))
+    return line[order], ts[order], value[order]
+
+
+# 種類 kind の取得元の、時間 [start_hour, end_hour) の各正時の状態を (取得元ID, 時間, 値) の配列で読み込む
+# （時間は UNIX時間 // 3600。状態が変わったときだけ記録する変化の監視の分）
+def load_transition_hours(conn, kind, start_hour, end_hour, source_id=None):
+    params = {"kind": kind, "start": start_hour * 3600, "end": end_hour * 3600, "source_id": source_id}
+    rows = np.array(conn.execute(TRANSITIONS_SQL, params).fetchall(), dtype=np.int64).reshape(-1, 4)
+    series_id, started_at, ended_at, value = rows.T
+    # started_at <= 正時 < ended_at となる時間
+    first = np.maximum(-(-started_at // 3600), start_hour)
+    counts = np.maximum(-(-ended_at // 3600) - first, 0)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(series_id, counts), np.repeat(first, counts) + offsets, np.repeat(value, counts)
+
+
+# 種類 kind の取得元の値を、時間 [start_hour, end_hour) の1時間に1つずつにそろえて
+# (取得元ID, 時間, 値) の配列で返す（取得元・時間の順）
+def load_hourly(conn, kind, start_hour, end_hour, source_id=None):
+    """その時間の最初の取得結果を使い、なければ正時の状態(state_transitions)を使う。
+
+    変化の監視は遅延中ほど短い間隔で取得するので、取得のたびの値をそのまま数えると
+    遅延している時間を多く数えてしまう。1時間に1つにそろえて、取得の間隔によらない集計にする。
+    """
+    line, ts, value = load_series(conn, kind, start_hour * 3600, end_hour * 3600, source_id)
+    transition_line, transition_hour, transition_value = load_transition_hours(conn, kind, start_hour, end_hour, source_id)
+    line = np.concatenate([line, transition_line])
+    hour = np.concatenate([ts // 3600, transition_hour])
+    ts = np.concatenate([ts, transition_hour * 3600])
+    value = np.concatenate([value, transition_value])
+    # 取得結果(0)を状態の変化(1)より先に、同じ時間の中では早い順に並べ、各時間の先頭だけを残す
+    source = np.concatenate([np.zeros(len(ts) - len(transition_hour), dtype=np.int8), np.ones(len(transition_hour), dtype=np.int8)])
+    order = np.lexsort((ts, source, hour, line))
+    line, hour, value = line[order], hour[order], value[order]
+    first = group_starts(line)
+    first[1:] |= hour[1:] != hour[:-1]
+    return line[first], hour[first], value[first]
+
+
+# 路線の1時間ごとの状態に、同じ時間の地点の天気IDを付けて列ごとの配列で返す（ts はその時間の正時）
+def load_history(conn, location_id, start_hour, end_hour):
+    line, hour, status = load_hourly(conn, KIND_CODES["line"], start_hour, end_hour)
+    weather_id = np.zeros(len(hour), dtype=np.int64)
+    if location_id is not None and len(hour):
+        _, location_hour, location_weather = load_hourly(conn, KIND_CODES["location"], start_hour, end_hour, location_id)
+        if len(location_hour):
+            position = np.minimum(np.searchsorted(location_hour, hour), len(location_hour) - 1)
+            matched = location_hour[position] == hour
+            weather_id[matched] = location_weather[position[matched]]
+    return {"line": line, "ts": hour * 3600, "delayed": status == STATUS_DELAYED, "weather_id": weather_id}
+
+
+# 各行が同じ路線の先頭か（配列は路線・時刻の順に並んでいること）
+def group_starts(line):
+    starts = np.ones(len(line), dtype=bool)
+    starts[1:] = line[1:] != line[:-1]
+    return starts
+
+
+class DelayAnalytics:
+    """遅延と天気・時間帯・曜日の関係を集計する。
+
+    取得結果(observations)と状態の変化(state_transitions)を、路線ごとに1時間に1つの値にそろえてから集計する
+    （観測数は路線ごとの時間の数で、取得の間隔によらない）。時間差も、この1時間ごとの値で数える。
+    集計は観測数・遅延数などの合計だけを持ち、update() で終わった時間の分を足していく。
+    遅延の連続(エピソード)は路線ごとに続いているものを持ち越すので、
+    何回に分けて update() しても一度にすべて読み込んだときと同じ結果になる。
+    前回読んだ時間の行が後から追加・削除されたとき（欠測の補完や古い月の移動）は、
+    途中からは足せないので最初から集計し直す。
+    DBは読むだけなので、以前の形式のDBは先に ensure_schema() で移行しておくこと。
+    """
+
+    def __init__(self, db_path=DB_NAME, location=None, max_lag=MAX_LAG):
+        self.db_path = db_path
+        self.location = location
+        self.max_lag = max_lag
+        self.line_names = {}
+        self.reset()
+
+    # 集計を空に戻す
+    def reset(self):
+        max_lag = self.max_lag
+        # 次に読む時間（UNIX時間 // 3600。None はまだ読んでいない）
+        self.next_hour = None
+        # next_hour より前の行の件数と時刻の合計（SEEN_SQL）
+        self.seen = None
+        self.row_count = 0
+        # 条件ごとの [路線ID, 分類] の観測数と遅延数
+        self.totals = {name: np.zeros((0, len(labels)), dtype=np.int64) for name, labels in CONDITIONS.items()}
+        self.delays = {name: np.zeros((0, len(labels)), dtype=np.int64) for name, labels in CONDITIONS.items()}
+        # 終わった遅延エピソード (路線ID, 観測数, 秒数)
+        self.episodes = []
+        # 路線ID → 続いている遅延エピソード (開始時刻, 観測数)
+        self.open_episodes = {}
+        # 時間差ごとの相関の材料 [件数, 降水, 遅延, 降水かつ遅延]
+        self.lag_sums = np.zeros((max_lag + 1, 4), dtype=np.int64)
+        # 次回の時間差の計算に使う、路線ごとの直近 max_lag 行
+        self.tail = None
+
+    # 前回から now（省略時は現在）までに終わった時間を読み込んで集計に加える（追加された行数を返す）
+    def update(self, conn=None, now=None):
+        # 続いている状態は now まで続いたものとし、終わった時間だけを読む
+        end_hour = int(time.time() if now is None else now) // 3600
+        own_conn = conn is None
+        if own_conn:
+            conn = sqlite3.connect(self.db_path)
+        # 読み込みの途中で書き込まれても、同じ時点のDBを読むようにする
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute("BEGIN")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                raise RuntimeError("DBが以前の形式です（先に ensure_schema() で移行してください）")
+            if self.next_hour is not None and self.seen_rows(conn, self.next_hour) != self.seen:
+                self.reset()
+            start_hour = self.next_hour
+            if start_hour is None:
+                first_ts = conn.execute(FIRST_TS_SQL, {"kind": KIND_CODES["line"]}).fetchone()[0]
+                start_hour = end_hour if first_ts is None else min(first_ts // 3600, end_hour)
+            end_hour = max(end_hour, start_hour)
+            location_id = find_location(conn, self.location)
+            weather_codes = load_weather_codes(conn)
+            self.line_names.update(conn.execute(
+                "SELECT id, name FROM sources WHERE kind = ?", (KIND_CODES["line"],)
+            ).fetchall())
+            history = load_history(conn, location_id, start_hour, end_hour)
+            seen = self.seen_rows(conn, end_hour)
+        finally:
+            if own_transaction:
+                conn.rollback()
+            if own_conn:
+                conn.close()
+        # 行がなくても、読んだ時間は終わったものとして次回はその次から読む
+        if self.next_hour is not None or len(history["ts"]):
+            self.next_hour = end_hour
+            self.seen = seen
+        if len(history["ts"]) == 0:
+            return 0
+        history["weather"] = weather_codes[history["weather_id"]]
+        history["hour_index"] = (history["ts"] + JST_OFFSET) // 3600
+        self._add_conditions(history)
+        self._add_episodes(history)
+        self._add_lags(history)
+        self.row_count += len(history["ts"])
+        return len(history["ts"])
+
+    # 時間 hour より前の行の件数と時刻の合計
+    @staticmethod
+    def seen_rows(conn, hour):
+        return tuple(conn.execute(SEEN_SQL, {"end": hour * 3600}).fetchone())
+
+    # 路線IDが入るように集計の配列を広げる
+    def _grow(self, max_line):
+        for table in (self.totals, self.delays):
+            for name, counts in table.items():
+                if counts.shape[0] <= max_line:
+                    table[name] = np.vstack([counts, np.zeros((max_line + 1 - counts.shape[0], counts.shape[1]), dtype=np.int64)])
+
+    def _add_conditions(self, history):
+        line = history["line"]
+        self._grow(int(line.max()))
+        buckets = {
+            "weather": history["weather"],
+            "hour": history["hour_index"] % 24,
+            # 1970-01-01 は木曜日
+            "weekday": (history["hour_index"] // 24 + 3) % 7,
+        }
+        for name, bucket in buckets.items():
+            size = self.totals[name].size
+            width = self.totals[name].shape[1]
+            index = line * width + bucket
+            self.totals[name] += np.bincount(index, minlength=size).reshape(-1, width)
+            self.delays[name] += np.bincount(index[history["delayed"]], minlength=size).reshape(-1, width)
+
+    def _add_episodes(self, history):
+        line = history["line"]
+        ts = history["ts"]
+        delayed = history["delayed"]
+        weight = np.ones(len(ts), dtype=np.int64)
+        # 前回から続いている遅延を、その開始時刻の1行(重み=観測数)として先頭に足す
+        if self.open_episodes:
+            carried = np.array([(line_id, start, count) for line_id, (start, count) in self.open_episodes.items()], dtype=np.int64)
+            line = np.concatenate([carried[:, 0], line])
+            ts = np.concatenate([carried[:, 1], ts])
+            delayed = np.concatenate([np.ones(len(carried), dtype=bool), delayed])
+            weight = np.concatenate([carried[:, 2], weight])
+            order = np.lexsort((ts, line))
+            line, ts, delayed, weight = line[order], ts[order], delayed[order], weight[order]
+            self.open_episodes = {}
+
+        first = group_starts(line)
+        previous_delayed = np.concatenate([[False], delayed[:-1]])
+        starts = delayed & (first | ~previous_delayed)
+        if not starts.any():
+            return
+        # 遅延している行にエピソードの番号を振り、観測数を合計する
+        episode = np.cumsum(starts) - 1
+        counts = np.bincount(episode[delayed], weights=weight[delayed]).astype(np.int64)
+        start_index = np.flatnonzero(starts)
+        # エピソードの最後の行の次が同じ路線なら、そこで遅延が終わっている
+        continues = np.concatenate([delayed[1:] & ~first[1:], [False]])
+        end_index = np.flatnonzero(delayed & ~continues) + 1
+        closed = end_index < len(ts)
+        closed[closed] = ~first[end_index[closed]]
+
+        finished = np.flatnonzero(closed)
+        if len(finished):
+            durations = ts[end_index[finished]] - ts[start_index[finished]]
+            self.episodes.append(np.column_stack([line[start_index[finished]], counts[finished], durations]))
+        for number in np.flatnonzero(~closed):
+            self.open_episodes[int(line[start_index[number]])] = (int(ts[start_index[number]]), int(counts[number]))
+
+    def _add_lags(self, history):
+        columns = {
+            "line": history["line"],
+            "hour_index": history["hour_index"],
+            "delayed": history["delayed"],
+            "precipitation": np.isin(history["weather"], PRECIPITATION),
+            "new": np.ones(len(history["line"]), dtype=bool),
+        }
+        # 前回の末尾の行は、時間差の相手としてだけ使う
+        if self.tail is not None:
+            columns = {name: np.concatenate([self.tail[name], values]) for name, values in columns.items()}
+            order = np.lexsort((columns["hour_index"], columns["line"]))
+            columns = {name: values[order] for name, values in columns.items()}
+        line = columns["line"]
+        hour_index = columns["hour_index"]
+        delayed = columns["delayed"]
+        precipitation = columns["precipitation"]
+        # 行数より大きい時間差の組はない
+        for lag in range(min(self.max_lag + 1, len(line))):
+            # lag 行前が同じ路線のちょうど lag 時間前の行である組だけを使う（取得に失敗した時間などは飛ばす）
+            later = slice(lag, None)
+            earlier = slice(None, len(line) - lag)
+            pair = (line[later] == line[earlier]) & (hour_index[later] - hour_index[earlier] == lag) & columns["new"][later]
+            x = precipitation[earlier][pair]
+            y = delayed[later][pair]
+            self.lag_sums[lag] += [len(x), x.sum(), y.sum(), (x & y).sum()]
+        # 路線ごとに最後の max_lag 行を残す
+        group_end = np.searchsorted(line, line, side="right")
+        keep = group_end - np.arange(len(line)) <= self.max_lag
+        self.tail = {name: values[keep] for name, values in columns.items()}
+        self.tail["new"] = np.zeros(keep.sum(), dtype=bool)
+
+    # 条件ごとの遅延確率（per_line=True で路線別）
+    def probability_by(self, condition, per_line=False):
+        totals = self.totals[condition]
+        delays = self.delays[condition]
+        labels = CONDITIONS[condition]
+        if per_line:
+            lines = np.flatnonzero(totals.sum(axis=1))
+            index = pd.MultiIndex.from_product(
+                [[self.line_names.get(int(line_id), str(line_id)) for line_id in lines], labels], names=["line", condition]
+            )
+            totals = totals[lines].ravel()
+            delays = delays[lines].ravel()
+        else:
+            index = pd.Index(labels, name=condition)
+            totals = totals.sum(axis=0)
+            delays = delays.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            probability = np.where(totals > 0, delays / totals, np.nan)
+        return pd.DataFrame({"observations": totals, "delays": delays, "probability": probability}, index=index)
+
+    # 路線ごとの遅延エピソードの長さ
+    def run_length_stats(self):
+        episodes = np.concatenate(self.episodes) if self.episodes else np.zeros((0, 3), dtype=np.int64)
+        frame = pd.DataFrame(episodes, columns=["line", "observations", "seconds"])
+        stats = frame.groupby("line").agg(
+            episodes=("observations", "size"),
+            mean_observations=("observations", "mean"),
+            max_observations=("observations", "max"),
+            mean_hours=("seconds", "mean"),
+            max_hours=("seconds", "max"),
+        )
+        stats[["mean_hours", "max_hours"]] /= 3600
+        stats["ongoing"] = [line_id in self.open_episodes for line_id in stats.index]
+        for line_id in self.open_episodes:
+            if line_id not in stats.index:
+                stats.loc[line_id] = [0, np.nan, np.nan, np.nan, np.nan, True]
+        stats.index = [self.line_names.get(int(line_id), str(line_id)) for line_id in stats.index]
+        stats.index.name = "line"
+        return stats
+
+    # 降水(lag 時間前)と遅延の相関係数（どちらかが一定なら NaN）
+    def lag_correlations(self):
+        n, x, y, xy = (self.lag_sums[:, column].astype(float) for column in range(4))
+        # 0/1 の値なので x^2 の合計は x の合計と同じ
+        with np.errstate(invalid="ignore", divide="ignore"):
+            correlation = (n * xy - x * y) / np.sqrt((n * x - x * x) * (n * y - y * y))
+        return pd.DataFrame(
+            {"pairs": self.lag_sums[:, 0], "correlation": correlation},
+            index=pd.Index(range(self.max_lag + 1), name="lag_hours"),
+        )
+
+    # 集計結果をまとめて表示する
+    def report(self):
+        print(f"対象: {self.row_count}件の観測（路線ごとに1時間に1件）")
+        for condition in CONDITIONS:
+            print(f"\n遅延確率 ({condition}別):")
+            print(self.probability_by(condition).to_string())
+        print("\n遅延エピソード:")
+        stats = self.run_length_stats()
+        print(stats.to_string() if not stats.empty else "遅延はありません")
+        print("\n降水と遅延の相関:")
+        print(self.lag_correlations().to_string())
+
+
+# 単体で実行したときは DB 全体を集計して表示する
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_NAME
+    start = time.perf_counter()
+    with closing(sqlite3.connect(db_path)) as conn:
+        # 以前の形式のDBなら先に移行する
+        ensure_schema(conn)
+        analytics = DelayAnalytics(db_path)
+        analytics.update(conn)
+    elapsed = time.perf_counter() - start
+    analytics.report()
+    print(f"\n集計時間: {elapsed * 1000:.1f}ms")
@@ -0,0 +1,302 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import pytz
+
+from export import KIND_EXPRESSION, case_expression, time_expression
+from export_writer import export_query
+from schema import ROLLUP_DAY, ROLLUP_HOUR, STATUS_DELAYED, STATUS_VALUES, ensure_schema
+
+# SQLite DBファイル名
+DB_NAME = "最終課題/transport_weather.db"
+
+# 月ごとのDBファイルを置く場所
+ARCHIVE_DIR = "最終課題/archive"
+
+# 取得結果をそのまま手元のDBに残す日数（これより前の月は月ごとのファイルに移す）
+RAW_RETENTION_DAYS = 90
+
+# 古い月を移す処理を行う間隔(秒)
+MAINTENANCE_INTERVAL = 24 * 3600
+
+JST = pytz.timezone('Asia/Tokyo')
+
+# 月ごとのファイルに作るテーブル（sources・weather_categories は手元のDBのものを使う）
+PARTITION_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS part.observations (
+        source_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        status INTEGER,
+        weather_id INTEGER,
+        PRIMARY KEY (source_id, ts)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS part.idx_observations_ts ON observations (ts)",
+    """
+    CREATE TABLE IF NOT EXISTS part.fetch_errors (
+        source_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        message TEXT,
+        UNIQUE (source_id, ts, message)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS part.idx_fetch_errors_ts ON fetch_errors (ts)",
+    """
+    CREATE TABLE IF NOT EXISTS part.state_transitions (
+        source_id INTEGER NOT NULL,
+        started_at INTEGER NOT NULL,
+        ended_at INTEGER,
+        status INTEGER,
+        weather_id INTEGER,
+        is_error INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (source_id, started_at)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS part.collection_runs (
+        source_id INTEGER NOT NULL,
+        slot_ts INTEGER NOT NULL,
+        outcome INTEGER NOT NULL,
+        ts INTEGER,
+        PRIMARY KEY (source_id, slot_ts)
+    ) WITHOUT ROWID
+    """,
+]
+
+# 月ごとのファイルに移す行（テーブル名 → 条件）
+# 状態の変化は終わったものだけ、枠の記録は取得元ごとの最後の枠を残す（再開時に取り逃した枠を探すのに使う）
+PARTITION_ROWS = {
+    "observations": "ts >= :start AND ts < :end",
+    "fetch_errors": "ts >= :start AND ts < :end",
+    "state_transitions": "started_at >= :start AND started_at < :end AND ended_at IS NOT NULL",
+    "collection_runs": """slot_ts >= :start AND slot_ts < :end
+        AND slot_ts < (SELECT max(r.slot_ts) FROM main.collection_runs r WHERE r.source_id = collection_runs.source_id)""",
+}
+
+# 期間の開始時刻を求める式（時は UTC と日本時間で同じ、日は日本時間の0時）
+BUCKET_EXPRESSIONS = {
+    ROLLUP_HOUR: "(ts / 3600) * 3600",
+    ROLLUP_DAY: "((ts + 32400) / 86400) * 86400 - 32400",
+}
+
+# [start, end) の取得結果を期間ごとにまとめる（天気は期間内で最も多かったもの）
+# 月ごとのファイルに移した後の、その月のすべての行から作り直すので、後から届いた行があっても欠けない
+ROLLUP_SQL = """
+    INSERT OR REPLACE INTO main.observation_rollups (source_id, period, start_ts, samples, delayed, errors, weather_id)
+    WITH buckets AS (
+        SELECT source_id, {bucket} AS start_ts, status, weather_id, 0 AS is_error
+        FROM part.observations WHERE ts >= :start AND ts < :end
+        UNION ALL
+        SELECT source_id, {bucket}, NULL, NULL, 1
+        FROM part.fetch_errors WHERE ts >= :start AND ts < :end
+    ),
+    weathers AS (
+        SELECT source_id, start_ts, weather_id, count(*) AS n
+        FROM buckets WHERE weather_id IS NOT NULL GROUP BY source_id, start_ts, weather_id
+    ),
+    top_weather AS (
+        -- max() と一緒に選んだ列は、最大となった行の値になる
+        SELECT source_id, start_ts, weather_id, max(n) FROM weathers GROUP BY source_id, start_ts
+    )
+    SELECT b.source_id, :period, b.start_ts, sum(NOT b.is_error), sum(b.status = {delayed}), sum(b.is_error), t.weather_id
+    FROM buckets b LEFT JOIN top_weather t USING (source_id, start_ts)
+    GROUP BY b.source_id, b.start_ts
+"""
+
+
+# 日本時間の月初め（datetime）
+def month_start(moment):
+    moment = moment.astimezone(JST)
+    return JST.localize(datetime(moment.year, moment.month, 1))
+
+
+# 次の月の月初め
+def next_month(start):
+    return JST.localize(datetime(start.year + start.month // 12, start.month % 12 + 1, 1))
+
+
+# 月の名前（ファイル名に使う）
+def month_label(start):
+    return f"{start:%Y-%m}"
+
+
+# 月ごとのDBファイルのパス
+def partition_path(start, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, f"observations_{month_label(start)}.db")
+
+
+# 月ごとのファイルがある月の月初めを古い順に返す
+def archived_months(archive_dir=ARCHIVE_DIR):
+    if not os.path.isdir(archive_dir):
+        return []
+    months = []
+    for name in sorted(os.listdir(archive_dir)):
+        match = re.fullmatch(r"observations_(\d{4})-(\d{2})\.db", name)
+        if match:
+            months.append(JST.localize(datetime(int(match[1]), int(match[2]), 1)))
+    return months
+
+
+# ts の範囲 [start_ts, end_ts) に重なる月の月初めを順に返す
+def months_between(start_ts, end_ts):
+    start = month_start(datetime.fromtimestamp(start_ts, JST))
+    while start.timestamp() < end_ts:
+        yield start
+        start = next_month(start)
+
+
+# 1か月分の取得結果・状態の変化・枠の記録を月ごとのファイルに移して手元のDBから消し、取得結果をまとめ直す
+# （移した取得結果の件数を返す）
+def archive_month(conn, start, archive_dir=ARCHIVE_DIR):
+    os.makedirs(archive_dir, exist_ok=True)
+    params = {"start": int(start.timestamp()), "end": int(next_month(start).timestamp())}
+    conn.isolation_level = None
+    conn.execute("ATTACH DATABASE ? AS part", (partition_path(start, archive_dir),))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql in PARTITION_TABLES:
+                conn.execute(sql)
+            moved = {}
+            for table, condition in PARTITION_ROWS.items():
+                columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA part.table_info({table})"))
+                moved[table] = conn.execute(
+                    f"INSERT OR IGNORE INTO part.{table} SELECT {columns} FROM main.{table} WHERE {condition}", params
+                ).rowcount
+                conn.execute(f"DELETE FROM main.{table} WHERE {condition}", params)
+            for period, bucket in BUCKET_EXPRESSIONS.items():
+                conn.execute(ROLLUP_SQL.format(bucket=bucket, delayed=STATUS_DELAYED), dict(params, period=period))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute("DETACH DATABASE part")
+        conn.isolation_level = ""
+    return moved["observations"]
+
+
+# その月の、月ごとのファイルに移す行が手元のDBにあるか
+def has_rows(conn, start):
+    params = {"start": int(start.timestamp()), "end": int(next_month(start).timestamp())}
+    return any(
+        conn.execute(f"SELECT EXISTS (SELECT 1 FROM main.{table} WHERE {condition})", params).fetchone()[0]
+        for table, condition in PARTITION_ROWS.items()
+    )
+
+
+# RAW_RETENTION_DAYS より前の月をすべて移す（移した月の名前のリストを返す）
+def archive_old_months(db_path=DB_NAME, archive_dir=ARCHIVE_DIR, retention_days=RAW_RETENTION_DAYS, now=None):
+    now = now or datetime.now(JST)
+    cutoff = month_start(now - timedelta(days=retention_days))
+    archived = []
+    with closing(sqlite3.connect(db_path, timeout=30)) as conn:
+        ensure_schema(conn)
+        oldest = conn.execute("""
+            SELECT min(ts) FROM (
+                SELECT min(ts) AS ts FROM observations UNION ALL SELECT min(ts) FROM fetch_errors
+                UNION ALL SELECT min(started_at) FROM state_transitions UNION ALL SELECT min(slot_ts) FROM collection_runs
+            )
+        """).fetchone()[0]
+        if oldest is None:
+            return archived
+        for start in months_between(oldest, cutoff.timestamp()):
+            # データのない月はファイルを作らない
+            if not has_rows(conn, start):
+                continue
+            moved = archive_month(conn, start, archive_dir)
+            archived.append(month_label(start))
+            print(f"{month_label(start)} の取得結果 {moved}件を {partition_path(start, archive_dir)} に移しました")
+    return archived
+
+
+# 一定の間隔で古い月を移すスレッドを開始する（stop がセットされると終了する）
+def start_maintenance(db_path=DB_NAME, archive_dir=ARCHIVE_DIR, interval=MAINTENANCE_INTERVAL, stop=None):
+    stop = stop or threading.Event()
+
+    def run():
+        while not stop.is_set():
+            # DBのエラーだけでなく、ファイルを作れないとき(容量不足など)も記録して次回に再試行する
+            try:
+                archive_old_months(db_path, archive_dir)
+            except (sqlite3.Error, OSError) as e:
+                print(f"古いデータの移動に失敗しました: {e}")
+            stop.wait(interval)
+
+    thread = threading.Thread(target=run, name="archive-maintenance", daemon=True)
+    thread.start()
+    return thread
+
+
+# [start_ts, end_ts) の取得結果を (取得元ID, 時刻, 状態, 天気ID) で返す
+# （範囲に重なる月のファイルと手元のDBだけを読む）
+def iter_range(start_ts, end_ts, db_path=DB_NAME, archive_dir=ARCHIVE_DIR):
+    sql = """
+        SELECT source_id, ts, status, weather_id FROM {table}
+        WHERE ts >= ? AND ts < ? ORDER BY ts, source_id
+    """
+    with closing(sqlite3.connect(db_path)) as conn:
+        for start in months_between(start_ts, end_ts):
+            path = partition_path(start, archive_dir)
+            if not os.path.exists(path):
+                continue
+            conn.execute("ATTACH DATABASE ? AS part", (path,))
+            try:
+                yield from conn.execute(sql.format(table="part.observations"), (start_ts, end_ts))
+            finally:
+                conn.execute("DETACH DATABASE part")
+        yield from conn.execute(sql.format(table="main.observations"), (start_ts, end_ts))
+
+
+# 期間ごとのまとめを返す
+def iter_rollups(start_ts, end_ts, period=ROLLUP_DAY, db_path=DB_NAME):
+    with closing(sqlite3.connect(db_path)) as conn:
+        yield from conn.execute("""
+            SELECT s.key, r.start_ts, r.samples, r.delayed, r.errors, wc.name
+            FROM observation_rollups r
+            JOIN sources s ON s.id = r.source_id
+            LEFT JOIN weather_categories wc ON wc.id = r.weather_id
+            WHERE r.period = ? AND r.start_ts >= ? AND r.start_ts < ?
+            ORDER BY r.start_ts, s.key
+        """, (period, start_ts, end_ts))
+
+
+# 月ごとのファイルの書き出し（取得結果と失敗を時刻順に1つの表にする）
+EXPORT_SQL = f"""
+    SELECT s.key AS source, {KIND_EXPRESSION} AS kind, {time_expression("o.ts")} AS time,
+           {case_expression("o.status", STATUS_VALUES)} AS status, wc.name AS weather, NULL AS error, o.ts
+    FROM observations o
+    JOIN hot.sources s ON s.id = o.source_id
+    LEFT JOIN hot.weather_categories wc ON wc.id = o.weather_id
+    UNION ALL
+    SELECT s.key, {KIND_EXPRESSION}, {time_expression("e.ts")}, NULL, NULL, e.message, e.ts
+    FROM fetch_errors e JOIN hot.sources s ON s.id = e.source_id
+    ORDER BY 7, 1
+"""
+EXPORT_COLUMNS = ["source", "kind", "time", "status", "weather", "error", "ts"]
+EXPORT_TYPES = {"source": "str", "kind": "str", "time": "str", "status": "str", "weather": "str", "error": "str", "ts": "int"}
+
+
+# 月ごとのファイルを圧縮した CSV または Parquet に書き出す（書き出したパスを返す）
+def export_partition(path, fmt="csv", db_path=DB_NAME):
+    base = os.path.splitext(path)[0]
+    out_path = base + (".csv.gz" if fmt == "csv" else f".{fmt}")
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("ATTACH DATABASE ? AS hot", (db_path,))
+        export_query(conn, EXPORT_SQL, (), EXPORT_COLUMNS, EXPORT_TYPES, fmt, out_path)
+    return out_path
+
+
+# 単体で実行したときは古い月を移し、--export csv|parquet が指定されていれば移した月を書き出す
+if __name__ == "__main__":
+    fmt = sys.argv[sys.argv.index("--export") + 1] if "--export" in sys.argv else None
+    for label in archive_old_months():
+        if fmt:
+            path = os.path.join(ARCHIVE_DIR, f"observations_{label}.db")
+            print(f"{export_partition(path, fmt)} に書き出しました")
@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+import requests
+
+from html_extract import CHUNK_SIZE, extract_full, extract_streaming
+
+# 保存済みHTMLの置き場所
+FIXTURE_DIR = "最終課題/fixtures"
+
+# 実サイトから取得したページ（ファイル名に取得日を付ける）と、その一覧
+CAPTURE_DIR = os.path.join(FIXTURE_DIR, "captured")
+MANIFEST_PATH = os.path.join(CAPTURE_DIR, "manifest.json")
+
+# 実サイトの構造を模して手で書いたページ
+SYNTHETIC_DIR = os.path.join(FIXTURE_DIR, "synthetic")
+
+# 取得するページ: 名前 → (取得元URL, タグ, クラス, 文字列が必要か)
+CAPTURE_TARGETS = {
+    "line": ("https://transit.yahoo.co.jp/diainfo/156/0", "dd", "trouble", False),
+    "tenki_forecast": ("https://tenki.jp/forecast/3/16/4410/13212/", "p", "weather-telop", True),
+}
+
+# 合成のページ: ファイル名 → (タグ, クラス, 文字列が必要か)
+SYNTHETIC_FIXTURES = {
+    "line_normal.html": ("dd", "trouble", False),
+    "line_trouble.html": ("dd", "trouble", False),
+    "tenki_forecast.html": ("p", "weather-telop", True),
+}
+
+# 保存するときに取り除く部分（抽出に関係せず、ファイルを大きくするだけのもの）
+TRIM_PATTERN = re.compile(r"<(script|style|noscript|svg)\b[^>]*>.*?</\1\s*>|<!--.*?-->", re.S | re.I)
+
+# 1つのHTMLを解析する回数
+REPEAT = 200
+
+
+# スクリプト・スタイル・コメントを取り除く（要素の順番はそのまま）
+def trim_html(html):
+    return TRIM_PATTERN.sub("", html)
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+# 現在のページを取得し、取得日を付けて保存する(--save を付けて実行したとき)
+def save_fixtures():
+    """取り除いた後も BeautifulSoup での抽出結果が変わらないことを確かめてから保存し、
+    取得元・取得日時・そのときの抽出結果を manifest.json に残す。
+    """
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    manifest = load_manifest()
+    for name, (url, tag, class_name, want_text) in CAPTURE_TARGETS.items():
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+        captured_at = datetime.now().astimezone()
+        html = response.text
+        expected = extract_full(html, tag, class_name, want_text)
+        trimmed = trim_html(html)
+        if extract_full(trimmed, tag, class_name, want_text) == expected:
+            html = trimmed
+        file_name = f"{name}_{captured_at:%Y%m%d}.html"
+        with open(os.path.join(CAPTURE_DIR, file_name), "w", encoding="utf-8") as f:
+            f.write(html)
+        manifest[file_name] = {
+            "url": url,
+            "captured_at": captured_at.isoformat(timespec="seconds"),
+            "tag": tag,
+            "class_name": class_name,
+            "want_text": want_text,
+            "expected": list(expected),
+        }
+        print(f"{url} を {file_name} に保存しました（{len(response.text):,}文字 → {len(html):,}文字）")
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+# 比べるページの一覧: (表示名, パス, タグ, クラス, 文字列が必要か, 取得時の抽出結果)
+def list_fixtures():
+    fixtures = []
+    for file_name, entry in sorted(load_manifest().items()):
+        fixtures.append((f"{file_name} [実ページ {entry['captured_at']} {entry['url']}]",
+                         os.path.join(CAPTURE_DIR, file_name), entry["tag"], entry["class_name"],
+                         entry["want_text"], tuple(entry["expected"])))
+    for file_name, (tag, class_name, want_text) in SYNTHETIC_FIXTURES.items():
+        fixtures.append((f"{file_name} [合成]", os.path.join(SYNTHETIC_DIR, file_name),
+                         tag, class_name, want_text, None))
+    return fixtures
+
+
+# 文字列を受信時と同じ大きさの断片に分ける
+def split_chunks(html):
+    return [html[i:i + CHUNK_SIZE] for i in range(0, len(html), CHUNK_SIZE)]
+
+
+# 関数を REPEAT 回実行し、1回あたりのミリ秒と結果を返す
+def measure(function):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = function()
+    return (time.perf_counter() - start) / REPEAT * 1000, result
+
+
+# 高速な抽出と BeautifulSoup での解析の速さと結果を比べる
+def run_benchmark():
+    """実ページについては、取得したときの BeautifulSoup の結果とも一致するかを確かめる。"""
+    all_same = True
+    fixtures = list_fixtures()
+    if not any(expected is not None for *_, expected in fixtures):
+        print("実サイトのページが保存されていません（--save を付けて実行すると取得します）")
+    for label, path, tag, class_name, want_text, expected in fixtures:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        chunks = split_chunks(html)
+        full_ms, full_result = measure(lambda: extract_full(html, tag, class_name, want_text))
+        fast_ms, fast_result = measure(lambda: extract_streaming(iter(chunks), tag, class_name, want_text))
+        same = full_result == fast_result and (expected is None or fast_result == expected)
+        all_same = all_same and same
+        print(f"{label} ({len(html):,}文字)")
+        print(f"  BeautifulSoup: {full_ms:.3f}ms  高速抽出: {fast_ms:.3f}ms  ({full_ms / fast_ms:.1f}倍)")
+        print(f"  結果: {fast_result}  {'一致' if same else f'不一致 (BeautifulSoup: {full_result}, 取得時: {expected})'}")
+    return all_same
+
+
+if __name__ == "__main__":
+    if "--save" in sys.argv:
+        save_fixtures()
+    sys.exit(0 if run_benchmark() else 1)
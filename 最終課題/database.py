@@ -1,111 +1,212 @@
+import atexit
 import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
+import signal
 import sqlite3
-import time
-import schedule
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pytz  # タイムゾーンを扱うためのライブラリ
+from archive import start_maintenance
+from export_writer import iter_batches
+from sources import LINE_DELAYED, fetch_all, load_sources
+from poller import AdaptivePoller
+from scheduler import SlotScheduler
+from schema import KIND_CODES, STATUS_CODES, STATUS_VALUES, ensure_schema
+from storage import StorageWriter
 
 # SQLite DBファイル名
 DB_NAME = "最終課題/transport_weather.db"
 
-# テーブル作成
+# 日本時間
+JST = pytz.timezone('Asia/Tokyo')
+
+# テーブル作成（以前の形式のDBはここで新しいスキーマに移行する）
 def create_table():
     with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transport_weather (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT,
-                fetch_time TEXT,
-                weather TEXT,
-                delay_status TEXT
-            )
-        ''')
-        conn.commit()
-
-# データをDBに追加する関数
-def insert_data(date, fetch_time, weather, delay_status):
+        ensure_schema(conn)
+
+# 書き込み用の接続（最初に使うときに作成し、終了時に残りを書き込む）
+_writer = None
+_writer_lock = threading.Lock()
+
+# 書き込み用の StorageWriter を返す関数
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = StorageWriter(DB_NAME)
+            atexit.register(_writer.close)
+        return _writer
+
+# 監視対象の一覧をDBに登録する関数
+def register_sources(sources):
+    get_writer().executemany('''
+        INSERT INTO sources (key, kind, name, url) VALUES (?, ?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET kind = excluded.kind, name = excluded.name, url = excluded.url
+    ''', [(source.source_id, KIND_CODES[source.kind], source.name, source.url) for source in sources])
+
+# 取得結果 → (状態のコード, 天気の表現)
+def encode_value(source, value):
+    if source.kind == "line":
+        return STATUS_CODES[value], None
+    return None, value
+
+# 天気の表現を辞書に登録するSQL
+INSERT_CATEGORY_SQL = "INSERT OR IGNORE INTO weather_categories (name) VALUES (?)"
+
+# 取得結果をまとめてDBに追加する関数（ts は UNIX時間）
+def insert_observations(ts, observations):
+    writer = get_writer()
+    values = []
+    errors = []
+    for o in observations:
+        if o.error is not None:
+            errors.append((o.source.source_id, ts, o.error))
+        else:
+            values.append((o.source.source_id, ts) + encode_value(o.source, o.value))
+    weathers = {(weather,) for _, _, _, weather in values if weather is not None}
+    if weathers:
+        writer.executemany(INSERT_CATEGORY_SQL, sorted(weathers))
+    writer.executemany('''
+        INSERT OR IGNORE INTO observations (source_id, ts, status, weather_id)
+        VALUES ((SELECT id FROM sources WHERE key = ?), ?, ?, (SELECT id FROM weather_categories WHERE name = ?))
+    ''', values)
+    writer.executemany('''
+        INSERT INTO fetch_errors (source_id, ts, message)
+        VALUES ((SELECT id FROM sources WHERE key = ?), ?, ?)
+    ''', errors)
+
+# 状態の変化を記録する関数（前の状態を終了し、新しい状態を追加する）
+def record_transition(state, value, error, captured_at):
+    writer = get_writer()
+    key = state.source.source_id
+    ts = int(captured_at.timestamp())
+    if state.since is not None:
+        writer.execute('''
+            UPDATE state_transitions SET ended_at = ?
+            WHERE source_id = (SELECT id FROM sources WHERE key = ?) AND ended_at IS NULL
+        ''', (ts, key))
+    if error is not None:
+        status, weather = None, None
+        writer.execute('''
+            INSERT INTO fetch_errors (source_id, ts, message)
+            VALUES ((SELECT id FROM sources WHERE key = ?), ?, ?)
+        ''', (key, ts, error))
+    else:
+        status, weather = encode_value(state.source, value)
+        if weather is not None:
+            writer.execute(INSERT_CATEGORY_SQL, (weather,))
+    writer.execute('''
+        INSERT OR REPLACE INTO state_transitions (source_id, started_at, status, weather_id, is_error)
+        VALUES ((SELECT id FROM sources WHERE key = ?), ?, ?, (SELECT id FROM weather_categories WHERE name = ?), ?)
+    ''', (key, ts, status, weather, int(error is not None)))
+    print(f"{captured_at:%Y-%m-%d %H:%M:%S} {state.source.name}: {value if error is None else error}")
+
+# 前回の実行から続いている状態を読み込む関数
+def load_open_states():
     with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO transport_weather (date, fetch_time, weather, delay_status)
-            VALUES (?, ?, ?, ?)
-        ''', (date, fetch_time, weather, delay_status))
-        conn.commit()
-
-# データ取得: 多摩都市モノレールの運行状況
-def get_monorail_status():
-    TamaMono_URL = 'https://transit.yahoo.co.jp/diainfo/156/0'
-    try:
-        TamaMono_Requests = requests.get(TamaMono_URL)
-        TamaMono_Soup = BeautifulSoup(TamaMono_Requests.text, 'html.parser')
-        if TamaMono_Soup.find('dd', class_='trouble'):
-            return '多摩都市モノレールは遅延しています'
+        rows = conn.execute('''
+            SELECT s.key, s.kind, t.status, wc.name, t.is_error, t.started_at,
+                   (SELECT e.message FROM fetch_errors e
+                    WHERE e.source_id = t.source_id AND e.ts = t.started_at LIMIT 1)
+            FROM state_transitions t
+            JOIN sources s ON s.id = t.source_id
+            LEFT JOIN weather_categories wc ON wc.id = t.weather_id
+            WHERE t.ended_at IS NULL
+        ''').fetchall()
+    states = {}
+    for key, kind, status, weather, is_error, started_at, message in rows:
+        if is_error:
+            value, error = None, message or "取得エラー"
+        elif kind == KIND_CODES["line"]:
+            value, error = STATUS_VALUES.get(status), None
         else:
-            return '多摩都市モノレールは通常運転です'
-    except Exception as e:
-        return f"運行状況取得エラー: {e}"
-
-# データ取得: 現在の天気情報
-def get_current_weather():
-    # tenki.jp の天気情報ページ URL
-    forecast_url = "https://tenki.jp/forecast/3/16/4410/13212/"
-    try:
-        response = requests.get(forecast_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        # 現在の天気情報を取得
-        current_weather = soup.find('p', class_='weather-telop')
-        if not current_weather:
-            return "現在の天気情報が見つかりませんでした"
-        return current_weather.get_text(strip=True)
-    except Exception as e:
-        return f"天気情報の取得に失敗しました: {e}"
+            value, error = weather, None
+        states[key] = (value, error, datetime.fromtimestamp(started_at, JST))
+    return states
+
+# HTTP接続を使い回すためのセッション
+SESSION = requests.Session()
+
+# 1つの取得元に待つ最大秒数
+FETCH_TIMEOUT = 10
+
+# 同時に取得する取得元の数
+MAX_CONCURRENT_FETCHES = 8
+
+# 取得元を並行して呼び出すためのスレッド
+COLLECTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES)
+
+# 監視対象(sources.json から読み込む)
+SOURCES = []
+
+# 路線の取得結果を以前の形式の文に変換する関数
+def describe_line(observation):
+    if observation.error is not None:
+        return f"運行状況取得エラー: {observation.error}"
+    if observation.value == LINE_DELAYED:
+        return f"{observation.source.name}は遅延しています"
+    return f"{observation.source.name}は通常運転です"
+
+# 地点の取得結果を以前の形式の文に変換する関数
+def describe_location(observation):
+    if observation.error is not None:
+        return f"天気情報の取得に失敗しました: {observation.error}"
+    return observation.value
+
+# すべての監視対象を並行して取得する関数
+def collect_observations(sources=None, timeout=FETCH_TIMEOUT):
+    # 取得時刻は取得を始める前に1回だけ決め、すべてのデータに同じ時刻を使う
+    now = datetime.now(JST)
+    # 並行して待つので、かかる時間は遅い取得元の分だけ
+    observations = fetch_all(SOURCES if sources is None else sources, SESSION, COLLECTOR, timeout)
+    return now, observations
 
 # データを取得してDBに追加
 def fetch_and_store_data():
-    # 現在時刻と日付を取得（日本時間）
-    now = datetime.now(pytz.timezone('Asia/Tokyo'))
+    # 監視対象を取得（取得時刻は日本時間）
+    now, observations = collect_observations()
     fetch_time = now.strftime("%H:%M:%S")
     today_date = now.strftime("%Y-%m-%d")
-    
-    # 天気と運行状況を取得
-    weather = get_current_weather()
-    delay_status = get_monorail_status()
 
-    # データをDBに挿入
-    insert_data(today_date, fetch_time, weather, delay_status)
+    # データをDBに挿入（以前の transport_weather の形はビューで見られる）
+    insert_observations(int(now.timestamp()), observations)
     print("データをDBに保存しました:")
-    print(f"日付: {today_date}, 時刻: {fetch_time}, 天気: {weather}, 遅延: {delay_status}")
+    print(f"日付: {today_date}, 時刻: {fetch_time}")
+    for o in observations:
+        describe = describe_line if o.source.kind == "line" else describe_location
+        print(f"  {o.source.name}: {describe(o)}")
+    return now, observations
 
 # DB内のデータを表示する関数
 def display_db_data():
     with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM transport_weather")
-        rows = cursor.fetchall()
         print("DB内のデータ:")
-        for row in rows:
-            print(row)
-
-# 定期実行タスクのスケジュール設定
-def schedule_tasks():
-    # 5:00～23:00の間、1時間ごとに実行
-    for hour in range(5, 24):
-        time_str = f"{hour:02d}:00"
-        schedule.every().day.at(time_str).do(fetch_and_store_data)
-    # 翌日00:00のスケジュールを追加
-    schedule.every().day.at("00:00").do(fetch_and_store_data)
-
-    print("スケジュールを設定しました: 5:00～24:00の間、1時間ごとに実行します。")
+        # fetchall を使わず、少しずつ読み込みながら表示する
+        for rows in iter_batches(conn.execute("SELECT * FROM transport_weather")):
+            for row in rows:
+                print(row)
 
 # メイン処理
 if __name__ == "__main__":
+    # 終了を指示されたときも書き込み待ちのデータを書き込んでから終わる
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     create_table()
-    schedule_tasks()
+    SOURCES.extend(load_sources())
+    register_sources(SOURCES)
+    # 保存期間を過ぎた月は1日1回、月ごとのファイルに移してまとめる
+    start_maintenance(DB_NAME)
+
+    if "--hourly" in sys.argv:
+        # 以前と同じく、決まった時刻に全件を記録する（再起動しても取り逃した枠がわかる）
+        scheduler = SlotScheduler(SOURCES, fetch_and_store_data, insert_observations, get_writer(), DB_NAME, SESSION, FETCH_TIMEOUT)
+        print("スケジュール実行を開始します: 0:00 と 5:00～23:00 の毎正時に取得します。")
+        scheduler.run()
+        sys.exit(0)
 
-    print("スケジュール実行を開始します...")
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
\ No newline at end of file
+    # 状態が変わったときだけ記録する（変化が多いときは短い間隔で取得する）
+    poller = AdaptivePoller(SOURCES, SESSION, COLLECTOR, record_transition, load_open_states(), FETCH_TIMEOUT)
+    print("変化の監視を開始します...")
+    poller.run()
\ No newline at end of file
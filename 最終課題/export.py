@@ -0,0 +1,248 @@
+import argparse
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytz
+
+from export_writer import FETCH_SIZE, FORMATS, export_batches, export_query, iter_batches
+from schema import KIND_CODES, OUTCOME_NAMES, ROLLUP_DAY, ROLLUP_HOUR, STATUS_VALUES, ensure_schema
+
+# SQLite DBファイル名
+DB_NAME = "最終課題/transport_weather.db"
+
+JST = pytz.timezone('Asia/Tokyo')
+
+
+# UNIX時間の列を日本時間の ISO 形式の文字列にする式
+def time_expression(column):
+    return f"strftime('%Y-%m-%dT%H:%M:%S+09:00', {column}, 'unixepoch', '+9 hours')"
+
+
+# コードの列を名前にする式
+def case_expression(column, names):
+    cases = " ".join(f"WHEN {code} THEN '{name}'" for code, name in names.items())
+    return f"CASE {column} {cases} END"
+
+
+KIND_EXPRESSION = case_expression("s.kind", {code: kind for kind, code in KIND_CODES.items()})
+
+
+class Dataset:
+    """書き出せる表1つ分。columns は列名 → (SQLの式, 型)。
+
+    期間の絞り込みには ts_column (UNIX時間) か date_column (YYYY-MM-DD の文字列) を使う。
+    archive_table は古い月を月ごとのファイルに移す表の名前で、from_sql の {table} に読む表が入る。
+    """
+
+    def __init__(self, from_sql, columns, order_by, ts_column=None, date_column=None, archive_table=None):
+        self.from_sql = from_sql
+        self.columns = columns
+        self.order_by = order_by
+        self.ts_column = ts_column
+        self.date_column = date_column
+        self.archive_table = archive_table
+
+    # 列と期間を指定して SELECT 文とパラメータを組み立てる（table は {table} に入れる表）
+    def build_query(self, columns=None, start=None, end=None, table=None):
+        columns = columns or list(self.columns)
+        unknown = [name for name in columns if name not in self.columns]
+        if unknown:
+            raise ValueError(f"存在しない列です: {', '.join(unknown)} (使える列: {', '.join(self.columns)})")
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append(f"{self.ts_column} >= ?" if self.ts_column else f"{self.date_column} >= ?")
+            params.append(day_start(start) if self.ts_column else start)
+        if end is not None:
+            # 終了日はその日の終わりまでを含める
+            conditions.append(f"{self.ts_column} < ?" if self.ts_column else f"{self.date_column} <= ?")
+            params.append(day_start(end, 1) if self.ts_column else end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        select = ", ".join(f"{self.columns[name][0]} AS {name}" for name in columns)
+        from_sql = self.from_sql.format(table=table or f"main.{self.archive_table}") if self.archive_table else self.from_sql
+        sql = f"SELECT {select} FROM {from_sql} {where} ORDER BY {self.order_by}"
+        return sql, params, columns, {name: self.columns[name][1] for name in columns}
+
+
+# 日本時間の日付(YYYY-MM-DD)の0時のUNIX時間（days 日後）
+def day_start(date, days=0):
+    day = datetime.strptime(date, "%Y-%m-%d") + timedelta(days=days)
+    return int(JST.localize(day).timestamp())
+
+
+DATASETS = {
+    # 取得結果
+    "observations": Dataset(
+        """{table} o JOIN sources s ON s.id = o.source_id
+           LEFT JOIN weather_categories wc ON wc.id = o.weather_id""",
+        {
+            "source": ("s.key", "str"),
+            "name": ("s.name", "str"),
+            "kind": (KIND_EXPRESSION, "str"),
+            "time": (time_expression("o.ts"), "str"),
+            "ts": ("o.ts", "int"),
+            "status": (case_expression("o.status", STATUS_VALUES), "str"),
+            "weather": ("wc.name", "str"),
+        },
+        "o.ts, o.source_id",
+        ts_column="o.ts",
+        archive_table="observations",
+    ),
+    # 取得に失敗したときのメッセージ
+    "errors": Dataset(
+        "{table} e JOIN sources s ON s.id = e.source_id",
+        {
+            "source": ("s.key", "str"),
+            "name": ("s.name", "str"),
+            "time": (time_expression("e.ts"), "str"),
+            "ts": ("e.ts", "int"),
+            "message": ("e.message", "str"),
+        },
+        "e.ts, e.source_id",
+        ts_column="e.ts",
+        archive_table="fetch_errors",
+    ),
+    # 状態が続いた期間
+    "transitions": Dataset(
+        """{table} t JOIN sources s ON s.id = t.source_id
+           LEFT JOIN weather_categories wc ON wc.id = t.weather_id""",
+        {
+            "source": ("s.key", "str"),
+            "name": ("s.name", "str"),
+            "started_at": (time_expression("t.started_at"), "str"),
+            "ended_at": (time_expression("t.ended_at"), "str"),
+            "duration_seconds": ("t.ended_at - t.started_at", "int"),
+            "status": (case_expression("t.status", STATUS_VALUES), "str"),
+            "weather": ("wc.name", "str"),
+            "is_error": ("t.is_error", "int"),
+        },
+        "t.started_at, t.source_id",
+        ts_column="t.started_at",
+        archive_table="state_transitions",
+    ),
+    # 1時間・1日ごとのまとめ
+    "rollups": Dataset(
+        """observation_rollups r JOIN sources s ON s.id = r.source_id
+           LEFT JOIN weather_categories wc ON wc.id = r.weather_id""",
+        {
+            "source": ("s.key", "str"),
+            "period": (case_expression("r.period", {ROLLUP_HOUR: "hour", ROLLUP_DAY: "day"}), "str"),
+            "start": (time_expression("r.start_ts"), "str"),
+            "samples": ("r.samples", "int"),
+            "delayed": ("r.delayed", "int"),
+            "errors": ("r.errors", "int"),
+            "weather": ("wc.name", "str"),
+        },
+        "r.period, r.start_ts, r.source_id",
+        ts_column="r.start_ts",
+    ),
+    # 決まった時刻(枠)ごとの取得の結果（欠測・補完を含む）
+    "runs": Dataset(
+        "{table} r JOIN sources s ON s.id = r.source_id",
+        {
+            "source": ("s.key", "str"),
+            "slot": (time_expression("r.slot_ts"), "str"),
+            "outcome": (case_expression("r.outcome", OUTCOME_NAMES), "str"),
+            "fetched_at": (time_expression("r.ts"), "str"),
+        },
+        "r.slot_ts, r.source_id",
+        ts_column="r.slot_ts",
+        archive_table="collection_runs",
+    ),
+    # 以前と同じ形の表（ビュー）
+    "transport_weather": Dataset(
+        "transport_weather",
+        {
+            "id": ("id", "int"),
+            "date": ("date", "str"),
+            "fetch_time": ("fetch_time", "str"),
+            "weather": ("weather", "str"),
+            "delay_status": ("delay_status", "str"),
+        },
+        "id",
+        date_column="date",
+    ),
+}
+
+
+# UNIX時間 → 日本時間の日付(YYYY-MM-DD)
+def ts_date(ts):
+    return f"{datetime.fromtimestamp(ts, JST):%Y-%m-%d}"
+
+
+# 月ごとのファイルに移した月も含めて、期間内の行を月ごとに時刻順に読む
+# （月ごとに、その月のファイルだけを ATTACH して手元のDBの行と合わせる）
+def iter_archived_batches(conn, dataset, columns, start, end, archive_dir, fetch_size=FETCH_SIZE):
+    # archive.py はこのファイルの式を使うので、循環しないようここで読み込む
+    import archive
+
+    archive_dir = archive_dir or archive.ARCHIVE_DIR
+    months = archive.archived_months(archive_dir)
+    if start is None or end is None:
+        # 期間を省略したときは、手元のDBと月ごとのファイルのすべてを対象にする
+        # 月ごとのファイルへは期間の絞り込みに使う列の月で分けて移している
+        column = dataset.ts_column.split(".")[-1]
+        first, last = conn.execute(f"SELECT min({column}), max({column}) FROM main.{dataset.archive_table}").fetchone()
+        firsts = [ts_date(first)] if first is not None else []
+        lasts = [ts_date(last)] if last is not None else []
+        if months:
+            firsts.append(f"{months[0]:%Y-%m-%d}")
+            lasts.append(ts_date(archive.next_month(months[-1]).timestamp() - 1))
+        if not firsts:
+            return
+        start = start or min(firsts)
+        end = end or max(lasts)
+    archived = {f"{month:%Y-%m}" for month in months}
+    for month in archive.months_between(day_start(start), day_start(end, 1)):
+        month_first = f"{month:%Y-%m-%d}"
+        month_last = ts_date(archive.next_month(month).timestamp() - 1)
+        if f"{month:%Y-%m}" not in archived:
+            sql, params, _, _ = dataset.build_query(columns, max(start, month_first), min(end, month_last))
+            yield from iter_batches(conn.execute(sql, params), fetch_size)
+            continue
+        table = f"(SELECT * FROM main.{dataset.archive_table} UNION ALL SELECT * FROM part.{dataset.archive_table})"
+        sql, params, _, _ = dataset.build_query(columns, max(start, month_first), min(end, month_last), table)
+        conn.execute("ATTACH DATABASE ? AS part", (archive.partition_path(month, archive_dir),))
+        try:
+            yield from iter_batches(conn.execute(sql, params), fetch_size)
+        finally:
+            conn.execute("DETACH DATABASE part")
+
+
+# 表を指定した形式で書き出す（書き出した行数を返す）
+def export_dataset(conn, name, fmt="csv", out_path="-", columns=None, start=None, end=None, fetch_size=FETCH_SIZE,
+                   archive_dir=None):
+    """取得結果・失敗・状態の変化・枠の記録は、archive.py で月ごとのファイルに移した月も読む
+    （archive_dir を省略したときは archive.ARCHIVE_DIR）。
+    """
+    dataset = DATASETS[name]
+    sql, params, columns, types = dataset.build_query(columns, start, end)
+    if dataset.archive_table is None:
+        return export_query(conn, sql, params, columns, types, fmt, out_path, fetch_size)
+    batches = iter_archived_batches(conn, dataset, columns, start, end, archive_dir, fetch_size)
+    return export_batches(batches, columns, types, fmt, out_path)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="transport_weather.db の内容を少しずつ読み込みながら書き出す")
+    parser.add_argument("dataset", choices=DATASETS, help="書き出す表")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="csv", help="出力形式")
+    parser.add_argument("-o", "--output", default="-", help="出力先（省略時は標準出力、.gz で終わると圧縮）")
+    parser.add_argument("--from", dest="start", help="開始日 YYYY-MM-DD（日本時間）")
+    parser.add_argument("--to", dest="end", help="終了日 YYYY-MM-DD（この日を含む）")
+    parser.add_argument("--columns", help="書き出す列（カンマ区切り）")
+    parser.add_argument("--db", default=DB_NAME, help="DBファイル")
+    parser.add_argument("--archive-dir", help="月ごとのファイルを置いたフォルダ（省略時は archive.py と同じ）")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    columns = args.columns.split(",") if args.columns else None
+    with sqlite3.connect(args.db) as conn:
+        ensure_schema(conn)
+        count = export_dataset(conn, args.dataset, args.format, args.output, columns, args.start, args.end,
+                               archive_dir=args.archive_dir)
+    if args.output != "-":
+        print(f"{count}行を {args.output} に書き出しました")
@@ -0,0 +1,91 @@
+import csv
+import gzip
+import json
+import sys
+
+# 一度に取り出す行数
+FETCH_SIZE = 1000
+
+# Parquet の1つの行グループにまとめる行数
+PARQUET_ROW_GROUP = 50000
+
+# 対応している出力形式
+FORMATS = ("csv", "jsonl", "parquet")
+
+# 列の型 → pyarrow の型の名前
+ARROW_TYPES = {"int": "int64", "float": "float64", "str": "string"}
+
+
+# カーソルから fetch_size 行ずつ取り出す（fetchall を使わないので、使うメモリは表の大きさによらない）
+def iter_batches(cursor, fetch_size=FETCH_SIZE):
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+
+def write_csv(batches, columns, f):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    count = 0
+    for rows in batches:
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def write_jsonl(batches, columns, f):
+    count = 0
+    for rows in batches:
+        f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+        count += len(rows)
+    return count
+
+
+# Parquet は pyarrow が入っている場合だけ使える
+def write_parquet(batches, columns, path, types):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, ARROW_TYPES[types[name]]) for name in columns])
+    count = 0
+    pending = []
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for rows in batches:
+            pending.extend(rows)
+            if len(pending) >= PARQUET_ROW_GROUP:
+                writer.write_table(pa.Table.from_arrays([list(column) for column in zip(*pending)], schema=schema))
+                count += len(pending)
+                pending = []
+        if pending:
+            writer.write_table(pa.Table.from_arrays([list(column) for column in zip(*pending)], schema=schema))
+            count += len(pending)
+    return count
+
+
+# クエリの結果を指定した形式で書き出す（書き出した行数を返す）
+def export_query(conn, sql, params, columns, types, fmt, out_path="-", fetch_size=FETCH_SIZE):
+    """out_path が "-" のときは標準出力に書き出し、.gz で終わるときは gzip で圧縮する（Parquet はファイルのみ）。
+    types は列名 → "int" / "float" / "str" で、Parquet の列の型に使う。
+    """
+    return export_batches(iter_batches(conn.execute(sql, params), fetch_size), columns, types, fmt, out_path)
+
+
+# 行のまとまりを順に受け取って指定した形式で書き出す（書き出した行数を返す）
+def export_batches(batches, columns, types, fmt, out_path="-"):
+    if fmt not in FORMATS:
+        raise ValueError(f"未対応の形式です: {fmt}")
+    if fmt == "parquet":
+        if out_path == "-":
+            raise ValueError("Parquet は標準出力に書き出せません。出力先のファイルを指定してください")
+        return write_parquet(batches, columns, out_path, types)
+    write = write_csv if fmt == "csv" else write_jsonl
+    if out_path == "-":
+        return write(batches, columns, sys.stdout)
+    opener = gzip.open if out_path.endswith(".gz") else open
+    with opener(out_path, "wt", encoding="utf-8", newline="") as f:
+        return write(batches, columns, f)
@@ -0,0 +1,110 @@
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+# 途中で読み込みをやめるときに1回に受け取る文字数
+CHUNK_SIZE = 8192
+
+
+class _Found(Exception):
+    """目的の要素が見つかったので解析を打ち切るための例外。"""
+
+
+class _TargetParser(HTMLParser):
+    """指定したタグ・クラスの最初の要素を探すパーサ。
+
+    want_text が False なら開始タグが見つかった時点で、True なら対応する
+    終了タグまでの文字列を集めた時点で解析を打ち切る。
+    """
+
+    def __init__(self, tag, class_name, want_text):
+        super().__init__(convert_charrefs=True)
+        self.tag = tag
+        self.class_name = class_name
+        self.want_text = want_text
+        self.depth = 0
+        self.pieces = []
+        self.found = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.depth:
+            if tag == self.tag:
+                self.depth += 1
+            return
+        if tag != self.tag:
+            return
+        classes = dict(attrs).get("class") or ""
+        if self.class_name not in classes.split():
+            return
+        self.found = True
+        if not self.want_text:
+            raise _Found()
+        self.depth = 1
+
+    def handle_endtag(self, tag):
+        if self.depth and tag == self.tag:
+            self.depth -= 1
+            if self.depth == 0:
+                raise _Found()
+
+    def handle_data(self, data):
+        if self.depth:
+            # BeautifulSoup の get_text(strip=True) と同じく、前後の空白を除いて連結する
+            piece = data.strip()
+            if piece:
+                self.pieces.append(piece)
+
+    def text(self):
+        return "".join(self.pieces) if self.found else None
+
+
+# 文字列の断片を順に解析し、目的の要素が見つかったら読み込みをやめる関数
+def extract_streaming(chunks, tag, class_name, want_text=True):
+    """(見つかったか, 要素の文字列) を返す。want_text が False なら文字列は None。"""
+    parser = _TargetParser(tag, class_name, want_text)
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+        parser.close()
+    except _Found:
+        pass
+    return parser.found, parser.text() if want_text else None
+
+
+# BeautifulSoup で文書全体を解析して同じ結果を返す関数(比較・予備用)
+def extract_full(html, tag, class_name, want_text=True):
+    soup = BeautifulSoup(html, 'html.parser')
+    element = soup.find(tag, class_=class_name)
+    if element is None:
+        return False, None
+    return True, element.get_text(strip=True) if want_text else None
+
+
+# HTTPレスポンスを少しずつ読みながら目的の要素を探す関数
+def extract_from_response(response, tag, class_name, want_text=True):
+    """response は stream=True で取得したもの。
+
+    通常は受信した分から順に解析し、要素が見つかった時点で残りを読まずに
+    接続を閉じる。高速な解析で例外が起きた場合は、受信済みの分と残りを
+    合わせて BeautifulSoup で解析し直す。
+    """
+    if response.encoding is None:
+        response.encoding = "utf-8"
+    received = []
+
+    def chunks():
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE, decode_unicode=True):
+            received.append(chunk)
+            yield chunk
+
+    stream = chunks()
+    try:
+        return extract_streaming(stream, tag, class_name, want_text)
+    except Exception as e:
+        # 通信エラーは解析し直しても直らないのでそのまま伝える
+        if isinstance(e, OSError):
+            raise
+        html = "".join(received) + "".join(stream)
+        return extract_full(html, tag, class_name, want_text)
+    finally:
+        response.close()
@@ -0,0 +1,122 @@
+import time
+from datetime import datetime
+
+import pytz
+
+from sources import LINE_DELAYED, fetch_all
+
+# 状態が変わりやすいときの取得間隔(秒)
+MIN_INTERVAL = 120
+
+# 状態が安定しているときの最大の取得間隔(秒)
+MAX_INTERVAL = 3600
+
+# 取得に失敗したときの再試行間隔(秒)
+ERROR_INTERVAL = 300
+
+# 取得失敗を1つの状態として扱うための値
+ERROR_STATE = "__error__"
+
+JST = pytz.timezone('Asia/Tokyo')
+
+
+class SourceState:
+    """取得元1件の現在の状態と、次に取得する時刻。"""
+
+    def __init__(self, source, value=None, error=None, since=None):
+        self.source = source
+        self.value = value
+        self.error = error
+        self.since = since
+        self.interval = MIN_INTERVAL
+        self.next_due = 0.0
+        self.etag = None
+        self.last_modified = None
+
+    # 状態の比較に使う値(エラーはメッセージに関係なく1つの状態とみなす)
+    def key(self):
+        return ERROR_STATE if self.error is not None else self.value
+
+    # 条件付きリクエストのヘッダー
+    def request_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class AdaptivePoller:
+    """状態が変わったときだけ記録し、取得間隔を状況に合わせて変える。
+
+    遅延中の路線や、直前に天気が変わった地点は MIN_INTERVAL ごとに取得し、
+    変化がなければ間隔を倍にして MAX_INTERVAL まで延ばす。
+    状態が変わると、state を更新する前に on_transition(state, 新しい値, 新しいエラー, 時刻) を呼ぶ。
+    """
+
+    def __init__(self, sources, session, executor, on_transition, open_states=None, timeout=10):
+        self.session = session
+        self.executor = executor
+        self.on_transition = on_transition
+        self.timeout = timeout
+        self.states = {}
+        open_states = open_states or {}
+        for source in sources:
+            state = SourceState(source)
+            if source.source_id in open_states:
+                # 前回の実行から続いている状態を引き継ぐ
+                state.value, state.error, state.since = open_states[source.source_id]
+            self.states[source.source_id] = state
+
+    # 状態に応じて次の取得間隔を決める
+    def next_interval(self, state, changed):
+        if state.error is not None:
+            return ERROR_INTERVAL
+        if changed or (state.source.kind == "line" and state.value == LINE_DELAYED):
+            return MIN_INTERVAL
+        return min(state.interval * 2, MAX_INTERVAL)
+
+    # 取得結果を状態に反映する(状態が変わったら記録する)
+    def apply(self, state, observation, captured_at):
+        if observation.etag or observation.last_modified:
+            state.etag = observation.etag
+            state.last_modified = observation.last_modified
+        if observation.not_modified:
+            return False
+        new_key = ERROR_STATE if observation.error is not None else observation.value
+        if state.since is not None and new_key == state.key():
+            return False
+        self.on_transition(state, observation.value, observation.error, captured_at)
+        state.value = observation.value
+        state.error = observation.error
+        state.since = captured_at
+        return True
+
+    # 取得時刻を過ぎた取得元をまとめて取得する
+    def poll_due(self, now=None):
+        now = time.time() if now is None else now
+        due = [state for state in self.states.values() if state.next_due <= now]
+        if not due:
+            return []
+        captured_at = datetime.now(JST)
+        headers = {state.source.source_id: state.request_headers() for state in due}
+        observations = fetch_all([state.source for state in due], self.session, self.executor, self.timeout, headers)
+        changed_sources = []
+        for state, observation in zip(due, observations):
+            changed = self.apply(state, observation, captured_at)
+            state.interval = self.next_interval(state, changed)
+            state.next_due = now + state.interval
+            if changed:
+                changed_sources.append(state)
+        return changed_sources
+
+    # 次に取得する時刻(UNIX時間)
+    def next_due(self):
+        return min((state.next_due for state in self.states.values()), default=time.time() + MAX_INTERVAL)
+
+    # 取得を繰り返す
+    def run(self):
+        while True:
+            self.poll_due()
+            time.sleep(max(0, self.next_due() - time.time()))
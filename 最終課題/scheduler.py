@@ -0,0 +1,194 @@
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from schema import OUTCOME_BACKFILLED, OUTCOME_ERROR, OUTCOME_GAP, OUTCOME_NAMES, OUTCOME_OK, ensure_schema
+from sources import SOURCE_TYPES, Observation
+
+# SQLite DBファイル名
+DB_NAME = "最終課題/transport_weather.db"
+
+# 取得する時刻（以前の schedule と同じく 0:00 と 5:00～23:00 の毎正時）
+SLOT_HOURS = [0] + list(range(5, 24))
+
+# 枠の時刻からこの秒数を過ぎたら、取得せずに欠測として扱う
+MAX_LATENESS = 600
+
+JST = pytz.timezone('Asia/Tokyo')
+
+# 枠ごとの結果を記録するSQL
+RUN_SQL = """
+    INSERT OR REPLACE INTO collection_runs (source_id, slot_ts, outcome, ts)
+    VALUES ((SELECT id FROM sources WHERE key = ?), ?, ?, ?)
+"""
+
+
+# (start_ts, end_ts] に含まれる枠の時刻(UNIX時間)を順に返す
+def slots_between(start_ts, end_ts, slot_hours=SLOT_HOURS):
+    hours = sorted(slot_hours)
+    day = datetime.fromtimestamp(start_ts, JST).date()
+    while True:
+        for hour in hours:
+            slot = int(JST.localize(datetime(day.year, day.month, day.day, hour)).timestamp())
+            if slot > end_ts:
+                return
+            if slot > start_ts:
+                yield slot
+        day += timedelta(days=1)
+
+
+# after_ts より後の最初の枠
+def next_slot(after_ts, slot_hours=SLOT_HOURS):
+    return next(slots_between(after_ts, float("inf"), slot_hours))
+
+
+# at_ts 以前の最後の枠
+def previous_slot(at_ts, slot_hours=SLOT_HOURS):
+    return list(slots_between(at_ts - 2 * 86400, at_ts, slot_hours))[-1]
+
+
+# 取得元ごとに、結果を記録した最後の枠を返す
+def load_last_slots(conn):
+    return dict(conn.execute("""
+        SELECT s.key, max(r.slot_ts) FROM collection_runs r JOIN sources s ON s.id = r.source_id
+        GROUP BY s.key
+    """).fetchall())
+
+
+class SlotScheduler:
+    """決まった時刻(枠)ごとに全取得元を取得し、枠ごとの結果を collection_runs に残す。
+
+    次の枠の時刻まで眠り、毎秒起きて確認することはしない。
+    起動時には最後に記録した枠から現在までに取り逃した枠を探し、
+    過去の値を取得できる種類(register_backfill)は補完し、それ以外は欠測として記録する。
+    collect() は (取得時刻, 取得結果のリスト) を返し、取得結果の保存まで行う関数。
+    store(ts, 取得結果のリスト) は補完した値の保存に使う。
+    """
+
+    def __init__(self, sources, collect, store, writer, db_path=DB_NAME, session=None, timeout=10,
+                 slot_hours=SLOT_HOURS, max_lateness=MAX_LATENESS):
+        self.sources = sources
+        self.collect = collect
+        self.store = store
+        self.writer = writer
+        self.db_path = db_path
+        self.session = session
+        self.timeout = timeout
+        self.slot_hours = slot_hours
+        self.max_lateness = max_lateness
+
+    # 取り逃した枠を補完するか欠測として記録する（記録する行のリストを返す）
+    def missed_rows(self, source, slot):
+        backfill = SOURCE_TYPES[source.kind].backfill
+        if backfill is not None:
+            try:
+                value = backfill(source, datetime.fromtimestamp(slot, JST), self.session, self.timeout)
+                self.store(slot, [Observation(source, value=value)])
+                return [(source.source_id, slot, OUTCOME_BACKFILLED, slot)]
+            except Exception as e:
+                print(f"{source.name} の {datetime.fromtimestamp(slot, JST):%Y-%m-%d %H:%M} を補完できませんでした: {e}")
+        return [(source.source_id, slot, OUTCOME_GAP, None)]
+
+    # 前回の実行から現在までに取り逃した枠を記録する（記録した件数を返す）
+    def recover(self, now_ts):
+        with sqlite3.connect(self.db_path) as conn:
+            last_slots = load_last_slots(conn)
+        rows = []
+        for source in self.sources:
+            # 初めて取得する取得元は、これまでの枠を取り逃したとはみなさない
+            if source.source_id not in last_slots:
+                continue
+            for slot in slots_between(last_slots[source.source_id], now_ts - self.max_lateness, self.slot_hours):
+                rows.extend(self.missed_rows(source, slot))
+        if rows:
+            self.writer.executemany(RUN_SQL, rows)
+            self.writer.flush()
+            gaps = sum(1 for row in rows if row[2] == OUTCOME_GAP)
+            print(f"取り逃した枠を記録しました: 欠測{gaps}件, 補完{len(rows) - gaps}件")
+        return len(rows)
+
+    # 1つの枠の取得を行い、取得元ごとの結果を記録する
+    def run_slot(self, slot):
+        now, observations = self.collect()
+        ts = int(now.timestamp())
+        self.writer.executemany(RUN_SQL, [
+            (o.source.source_id, slot, OUTCOME_OK if o.error is None else OUTCOME_ERROR, ts)
+            for o in observations
+        ])
+        # 次の枠まで眠る前に書き込みを終えておく（途中で止まっても記録が残る）
+        self.writer.flush()
+
+    # 遅れすぎた枠を欠測（または補完）として記録する
+    def skip_slot(self, slot):
+        rows = []
+        for source in self.sources:
+            rows.extend(self.missed_rows(source, slot))
+        self.writer.executemany(RUN_SQL, rows)
+        self.writer.flush()
+        print(f"{datetime.fromtimestamp(slot, JST):%Y-%m-%d %H:%M} の枠は時刻を過ぎていたため取得しませんでした")
+
+    # 枠ごとの取得を繰り返す（stop がセットされると終了する）
+    def run(self, stop=None):
+        stop = stop or threading.Event()
+        now_ts = time.time()
+        self.recover(now_ts)
+        # 直前の枠がまだ許容範囲内で、記録されていなければすぐに取得する
+        current = previous_slot(now_ts, self.slot_hours)
+        with sqlite3.connect(self.db_path) as conn:
+            last_slots = load_last_slots(conn)
+        if now_ts - current <= self.max_lateness and any(
+            last_slots.get(source.source_id, -1) < current for source in self.sources
+        ):
+            self.run_slot(current)
+        while True:
+            slot = next_slot(current, self.slot_hours)
+            # 次の枠の時刻まで眠る
+            if stop.wait(max(0, slot - time.time())):
+                return
+            if time.time() - slot > self.max_lateness:
+                self.skip_slot(slot)
+            else:
+                self.run_slot(slot)
+            current = slot
+
+
+# 期間内の枠ごとの記録の集計（取得元ごとの辞書のリスト）
+def completeness(conn, start_ts, end_ts, slot_hours=SLOT_HOURS):
+    """expected は期間内の枠の数、untracked は記録のない枠の数
+    （監視を始める前や、まだ来ていない枠）。ratio は値がある枠の割合。
+    """
+    expected = sum(1 for _ in slots_between(start_ts - 1, end_ts, slot_hours))
+    summary = {}
+    for key, name, outcome, count in conn.execute("""
+        SELECT s.key, s.name, r.outcome, count(*)
+        FROM collection_runs r JOIN sources s ON s.id = r.source_id
+        WHERE r.slot_ts >= ? AND r.slot_ts <= ?
+        GROUP BY s.key, r.outcome
+    """, (start_ts, end_ts)):
+        row = summary.setdefault(key, dict({"source": key, "name": name, "expected": expected},
+                                           **{label: 0 for label in OUTCOME_NAMES.values()}))
+        row[OUTCOME_NAMES[outcome]] = count
+    for row in summary.values():
+        recorded = sum(row[label] for label in OUTCOME_NAMES.values())
+        row["untracked"] = expected - recorded
+        row["ratio"] = (row["ok"] + row["backfilled"]) / expected if expected else None
+    return list(summary.values())
+
+
+# 単体で実行したときは直近 N 日(省略時は7日)の枠ごとの記録を表示する
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    end_ts = time.time()
+    with sqlite3.connect(DB_NAME) as conn:
+        ensure_schema(conn)
+        rows = completeness(conn, end_ts - days * 86400, end_ts)
+    if not rows:
+        print("枠ごとの記録がありません（database.py --hourly で記録されます）")
+    for row in rows:
+        ratio = f"{row['ratio']:.1%}" if row["ratio"] is not None else "-"
+        print(f"{row['name']}: 取得{row['ok']} 失敗{row['error']} 補完{row['backfilled']} 欠測{row['gap']}"
+              f" 記録なし{row['untracked']} / {row['expected']}枠 (充足率 {ratio})")
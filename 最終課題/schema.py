@@ -0,0 +1,287 @@
+import sqlite3
+import sys
+
+from sources import LINE_DELAYED, LINE_NORMAL
+
+# スキーマの版(PRAGMA user_version に保存する)
+SCHEMA_VERSION = 4
+
+# 取得元の種類のコード
+KIND_CODES = {"line": 0, "location": 1}
+
+# 路線の状態のコード
+STATUS_NORMAL = 0
+STATUS_DELAYED = 1
+STATUS_CODES = {LINE_NORMAL: STATUS_NORMAL, LINE_DELAYED: STATUS_DELAYED}
+STATUS_VALUES = {code: value for value, code in STATUS_CODES.items()}
+
+# 以前の transport_weather テーブルに記録されていた路線と地点
+LEGACY_SOURCES = [
+    ("tama_monorail", KIND_CODES["line"], "多摩都市モノレール", "https://transit.yahoo.co.jp/diainfo/156/0"),
+    ("hino", KIND_CODES["location"], "日野市", "https://tenki.jp/forecast/3/16/4410/13212/"),
+]
+
+# 時刻はすべて UNIX 時間(秒)の整数で持つ
+TABLES = [
+    # 監視対象(key は sources.json の id)
+    """
+    CREATE TABLE IF NOT EXISTS sources (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL UNIQUE,
+        kind INTEGER NOT NULL,
+        name TEXT,
+        url TEXT
+    )
+    """,
+    # 天気の表現(「晴のち曇」など)の辞書
+    """
+    CREATE TABLE IF NOT EXISTS weather_categories (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    # 取得結果。路線は status、地点は weather_id に値が入る
+    """
+    CREATE TABLE IF NOT EXISTS observations (
+        source_id INTEGER NOT NULL REFERENCES sources(id),
+        ts INTEGER NOT NULL,
+        status INTEGER,
+        weather_id INTEGER REFERENCES weather_categories(id),
+        PRIMARY KEY (source_id, ts)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_observations_ts ON observations (ts)",
+    # 取得に失敗したときのメッセージ
+    """
+    CREATE TABLE IF NOT EXISTS fetch_errors (
+        source_id INTEGER NOT NULL REFERENCES sources(id),
+        ts INTEGER NOT NULL,
+        message TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_fetch_errors_ts ON fetch_errors (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_fetch_errors_source_ts ON fetch_errors (source_id, ts)",
+    # 状態が続いた期間(ended_at が NULL の行が現在の状態)
+    """
+    CREATE TABLE IF NOT EXISTS state_transitions (
+        source_id INTEGER NOT NULL REFERENCES sources(id),
+        started_at INTEGER NOT NULL,
+        ended_at INTEGER,
+        status INTEGER,
+        weather_id INTEGER REFERENCES weather_categories(id),
+        is_error INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (source_id, started_at)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_state_transitions_started_at ON state_transitions (started_at)",
+    # 古い取得結果を1時間・1日ごとにまとめたもの(period は ROLLUP_HOUR / ROLLUP_DAY)
+    """
+    CREATE TABLE IF NOT EXISTS observation_rollups (
+        source_id INTEGER NOT NULL REFERENCES sources(id),
+        period INTEGER NOT NULL,
+        start_ts INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        delayed INTEGER,
+        errors INTEGER NOT NULL,
+        weather_id INTEGER REFERENCES weather_categories(id),
+        PRIMARY KEY (source_id, period, start_ts)
+    ) WITHOUT ROWID
+    """,
+    # 決まった時刻(枠)ごとの取得の結果(outcome は OUTCOME_*、ts は実際に取得した時刻)
+    """
+    CREATE TABLE IF NOT EXISTS collection_runs (
+        source_id INTEGER NOT NULL REFERENCES sources(id),
+        slot_ts INTEGER NOT NULL,
+        outcome INTEGER NOT NULL,
+        ts INTEGER,
+        PRIMARY KEY (source_id, slot_ts)
+    ) WITHOUT ROWID
+    """,
+]
+
+# collection_runs の outcome
+OUTCOME_OK = 0
+OUTCOME_ERROR = 1
+OUTCOME_GAP = 2
+OUTCOME_BACKFILLED = 3
+OUTCOME_NAMES = {OUTCOME_OK: "ok", OUTCOME_ERROR: "error", OUTCOME_GAP: "gap", OUTCOME_BACKFILLED: "backfilled"}
+
+# observation_rollups の period
+ROLLUP_HOUR = 0
+ROLLUP_DAY = 1
+
+# 以前と同じ形(日付・時刻・天気・運行状況の文)で見るためのビュー
+LEGACY_VIEW = """
+    CREATE VIEW IF NOT EXISTS transport_weather AS
+    WITH line AS (SELECT id, name FROM sources WHERE key = 'tama_monorail'),
+         place AS (SELECT id FROM sources WHERE key = 'hino'),
+         times AS (
+             SELECT ts FROM observations WHERE source_id IN (SELECT id FROM line UNION ALL SELECT id FROM place)
+             UNION
+             SELECT ts FROM fetch_errors WHERE source_id IN (SELECT id FROM line UNION ALL SELECT id FROM place)
+         )
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY times.ts) AS id,
+        date(times.ts, 'unixepoch', '+9 hours') AS date,
+        time(times.ts, 'unixepoch', '+9 hours') AS fetch_time,
+        COALESCE(
+            (SELECT wc.name FROM observations o JOIN weather_categories wc ON wc.id = o.weather_id
+             WHERE o.source_id = (SELECT id FROM place) AND o.ts = times.ts),
+            (SELECT e.message FROM fetch_errors e
+             WHERE e.source_id = (SELECT id FROM place) AND e.ts = times.ts)
+        ) AS weather,
+        COALESCE(
+            (SELECT (SELECT name FROM line) || CASE o.status WHEN 1 THEN 'は遅延しています' ELSE 'は通常運転です' END
+             FROM observations o WHERE o.source_id = (SELECT id FROM line) AND o.ts = times.ts),
+            (SELECT e.message FROM fetch_errors e
+             WHERE e.source_id = (SELECT id FROM line) AND e.ts = times.ts)
+        ) AS delay_status
+    FROM times
+"""
+
+# 日本時間の日付と時刻の文字列 → UNIX時間
+LEGACY_TS = "CAST(strftime('%s', date || ' ' || fetch_time) AS INTEGER) - 9 * 3600"
+
+
+# テーブルが存在するか調べる
+def table_exists(conn, name, kind="table"):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)).fetchone()
+    return row is not None
+
+
+# 以前の形式(版1)のデータを新しいテーブルに移す
+def migrate_v1(conn):
+    # 以前のテーブルを退避する(インデックス名が重なるので先に削除する)
+    conn.execute("DROP INDEX IF EXISTS idx_observations_source_time")
+    conn.execute("DROP INDEX IF EXISTS idx_state_transitions_source_time")
+    renamed = []
+    for name in ("transport_weather", "sources", "observations", "state_transitions"):
+        if table_exists(conn, name):
+            conn.execute(f"ALTER TABLE {name} RENAME TO {name}_v1")
+            renamed.append(name)
+
+    for sql in TABLES:
+        conn.execute(sql)
+
+    if "sources" in renamed:
+        conn.execute("""
+            INSERT OR IGNORE INTO sources (key, kind, name, url)
+            SELECT id, CASE kind WHEN 'line' THEN 0 ELSE 1 END, name, url FROM sources_v1
+        """)
+    conn.executemany("INSERT OR IGNORE INTO sources (key, kind, name, url) VALUES (?, ?, ?, ?)", LEGACY_SOURCES)
+
+    if "transport_weather" in renamed:
+        # 運行状況: 文の末尾で状態を判定し、それ以外はエラーとして記録する
+        conn.execute(f"""
+            INSERT OR IGNORE INTO observations (source_id, ts, status)
+            SELECT (SELECT id FROM sources WHERE key = 'tama_monorail'), {LEGACY_TS},
+                   CASE WHEN delay_status LIKE '%遅延しています' THEN {STATUS_DELAYED} ELSE {STATUS_NORMAL} END
+            FROM transport_weather_v1
+            WHERE delay_status LIKE '%遅延しています' OR delay_status LIKE '%通常運転です'
+        """)
+        conn.execute(f"""
+            INSERT INTO fetch_errors (source_id, ts, message)
+            SELECT (SELECT id FROM sources WHERE key = 'tama_monorail'), {LEGACY_TS}, delay_status
+            FROM transport_weather_v1
+            WHERE NOT (delay_status LIKE '%遅延しています' OR delay_status LIKE '%通常運転です')
+        """)
+        # 天気: 失敗時のメッセージ以外は辞書に登録して番号で持つ
+        weather_error = "(weather LIKE '天気情報の取得に失敗しました%' OR weather = '現在の天気情報が見つかりませんでした')"
+        conn.execute(f"""
+            INSERT OR IGNORE INTO weather_categories (name)
+            SELECT DISTINCT weather FROM transport_weather_v1 WHERE weather IS NOT NULL AND NOT {weather_error}
+        """)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO observations (source_id, ts, weather_id)
+            SELECT (SELECT id FROM sources WHERE key = 'hino'), {LEGACY_TS},
+                   (SELECT id FROM weather_categories WHERE name = weather)
+            FROM transport_weather_v1 WHERE weather IS NOT NULL AND NOT {weather_error}
+        """)
+        conn.execute(f"""
+            INSERT INTO fetch_errors (source_id, ts, message)
+            SELECT (SELECT id FROM sources WHERE key = 'hino'), {LEGACY_TS}, weather
+            FROM transport_weather_v1 WHERE {weather_error}
+        """)
+
+    if "observations" in renamed:
+        conn.execute("""
+            INSERT OR IGNORE INTO weather_categories (name)
+            SELECT DISTINCT o.value FROM observations_v1 o JOIN sources_v1 s ON s.id = o.source_id
+            WHERE s.kind = 'location' AND o.error IS NULL AND o.value IS NOT NULL
+        """)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO observations (source_id, ts, status, weather_id)
+            SELECT (SELECT id FROM sources WHERE key = o.source_id), {LEGACY_TS},
+                   CASE WHEN s.kind = 'line' THEN (CASE o.value WHEN '{LINE_DELAYED}' THEN {STATUS_DELAYED} ELSE {STATUS_NORMAL} END) END,
+                   CASE WHEN s.kind = 'location' THEN (SELECT id FROM weather_categories WHERE name = o.value) END
+            FROM observations_v1 o JOIN sources_v1 s ON s.id = o.source_id
+            WHERE o.error IS NULL
+        """)
+        conn.execute(f"""
+            INSERT INTO fetch_errors (source_id, ts, message)
+            SELECT (SELECT id FROM sources WHERE key = source_id), {LEGACY_TS}, error
+            FROM observations_v1 WHERE error IS NOT NULL
+        """)
+
+    if "state_transitions" in renamed:
+        conn.execute("""
+            INSERT OR IGNORE INTO weather_categories (name)
+            SELECT DISTINCT t.value FROM state_transitions_v1 t JOIN sources_v1 s ON s.id = t.source_id
+            WHERE s.kind = 'location' AND t.error IS NULL AND t.value IS NOT NULL
+        """)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO state_transitions (source_id, started_at, ended_at, status, weather_id, is_error)
+            SELECT (SELECT id FROM sources WHERE key = t.source_id),
+                   CAST(strftime('%s', t.started_at) AS INTEGER),
+                   CAST(strftime('%s', t.ended_at) AS INTEGER),
+                   CASE WHEN s.kind = 'line' AND t.error IS NULL THEN (CASE t.value WHEN '{LINE_DELAYED}' THEN {STATUS_DELAYED} ELSE {STATUS_NORMAL} END) END,
+                   CASE WHEN s.kind = 'location' AND t.error IS NULL THEN (SELECT id FROM weather_categories WHERE name = t.value) END,
+                   t.error IS NOT NULL
+            FROM state_transitions_v1 t JOIN sources_v1 s ON s.id = t.source_id
+        """)
+        conn.execute("""
+            INSERT INTO fetch_errors (source_id, ts, message)
+            SELECT (SELECT id FROM sources WHERE key = source_id), CAST(strftime('%s', started_at) AS INTEGER), error
+            FROM state_transitions_v1 WHERE error IS NOT NULL
+        """)
+
+    # 移し終えた以前のテーブルを削除する
+    for name in ("state_transitions", "observations", "transport_weather", "sources"):
+        if name in renamed:
+            conn.execute(f"DROP TABLE {name}_v1")
+    return renamed
+
+
+# スキーマを最新にする(必要なら以前のデータを移す)
+def ensure_schema(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return False
+    # executescript などで途中コミットされないよう、明示的にトランザクションを張る
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN")
+        renamed = migrate_v1(conn) if version < 2 else []
+        for sql in TABLES:
+            conn.execute(sql)
+        conn.execute(LEGACY_VIEW)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.isolation_level = ""
+    if renamed:
+        # 移行で空いた領域を詰める
+        conn.execute("VACUUM")
+        print(f"以前の形式のテーブル({', '.join(renamed)})を新しいスキーマに移行しました。")
+    return True
+
+
+# 単体で実行したときは指定したDB(省略時は transport_weather.db)を移行する
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "最終課題/transport_weather.db"
+    with sqlite3.connect(db_path) as conn:
+        if not ensure_schema(conn):
+            print(f"{db_path} はすでに最新のスキーマです。")
@@ -0,0 +1,187 @@
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from html_extract import extract_from_response
+
+# 監視対象の設定ファイル
+SOURCES_FILE = "最終課題/sources.json"
+
+# 設定ファイルのキー → 取得元の種類
+SECTION_KINDS = {"lines": "line", "locations": "location"}
+
+# 種類ごとの抽出方法(探す要素と、抽出結果 → 値 の変換関数)
+SOURCE_TYPES = {}
+
+# 路線の状態を表す値
+LINE_DELAYED = "遅延"
+LINE_NORMAL = "通常運転"
+
+
+class SourceType:
+    """取得元の種類1つ分の抽出方法。"""
+
+    def __init__(self, kind, tag, class_name, want_text, convert):
+        self.kind = kind
+        self.tag = tag
+        self.class_name = class_name
+        self.want_text = want_text
+        self.convert = convert
+        # 過去の時刻の値を取得する関数（取得できない種類は None）
+        self.backfill = None
+
+
+# 取得元の種類と抽出方法を登録するデコレータ
+def register_source_type(kind, tag, class_name, want_text=True):
+    """ページ内の最初の <tag class="class_name"> を探し、
+    convert(見つかったか, 要素の文字列) の戻り値をその取得元の値とする。
+    """
+    def decorator(convert):
+        SOURCE_TYPES[kind] = SourceType(kind, tag, class_name, want_text, convert)
+        return convert
+    return decorator
+
+
+# 過去の時刻の値を取得する関数を登録するデコレータ
+def register_backfill(kind):
+    """backfill(source, 時刻, session, timeout) は、その時刻の値を返す。
+    取得できない場合は例外を送出する。登録のない種類は取り逃した時刻を欠測として記録する。
+    """
+    def decorator(backfill):
+        SOURCE_TYPES[kind].backfill = backfill
+        return backfill
+    return decorator
+
+
+# 路線: Yahoo!路線情報の運行情報ページ(遅延時だけ dd.trouble がある。現在の状態だけで過去は見られない)
+@register_source_type("line", "dd", "trouble", want_text=False)
+def convert_line_status(found, text):
+    return LINE_DELAYED if found else LINE_NORMAL
+
+
+# 地点: tenki.jp の天気予報ページ(現在の予報だけで過去は見られない)
+@register_source_type("location", "p", "weather-telop")
+def convert_location_weather(found, text):
+    if not found:
+        raise ValueError("現在の天気情報が見つかりませんでした")
+    return text
+
+
+class Source:
+    """監視対象1件(路線または地点)。"""
+
+    def __init__(self, source_id, kind, name, url):
+        self.source_id = source_id
+        self.kind = kind
+        self.name = name
+        self.url = url
+
+    def __repr__(self):
+        return f"Source({self.kind}:{self.source_id} {self.name})"
+
+
+class Observation:
+    """取得元1件分の取得結果。失敗した場合は value が None で error に理由が入る。
+
+    条件付きリクエストで「変更なし(304)」が返った場合は not_modified が True になり、
+    value は None のまま。etag / last_modified は次回の条件付きリクエスト用。
+    """
+
+    def __init__(self, source, value=None, error=None, not_modified=False, etag=None, last_modified=None):
+        self.source = source
+        self.value = value
+        self.error = error
+        self.not_modified = not_modified
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def __repr__(self):
+        return f"Observation({self.source.source_id}, value={self.value!r}, error={self.error!r})"
+
+
+# 設定ファイルから監視対象を読み込む関数
+def load_sources(path=SOURCES_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    sources = []
+    for section, kind in SECTION_KINDS.items():
+        for entry in config.get(section, []):
+            if kind not in SOURCE_TYPES:
+                raise ValueError(f"未登録の取得元の種類です: {kind}")
+            sources.append(Source(entry["id"], kind, entry["name"], entry["url"]))
+    return sources
+
+
+# 取得元1件からデータを取得する関数
+def fetch_source(source, session, timeout, headers=None):
+    try:
+        source_type = SOURCE_TYPES[source.kind]
+        # 目的の要素が見つかった時点で残りの受信をやめる
+        response = session.get(source.url, timeout=timeout, stream=True, headers=headers)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 304:
+            response.close()
+            return Observation(source, not_modified=True, etag=etag, last_modified=last_modified)
+        response.raise_for_status()
+        found, text = extract_from_response(response, source_type.tag, source_type.class_name, source_type.want_text)
+        return Observation(source, value=source_type.convert(found, text), etag=etag, last_modified=last_modified)
+    except Exception as e:
+        return Observation(source, error=str(e))
+
+
+# すべての取得元から並行してデータを取得する関数
+def fetch_all(sources, session, executor, timeout=10, headers=None):
+    """同時に実行する数は executor のスレッド数まで。
+
+    取得を始めてから timeout 秒を過ぎても終わらない取得元はタイムアウトとして返す
+    （executor の空きを待っている間は数えないので、取得元がスレッド数より多くても
+    順番待ちだけでタイムアウトにはならない）。
+    headers には取得元ID → 追加のリクエストヘッダーを指定できる。
+    結果は sources と同じ順番のリスト。
+    """
+    headers = headers or {}
+    # 取得元の番号 → 取得を始めた時刻
+    started = {}
+
+    def run(index, source):
+        started[index] = time.monotonic()
+        return fetch_source(source, session, timeout, headers.get(source.source_id))
+
+    futures = [executor.submit(run, index, source) for index, source in enumerate(sources)]
+    pending = set(range(len(futures)))
+    timed_out = set()
+    while pending:
+        now = time.monotonic()
+        for index in [index for index in pending if index in started and now - started[index] >= timeout]:
+            if not futures[index].done():
+                timed_out.add(index)
+            pending.discard(index)
+        pending = {index for index in pending if not futures[index].done()}
+        if not pending:
+            break
+        # 始まっている取得の最も早い期限まで待つ（まだ始まっていないものだけなら timeout 秒）
+        deadlines = [started[index] + timeout for index in pending if index in started]
+        wait_time = max(0, min(deadlines) - now) if deadlines else timeout
+        wait([futures[index] for index in pending], timeout=wait_time, return_when=FIRST_COMPLETED)
+    observations = []
+    for index, (source, future) in enumerate(zip(sources, futures)):
+        if index in timed_out:
+            future.cancel()
+            observations.append(Observation(source, error=f"{timeout}秒以内に応答がありませんでした"))
+        else:
+            observations.append(future.result())
+    return observations
+
+
+# 単体で実行したときは全取得元の現在の状態を表示する
+if __name__ == "__main__":
+    sources = load_sources()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        start = time.perf_counter()
+        results = fetch_all(sources, requests.Session(), executor)
+    for observation in results:
+        print(observation)
+    print(f"{len(sources)}件を{time.perf_counter() - start:.2f}秒で取得しました")
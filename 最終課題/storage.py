@@ -0,0 +1,158 @@
+import queue
+import sqlite3
+import threading
+import time
+
+# まとめて書き込む最大件数
+BATCH_SIZE = 500
+
+# 書き込みを待たせる最大秒数
+FLUSH_INTERVAL = 1.0
+
+# 書き込みスレッドを止める合図
+_STOP = object()
+
+# flush() で書き込みスレッドが動いているかを確かめる間隔(秒)
+ALIVE_CHECK_INTERVAL = 0.5
+
+
+class StorageWriter:
+    """1つの接続を持ち続け、書き込みをまとめて1トランザクションで行う。
+
+    execute / executemany は書き込みを待ち行列に入れるだけですぐに戻る。
+    書き込み用のスレッドが BATCH_SIZE 件たまるか FLUSH_INTERVAL 秒たつごとに
+    まとめてコミットする。close() は残っている分をすべて書き込んでから終了する。
+    閉じた後や、書き込みスレッドが異常終了した後の依頼は RuntimeError になる。
+    """
+
+    def __init__(self, db_path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.errors = []
+        self.closed = False
+        # 書き込みスレッドを止めた例外(異常終了したとき)
+        self.failure = None
+        # closed の確認と待ち行列への追加を close() と同時に行わないためのロック
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self.thread.start()
+
+    # 1件の書き込みを依頼する
+    def execute(self, sql, params=()):
+        self._put((sql, params, False))
+
+    # 複数件の書き込みを依頼する
+    def executemany(self, sql, rows):
+        self._put((sql, list(rows), True))
+
+    # 書き込みスレッドが受け付けられる状態かを確かめる(lock を取得済みで呼ぶ)
+    def _check_open(self):
+        if self.closed:
+            raise RuntimeError("StorageWriter はすでに閉じられています")
+        if not self.thread.is_alive():
+            raise RuntimeError(f"DBの書き込みスレッドが停止しています: {self.failure}")
+
+    def _put(self, item):
+        with self.lock:
+            self._check_open()
+            self.queue.put(item)
+
+    # 依頼済みの書き込みがすべて終わるまで待つ(timeout 秒で終わらなければ False)
+    def flush(self, timeout=None):
+        done = threading.Event()
+        self._put(done)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait_time = ALIVE_CHECK_INTERVAL if deadline is None else min(ALIVE_CHECK_INTERVAL, deadline - time.monotonic())
+            if done.wait(max(0, wait_time)):
+                return True
+            # 書き込みスレッドが止まっていたら、いつまでも待たずに知らせる
+            if not self.thread.is_alive():
+                if done.is_set():
+                    return True
+                raise RuntimeError(f"DBの書き込みスレッドが停止しています: {self.failure}")
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    # 残りを書き込んでスレッドを終了する
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.thread.is_alive():
+                self.queue.put(_STOP)
+        self.thread.join()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # 待ち行列から最大 batch_size 件を取り出す(最初の1件が来てから flush_interval 秒まで待つ)
+    def _take_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP and not isinstance(batch[-1], threading.Event):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, conn, items):
+        if not items:
+            return
+        try:
+            with conn:
+                for sql, params, many in items:
+                    if many:
+                        conn.executemany(sql, params)
+                    else:
+                        conn.execute(sql, params)
+        except sqlite3.Error:
+            # まとめた書き込みが失敗した場合は1件ずつ書き込み、失敗したものだけを記録する
+            for sql, params, many in items:
+                try:
+                    with conn:
+                        if many:
+                            conn.executemany(sql, params)
+                        else:
+                            conn.execute(sql, params)
+                except sqlite3.Error as item_error:
+                    self.errors.append((sql, params, item_error))
+                    print(f"DBへの書き込みに失敗しました: {item_error}")
+
+    def _run(self):
+        try:
+            self._loop()
+        except BaseException as e:
+            self.failure = e
+            print(f"DBの書き込みスレッドが停止しました: {e}")
+
+    def _loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = self._take_batch()
+                items = [item for item in batch if isinstance(item, tuple)]
+                self._write(conn, items)
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                if batch[-1] is _STOP:
+                    return
+        finally:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,20 +1,17 @@
 import requests
-from bs4 import BeautifulSoup
+from html_extract import extract_from_response
 
 def get_current_weather():
     # tenki.jp の天気情報ページ URL
     forecast_url = "https://tenki.jp/forecast/3/16/4410/13212/"
     try:
-        # ページのHTMLを取得
-        response = requests.get(forecast_url)
+        # ページのHTMLを取得（天気情報が見つかった時点で受信をやめる）
+        response = requests.get(forecast_url, timeout=10, stream=True)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        # 現在の天気情報を取得
-        current_weather = soup.find('p', class_='weather-telop')
-        if not current_weather:
-            return "現在の天気情報が見つかりませんでした"
         # 現在の天気情報のテキストを取得
-        weather_summary = current_weather.get_text(strip=True)
+        found, weather_summary = extract_from_response(response, 'p', 'weather-telop')
+        if not found:
+            return "現在の天気情報が見つかりませんでした"
         return f"現在の天気: {weather_summary}"
     except Exception as e:
         return f"天気情報の取得に失敗しました: {e}"
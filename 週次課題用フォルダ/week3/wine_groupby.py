@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pandas as pd
+
+#並列の groupby は week4 の parallel_groupby.py を使う（同じものを2つ持たない）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "week4"))
+from parallel_groupby import parallel_groupby  # noqa: E402
+
+
+#week3 の df.groupby("quality").mean() を複数のプロセスで計算する
+if __name__ == "__main__":
+    df = pd.read_csv('Wine Quality Red.csv', sep=',')
+    print(parallel_groupby(df, "quality", "mean", min_rows=0))
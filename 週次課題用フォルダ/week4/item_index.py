@@ -0,0 +1,147 @@
+import bisect
+import heapq
+import pickle
+
+import pandas as pd
+
+from recommender import ITEMS_PATH
+
+
+class ItemIndex:
+    """カテゴリごとに価格順に並べた索引。2422016_12.py と同じ規則で推薦する。
+
+    バケットは 小カテゴリ・大カテゴリの組 / 小カテゴリ / 大カテゴリ / 全商品 の4種類で、
+    それぞれ (価格, 追加順) の昇順のリストを持つ。
+    推薦では対象の価格の位置を bisect で探し、そこから左右に価格差の小さい順に広げていく。
+    カテゴリが両方一致する商品 → 片方だけ一致する商品 → どちらも一致しない商品 の順に探し、
+    k件そろったところで終わるので、表全体を並べ替えない。
+    商品の追加・削除は、その商品が入るバケットだけを更新する。
+    """
+
+    def __init__(self):
+        #item_id → (小カテゴリ, 大カテゴリ, 価格, ページ数, 追加順)
+        self.items = {}
+        #バケットのキー → [(価格, 追加順), ...]（価格順）
+        self.buckets = {}
+        #追加順 → item_id（同じ価格差・ページ差のときは先に追加した商品を優先する）
+        self.item_ids = {}
+        self.next_seq = 0
+
+    @classmethod
+    def from_frame(cls, items):
+        index = cls()
+        #まとめて追加するときは1件ずつ insort せず、バケットに入れてから1回だけ並べ替える
+        #同じ item_id が複数あれば後の行を使う（add で置き換えたときと同じ）
+        for item_id, small, big, price, pages in items[
+            ["item_id", "small_category", "big_category", "item_price", "pages"]
+        ].drop_duplicates("item_id", keep="last").itertuples(index=False):
+            seq = index.next_seq
+            index.next_seq += 1
+            index.items[item_id] = (small, big, price, pages, seq)
+            index.item_ids[seq] = item_id
+            for key in index.bucket_keys(small, big):
+                index.buckets.setdefault(key, []).append((price, seq))
+        for bucket in index.buckets.values():
+            bucket.sort()
+        return index
+
+    @classmethod
+    def from_csv(cls, path=ITEMS_PATH):
+        return cls.from_frame(pd.read_csv(path))
+
+    #ファイルに保存しておき、次回は Items.csv を読まずに使う
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item_id):
+        return item_id in self.items
+
+    #商品が入るバケットのキー
+    @staticmethod
+    def bucket_keys(small, big):
+        return [("pair", small, big), ("small", small), ("big", big), ("all",)]
+
+    #商品を追加する（同じ item_id があれば置き換える）
+    def add(self, item_id, small, big, price, pages):
+        if item_id in self.items:
+            self.remove(item_id)
+        seq = self.next_seq
+        self.next_seq += 1
+        self.items[item_id] = (small, big, price, pages, seq)
+        self.item_ids[seq] = item_id
+        for key in self.bucket_keys(small, big):
+            bisect.insort(self.buckets.setdefault(key, []), (price, seq))
+
+    #商品を削除する
+    def remove(self, item_id):
+        small, big, price, _, seq = self.items.pop(item_id)
+        del self.item_ids[seq]
+        for key in self.bucket_keys(small, big):
+            bucket = self.buckets[key]
+            del bucket[bisect.bisect_left(bucket, (price, seq))]
+            if not bucket:
+                del self.buckets[key]
+
+    #バケットの商品を price との差が小さい順に (価格差, 追加順) で返す
+    def _outward(self, key, price):
+        bucket = self.buckets.get(key, [])
+        right = bisect.bisect_left(bucket, (price, -1))
+        left = right - 1
+        while left >= 0 or right < len(bucket):
+            if right >= len(bucket) or (left >= 0 and price - bucket[left][0] <= bucket[right][0] - price):
+                yield price - bucket[left][0], bucket[left][1]
+                left -= 1
+            else:
+                yield bucket[right][0] - price, bucket[right][1]
+                right += 1
+
+    #一致するカテゴリの数ごとに、候補を価格差の小さい順に返す
+    def _tiers(self, small, big, price):
+        #カテゴリが両方一致
+        yield self._outward(("pair", small, big), price)
+        #片方だけ一致（小カテゴリのバケットと大カテゴリのバケットを価格差の順に合わせる）
+        yield heapq.merge(
+            ((diff, seq) for diff, seq in self._outward(("small", small), price)
+             if self.items[self.item_ids[seq]][1] != big),
+            ((diff, seq) for diff, seq in self._outward(("big", big), price)
+             if self.items[self.item_ids[seq]][0] != small),
+        )
+        #どちらも一致しない
+        yield ((diff, seq) for diff, seq in self._outward(("all",), price)
+               if self.items[self.item_ids[seq]][0] != small and self.items[self.item_ids[seq]][1] != big)
+
+    #item_id の商品に対する推薦を上位k件の item_id で返す
+    def top_k(self, item_id, k=3):
+        small, big, price, pages, target_seq = self.items[item_id]
+        result = []
+        for tier in self._tiers(small, big, price):
+            need = k - len(result)
+            if need <= 0:
+                break
+            #価格差の小さい順に取り出し、need 件目と同じ価格差の商品まで集めてからページ差で並べる
+            found = []
+            for diff, seq in tier:
+                if seq == target_seq:
+                    continue
+                if len(found) >= need and diff > found[need - 1][0]:
+                    break
+                found.append((diff, abs(self.items[self.item_ids[seq]][3] - pages), seq))
+            result.extend(self.item_ids[seq] for _, _, seq in sorted(found)[:need])
+        return result
+
+
+#以前と同じく item_id 101 の推薦を表示する
+if __name__ == "__main__":
+    index = ItemIndex.from_csv()
+    top_3 = index.top_k(101, 3)
+    for rank in range(3):
+        print(f"推薦候補{rank + 1}のitem_id: {top_3[rank] if rank < len(top_3) else 'なし'}")
@@ -0,0 +1,278 @@
+import hashlib
+import os
+import sys
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+#データのパス
+DATA_DIR = "週次課題用フォルダ/week4"
+ITEMS_PATH = f"{DATA_DIR}/Items.csv"
+ORDERS_PATH = f"{DATA_DIR}/Orders.csv"
+USERS_PATH = f"{DATA_DIR}/Users.csv"
+
+#結合した注文の表を保存するフォルダ
+CACHE_DIR = f"{DATA_DIR}/cache"
+
+#保存する表の形が変わったら増やす（古いキャッシュを使わないようにする）
+CACHE_VERSION = 1
+
+#読み込む列と型（集計に使わない列は読まない）
+ITEM_COLUMNS = {"item_id": "int64", "item_price": "int64"}
+ORDER_COLUMNS = {"order_id": "int64", "user_id": "int64", "item_id": "int64", "order_num": "int64"}
+USER_COLUMNS = {"user_id": "int64", "user_name": "string"}
+
+#分割して読むときの1回あたりの行数
+CHUNK_SIZE = 1_000_000
+
+#集計途中の部分結果がこの行数を超えたら1つにまとめる
+COMPACT_ROWS = 1_000_000
+
+
+#ファイルの中身のハッシュ（更新日時ではなく中身が変わったときだけキャッシュを作り直す）
+#ファイルの境目がずれても同じにならないよう、各ファイルの前にその大きさを入れる
+def file_hash(paths):
+    digest = hashlib.sha256(str(CACHE_VERSION).encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f"\0{os.fstat(f.fileno()).st_size}\0".encode())
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def read_csv(path, columns):
+    #Items.csv は先頭に BOM が付いているので utf-8-sig で読む
+    return pd.read_csv(path, usecols=list(columns), dtype=columns, encoding="utf-8-sig")
+
+
+#注文と商品を結合し、注文の行ごとの金額(price)を付けた表を作る
+def build_orders(items_path=ITEMS_PATH, orders_path=ORDERS_PATH):
+    items = read_csv(items_path, ITEM_COLUMNS)
+    orders = read_csv(orders_path, ORDER_COLUMNS)
+    data = orders.merge(items, on="item_id", how="inner")
+    data["price"] = data["item_price"] * data["order_num"]
+    return data
+
+
+class OrderReports(ABC):
+    """注文ごと・ユーザーごとの集計から、上位の注文・ユーザーを取り出す。
+
+    サブクラスは order_totals()（order_id ごとの合計金額）と
+    user_stats()（user_id ごとの購入金額の mean と sum）を用意する。
+    Users.csv はユーザー名が必要なときだけ読む。
+    """
+
+    def __init__(self, users_path=USERS_PATH):
+        self.users_path = users_path
+        self._users = None
+
+    #ユーザーの表（必要になったときに読み込む）
+    @property
+    def users(self):
+        if self._users is None:
+            self._users = read_csv(self.users_path, USER_COLUMNS)
+        return self._users
+
+    #CSVを読み直す（次に表を使うときに読み込む）
+    def reload(self):
+        self._users = None
+
+    #注文ごとの合計金額（order_id → price）
+    @abstractmethod
+    def order_totals(self):
+        pass
+
+    #ユーザーごとの購入金額の平均と合計（user_id → mean, sum）
+    @abstractmethod
+    def user_stats(self):
+        pass
+
+    #values の大きい順に上位n件（同じ値なら先に現れたもの）
+    @staticmethod
+    def top_n(values, n=1):
+        return values.nlargest(n, keep="first")
+
+    #合計金額が最も高い注文（2422016_10.py）
+    def top_orders(self, n=1):
+        return self.top_n(self.order_totals(), n).rename("price").reset_index()
+
+    #平均購入金額が最も高いユーザー（2422016_11.py）
+    def top_users(self, n=1, by="mean", with_names=False):
+        result = self.top_n(self.user_stats()[by], n).rename("price").reset_index()
+        if with_names:
+            result = result.merge(self.users, on="user_id", how="left")
+        return result
+
+
+class OrderAnalytics(OrderReports):
+    """注文の集計をまとめて行う。
+
+    Items.csv と Orders.csv の読み込みと結合は最初の1回だけ行い、
+    結合した表はメモリに持つほか、CACHE_DIR に Feather 形式で保存する。
+    ファイル名には元のCSVの中身のハッシュを使うので、CSVが変わらなければ次回は結合せずに読み込む。
+    """
+
+    def __init__(self, items_path=ITEMS_PATH, orders_path=ORDERS_PATH, users_path=USERS_PATH, cache_dir=CACHE_DIR):
+        super().__init__(users_path)
+        self.items_path = items_path
+        self.orders_path = orders_path
+        self.cache_dir = cache_dir
+        self._orders = None
+
+    #キャッシュのファイル名（CSVの中身が変わると変わる）
+    def cache_path(self):
+        return os.path.join(self.cache_dir, f"orders_{file_hash([self.items_path, self.orders_path])}.feather")
+
+    #注文の行ごとの表（order_id, user_id, item_id, order_num, item_price, price）
+    @property
+    def orders(self):
+        if self._orders is None:
+            self._orders = self._load_orders()
+        return self._orders
+
+    def _load_orders(self):
+        if self.cache_dir is None:
+            return build_orders(self.items_path, self.orders_path)
+        path = self.cache_path()
+        #Feather の読み書きは pyarrow が入っている場合だけ行う
+        try:
+            import pyarrow.feather  # noqa: F401
+        except ImportError:
+            return build_orders(self.items_path, self.orders_path)
+        if os.path.exists(path):
+            return pd.read_feather(path)
+        data = build_orders(self.items_path, self.orders_path)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        #書き込み途中のファイルを読まないよう、別名で書いてから置き換える
+        temp_path = f"{path}.tmp"
+        data.to_feather(temp_path)
+        os.replace(temp_path, path)
+        self._remove_stale_caches(path)
+        return data
+
+    #CSVが変わる前に保存した表を消す（新しく保存した current だけを残す）
+    def _remove_stale_caches(self, current):
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith("orders_") and name.endswith(".feather") and path != current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def reload(self):
+        super().reload()
+        self._orders = None
+
+    #注文ごとの合計金額
+    def order_totals(self):
+        return self.orders.groupby("order_id")["price"].sum()
+
+    #ユーザーごとの購入金額の平均と合計（注文の行ごとの金額について）
+    def user_stats(self):
+        return self.orders.groupby("user_id")["price"].agg(["mean", "sum"])
+
+
+class RunningTotals:
+    """キーごとの合計と件数を少しずつ足していく。
+
+    分割ごとの groupby の結果をためておき、たまった行数が COMPACT_ROWS と
+    それまでの集計結果の行数の大きい方を超えたときだけ1つにまとめる
+    （分割のたびに全体を足し直すと、キーが多いときに遅くなるため）。
+    途中では並べ替えず、最後に1回だけキーの順に並べる。
+    """
+
+    def __init__(self, compact_rows=COMPACT_ROWS):
+        self.compact_rows = compact_rows
+        self.total = None
+        self.pending = []
+        self.pending_rows = 0
+
+    def add(self, keys, values):
+        part = pd.DataFrame({"sum": values, "count": 1}).groupby(keys, sort=False).sum()
+        self.pending.append(part)
+        self.pending_rows += len(part)
+        if self.pending_rows >= max(self.compact_rows, 0 if self.total is None else len(self.total)):
+            self.compact()
+
+    def compact(self):
+        parts = self.pending if self.total is None else [self.total] + self.pending
+        if parts:
+            self.total = pd.concat(parts).groupby(level=0, sort=False).sum()
+        self.pending = []
+        self.pending_rows = 0
+
+    #キーの順に並んだ合計と件数の表
+    def result(self, name):
+        self.compact()
+        if self.total is None:
+            return pd.DataFrame({"sum": pd.Series(dtype="int64"), "count": pd.Series(dtype="int64")},
+                                index=pd.Index([], dtype="int64", name=name))
+        return self.total.sort_index().rename_axis(name)
+
+
+class StreamingOrderAnalytics(OrderReports):
+    """Orders.csv を CHUNK_SIZE 行ずつ読みながら集計する（OrderAnalytics と同じ結果を返す）。
+
+    商品の価格は item_id の順に並べた配列として持ち、分割した注文ごとに searchsorted で価格を付ける
+    （結合した表は作らない）。注文ごと・ユーザーごとの合計と件数だけを持つので、
+    使うメモリは注文ファイルの大きさではなく注文・ユーザーの数で決まる。
+    上位の取り出しは並べ替えずに nlargest で行う。
+    """
+
+    def __init__(self, items_path=ITEMS_PATH, orders_path=ORDERS_PATH, users_path=USERS_PATH,
+                 chunk_size=CHUNK_SIZE, compact_rows=COMPACT_ROWS):
+        super().__init__(users_path)
+        self.items_path = items_path
+        self.orders_path = orders_path
+        self.chunk_size = chunk_size
+        self.compact_rows = compact_rows
+        self._totals = None
+
+    #item_id の昇順の配列と、それに対応する価格の配列
+    def price_map(self):
+        items = read_csv(self.items_path, ITEM_COLUMNS).drop_duplicates("item_id", keep="last")
+        items = items.sort_values("item_id")
+        return items["item_id"].to_numpy(), items["item_price"].to_numpy()
+
+    #注文ファイルを1回だけ読み、注文ごと・ユーザーごとの合計と件数を作る
+    def _aggregate(self):
+        item_ids, item_prices = self.price_map()
+        by_order = RunningTotals(self.compact_rows)
+        by_user = RunningTotals(self.compact_rows)
+        for chunk in pd.read_csv(self.orders_path, usecols=list(ORDER_COLUMNS), dtype=ORDER_COLUMNS,
+                                 encoding="utf-8-sig", chunksize=self.chunk_size):
+            chunk_items = chunk["item_id"].to_numpy()
+            positions = np.searchsorted(item_ids, chunk_items).clip(max=max(len(item_ids) - 1, 0))
+            #商品表にない item_id の注文は除く（内部結合と同じ）
+            found = item_ids[positions] == chunk_items if len(item_ids) else np.zeros(len(chunk), dtype=bool)
+            price = item_prices[positions[found]] * chunk["order_num"].to_numpy()[found]
+            by_order.add(chunk["order_id"].to_numpy()[found], price)
+            by_user.add(chunk["user_id"].to_numpy()[found], price)
+        return by_order.result("order_id"), by_user.result("user_id")
+
+    def totals(self):
+        if self._totals is None:
+            self._totals = self._aggregate()
+        return self._totals
+
+    def reload(self):
+        super().reload()
+        self._totals = None
+
+    def order_totals(self):
+        return self.totals()[0]["sum"].rename("price")
+
+    def user_stats(self):
+        users = self.totals()[1]
+        return pd.DataFrame({"mean": users["sum"] / users["count"], "sum": users["sum"]})
+
+
+#2422016_10.py と 2422016_11.py の結果を1回の読み込みで表示する
+#（--stream を付けると Orders.csv を分割して読みながら集計する）
+if __name__ == "__main__":
+    analytics = StreamingOrderAnalytics() if "--stream" in sys.argv[1:] else OrderAnalytics()
+    print(analytics.top_orders(1))
+    print(analytics.top_users(1))
@@ -0,0 +1,147 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+#これより行数が少ないときは分けずに pandas の groupby をそのまま使う
+PARALLEL_MIN_ROWS = 1_000_000
+
+
+#配列を共有メモリに置き、(名前, 形, 型) を返す（子プロセスはこれで同じメモリを読む）
+def to_shared(array, blocks):
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+    return block.name, array.shape, array.dtype.str
+
+
+#書き込み用の配列を共有メモリに確保する（中身は子プロセスが書く）
+def empty_shared(shape, dtype, blocks):
+    dtype = np.dtype(dtype)
+    block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    blocks.append(block)
+    return block.name, shape, dtype.str
+
+
+#子プロセスで共有メモリの配列を開く（開いたブロックは blocks に入れ、最後に閉じる）
+def attach(spec, blocks):
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    return np.ndarray(shape, dtype, buffer=block.buf)
+
+
+#キーごとの区画の番号（同じキーは必ず同じ区画、欠損のキーは parts）
+def key_partitions(keys, parts, factorized):
+    if factorized:
+        #親プロセスで番号にしたキー（-1 が欠損）
+        missing = keys < 0
+        partitions = keys % parts
+    else:
+        missing = pd.isna(keys) if keys.dtype.kind == "f" else np.zeros(len(keys), dtype=bool)
+        #-0.0 と 0.0 は同じキーなので、ハッシュの前にそろえる
+        partitions = pd.util.hash_array(keys + 0 if keys.dtype.kind == "f" else keys, categorize=False) % parts
+    #区画の番号は小さい型にしておくと、安定ソートが基数ソートになって速い
+    partitions = partitions.astype(np.min_scalar_type(parts))
+    partitions[missing] = parts
+    return partitions
+
+
+#子プロセスで、行の範囲 [start, end) をキーで区画に振り分ける
+#（範囲内の行番号を区画の順に並べて order[start:end] に書き、区画ごとの行数を返す）
+def partition_range(key_spec, order_spec, start, end, parts, factorized):
+    blocks = []
+    try:
+        partitions = key_partitions(attach(key_spec, blocks)[start:end], parts, factorized)
+        #安定ソートなので、同じ区画の中では元の順のまま
+        attach(order_spec, blocks)[start:end] = np.argsort(partitions, kind="stable") + start
+        return np.bincount(partitions, minlength=parts + 1)
+    finally:
+        partitions = None
+        for block in blocks:
+            block.close()
+
+
+#子プロセスで1つの区画を集計する（pieces は order のうち、その区画の行が入っている範囲のリスト）
+def aggregate_partition(columns, key_spec, order_spec, pieces, agg):
+    blocks = []
+    try:
+        #範囲は行の範囲の順に並んでいるので、行は元の順のまま取り出され、グループごとの計算の順は pandas と同じになる
+        order = attach(order_spec, blocks)
+        rows = np.concatenate([order[start:end] for start, end in pieces])
+        keys = attach(key_spec, blocks)[rows]
+        frame = pd.DataFrame({name: attach(spec, blocks)[rows] for name, spec in columns.items()})
+        return frame.groupby(keys, sort=False).agg(agg)
+    finally:
+        #共有メモリを閉じる前に、参照している配列を手放す
+        order = rows = keys = frame = None
+        for block in blocks:
+            block.close()
+
+
+def parallel_groupby(frame, by, agg="mean", columns=None, workers=None, min_rows=PARALLEL_MIN_ROWS):
+    """frame.groupby(by)[columns].agg(agg) と同じ結果を、複数のプロセスで計算する。
+
+    親プロセスはキーと列を共有メモリに写すだけで、振り分けと集計は子プロセスで行う。
+    1. 行を連続した範囲(ワーカー数)に分け、各プロセスが自分の範囲の行をキーのハッシュで区画に振り分ける。
+    2. 各プロセスが1つの区画について、すべての範囲からその区画の行を集めて集計する。
+    同じグループの行はすべて同じ区画に入るので、各プロセスの結果はそのグループの最終的な値になり、
+    まとめるときは並べるだけでよい（足し合わせによる誤差が出ず、pandas と同じ値になる）。
+    キーが数値でないときは、親プロセスでキーを番号にしてから同じように分ける。
+    agg は "sum", "mean", "count", "min", "max" など、グループ内だけで計算できるもの。
+    """
+    columns = list(columns) if columns is not None else [name for name in frame.columns if name != by]
+    workers = workers or os.cpu_count() or 1
+    if len(frame) < min_rows or workers == 1:
+        return frame.groupby(by)[columns].agg(agg)
+    for name in columns:
+        if not pd.api.types.is_numeric_dtype(frame[name]) or pd.api.types.is_extension_array_dtype(frame[name]):
+            raise ValueError(f"数値の列だけを集計できます: {name}")
+    key = frame[by]
+    factorized = not pd.api.types.is_numeric_dtype(key) or pd.api.types.is_extension_array_dtype(key)
+    if factorized:
+        #キーは並べ替えた順の番号にする（キーが欠損の行は pandas と同じく除く）
+        keys, uniques = pd.factorize(key, sort=True)
+    else:
+        keys = key.to_numpy()
+    bounds = np.linspace(0, len(frame), workers + 1).astype(np.int64)
+    blocks = []
+    try:
+        key_spec = to_shared(keys, blocks)
+        order_spec = empty_shared((len(frame),), np.int64, blocks)
+        column_specs = {name: to_shared(frame[name].to_numpy(), blocks) for name in columns}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = np.array([future.result() for future in [
+                pool.submit(partition_range, key_spec, order_spec, bounds[part], bounds[part + 1], workers, factorized)
+                for part in range(workers)
+            ]])
+            #範囲ごとの、各区画の行が order の中で始まる位置
+            starts = bounds[:-1, None] + np.concatenate([np.zeros((workers, 1), dtype=np.int64), np.cumsum(counts, axis=1)], axis=1)
+            futures = [
+                pool.submit(aggregate_partition, column_specs, key_spec, order_spec,
+                            [(starts[part_range, part], starts[part_range, part + 1]) for part_range in range(workers)], agg)
+                for part in range(workers) if counts[:, part].sum()
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    #キーがすべて欠損のときは空の結果になるので pandas に任せる
+    if not results:
+        return frame.groupby(by)[columns].agg(agg)
+    result = pd.concat(results).sort_index()
+    if factorized:
+        result.index = uniques.take(result.index)
+    return result.rename_axis(by)
+
+
+#注文ごとの合計金額とユーザーごとの平均購入金額を複数のプロセスで計算する
+if __name__ == "__main__":
+    from order_analytics import OrderAnalytics
+
+    orders = OrderAnalytics().orders
+    print(parallel_groupby(orders, "order_id", "sum", ["price"], min_rows=0)["price"].nlargest(1))
+    print(parallel_groupby(orders, "user_id", "mean", ["price"], min_rows=0)["price"].nlargest(1))
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+#商品データのパス
+ITEMS_PATH = "週次課題用フォルダ/week4/Items.csv"
+
+#全商品の推薦をまとめて計算するときに、一度に作る (対象 × 候補) の要素数の上限
+BLOCK_ELEMENTS = 4_000_000
+
+#1つの整数にまとめられるビット数（符号ビットを除く）
+MAX_KEY_BITS = 63
+
+#候補がk件に満たないときに埋める値
+NO_ITEM = -1
+
+
+class Recommender:
+    """2422016_12.py と同じ規則で推薦する。
+
+    1. 小カテゴリ・大カテゴリが一致する数が多い順
+    2. 価格の差が小さい順
+    3. ページ数の差が小さい順
+    （すべて同じなら Items.csv の行の順）
+    カテゴリは番号に、価格とページ数は配列にして最初に1回だけ用意する。
+    順位は4つの条件を1つの整数(キー)にまとめ、argpartition で上位k件だけを取り出して並べる。
+    """
+
+    def __init__(self, items):
+        self.item_ids = items["item_id"].to_numpy()
+        self.small = pd.factorize(items["small_category"])[0]
+        self.big = pd.factorize(items["big_category"])[0]
+        self.price = items["item_price"].to_numpy()
+        self.pages = items["pages"].to_numpy()
+        self.positions = pd.Series(np.arange(len(self.item_ids)), index=self.item_ids)
+        #キーの各部分のビット数（カテゴリの一致数0～2、価格差、ページ差、行番号）
+        self.bits = [
+            2,
+            int(np.ptp(self.price)).bit_length() if len(self.price) else 0,
+            int(np.ptp(self.pages)).bit_length() if len(self.pages) else 0,
+            len(self.item_ids).bit_length(),
+        ]
+        integer = np.issubdtype(self.price.dtype, np.integer) and np.issubdtype(self.pages.dtype, np.integer)
+        self.packed = integer and sum(self.bits) <= MAX_KEY_BITS
+
+    @classmethod
+    def from_csv(cls, path=ITEMS_PATH):
+        return cls(pd.read_csv(path))
+
+    #対象の位置(複数可) → 候補ごとのキー（小さいほど上位、対象自身は最大値）
+    def keys(self, targets, candidates=None):
+        targets = np.asarray(targets)[:, None]
+        candidates = np.arange(len(self.item_ids)) if candidates is None else np.asarray(candidates)
+        _, price_bits, page_bits, index_bits = self.bits
+        #一時配列を増やさないよう、同じ配列にシフトと OR で順に詰めていく
+        key = np.abs(self.price[candidates] - self.price[targets]).astype(np.int64)
+        key <<= page_bits
+        key |= np.abs(self.pages[candidates] - self.pages[targets])
+        key <<= index_bits
+        key |= candidates
+        mismatch = (self.small[candidates] != self.small[targets]).astype(np.int64)
+        mismatch += self.big[candidates] != self.big[targets]
+        mismatch <<= price_bits + page_bits + index_bits
+        key |= mismatch
+        key[candidates == targets] = np.iinfo(np.int64).max
+        return key
+
+    #キーの小さい順に上位k件の位置を返す（行ごと）
+    def _top_positions(self, key, k):
+        count = key.shape[1]
+        if k < count:
+            part = np.argpartition(key, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(count), key.shape).copy()
+        order = np.argsort(np.take_along_axis(key, part, axis=1), axis=1)
+        return np.take_along_axis(part, order, axis=1)
+
+    #キーを1つの整数にまとめられないとき（値が大きすぎる・小数）は列ごとに並べる
+    def _top_positions_lexsort(self, target, k):
+        mismatch = 2 - ((self.small == self.small[target]).astype(np.int64) + (self.big == self.big[target]))
+        price_diff = np.abs(self.price - self.price[target])
+        page_diff = np.abs(self.pages - self.pages[target])
+        order = np.lexsort((np.arange(len(self.item_ids)), page_diff, price_diff, mismatch))
+        return order[order != target][:k]
+
+    #item_id の商品に対する推薦を上位k件の item_id で返す
+    def top_k(self, item_id, k=3):
+        target = self.positions[item_id]
+        if not self.packed:
+            return self.item_ids[self._top_positions_lexsort(target, k)]
+        k = min(k, len(self.item_ids) - 1)
+        return self.item_ids[self._top_positions(self.keys([target]), k)[0]]
+
+    #全商品の推薦をまとめて計算する（行は Items.csv の順、足りない分は NO_ITEM）
+    def top_k_all(self, k=3):
+        count = len(self.item_ids)
+        result = np.full((count, k), NO_ITEM, dtype=self.item_ids.dtype)
+        width = min(k, count - 1)
+        if width <= 0:
+            return result
+        if not self.packed:
+            for target in range(count):
+                result[target, :width] = self.item_ids[self._top_positions_lexsort(target, width)]
+            return result
+        #カテゴリが両方一致する商品が k 件以上あれば、上位はすべてその中から選ばれる
+        #（一致数が最優先のため）。そのような商品はカテゴリの組の中だけで比べる
+        groups = self.small * (self.big.max() + 1) + self.big
+        order = np.argsort(groups, kind="stable")
+        bounds = np.flatnonzero(np.diff(groups[order])) + 1
+        rest = []
+        for members in np.split(order, bounds):
+            if len(members) > width:
+                self._fill_top(result, members, members, width)
+            else:
+                rest.append(members)
+        if rest:
+            self._fill_top(result, np.concatenate(rest), None, width)
+        return result
+
+    #targets の推薦を candidates の中から選んで result に書き込む
+    def _fill_top(self, result, targets, candidates, width):
+        #対象をブロックに分け、使うメモリを BLOCK_ELEMENTS 程度に抑える
+        count = len(self.item_ids) if candidates is None else len(candidates)
+        block_size = max(1, BLOCK_ELEMENTS // count)
+        for start in range(0, len(targets), block_size):
+            block = targets[start:start + block_size]
+            top = self._top_positions(self.keys(block, candidates), width)
+            result[block, :width] = self.item_ids[top if candidates is None else candidates[top]]
+
+#以前と同じく item_id 101 の推薦を表示する
+if __name__ == "__main__":
+    recommender = Recommender.from_csv()
+    top_3 = recommender.top_k(101, 3)
+    for rank in range(3):
+        print(f"推薦候補{rank + 1}のitem_id: {top_3[rank] if rank < len(top_3) else 'なし'}")